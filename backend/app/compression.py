@@ -0,0 +1,142 @@
+"""Response compression negotiated from ``Accept-Encoding``.
+
+Topology documents are large, repetitive JSON, so zstd (when ``zstandard`` is
+installed) or gzip shrinks them by an order of magnitude. Only complete
+single-message bodies of at least ``COMPRESS_MIN_BYTES`` are compressed;
+streamed responses and bodies that already carry a ``Content-Encoding`` pass
+through unchanged. Compression runs in a worker thread, since zlib and zstd
+release the GIL and a multi-megabyte body would otherwise stall the event loop.
+"""
+
+import gzip
+import os
+from typing import Any, Optional
+
+import anyio
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", "6"))
+ZSTD_LEVEL = int(os.environ.get("ZSTD_LEVEL", "3"))
+
+# In order of preference when the client accepts several with the same quality.
+ENCODINGS = ("zstd", "gzip") if zstandard is not None else ("gzip",)
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """Pick the best supported encoding from an ``Accept-Encoding`` header, or None for identity."""
+    qualities: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, parameters = item.partition(";")
+        name = name.strip().lower()
+        quality = 1.0
+        for parameter in parameters.split(";"):
+            key, _, value = parameter.partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name:
+            qualities[name] = quality
+    wildcard = qualities.get("*", 0.0)
+    candidates = [(qualities.get(name, wildcard), -rank, name) for rank, name in enumerate(ENCODINGS)]
+    quality, _, name = max(candidates)
+    return name if quality > 0 else None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class CompressionMetrics:
+    """Bytes before and after compression per encoding."""
+
+    def __init__(self) -> None:
+        self.responses: dict[str, int] = {}
+        self.input_bytes: dict[str, int] = {}
+        self.output_bytes: dict[str, int] = {}
+
+    def record(self, encoding: str, size: int, compressed_size: int) -> None:
+        self.responses[encoding] = self.responses.get(encoding, 0) + 1
+        self.input_bytes[encoding] = self.input_bytes.get(encoding, 0) + size
+        self.output_bytes[encoding] = self.output_bytes.get(encoding, 0) + compressed_size
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "min_bytes": COMPRESS_MIN_BYTES,
+            "encodings": {
+                encoding: {
+                    "responses": count,
+                    "input_bytes": self.input_bytes[encoding],
+                    "output_bytes": self.output_bytes[encoding],
+                    "saved_bytes": self.input_bytes[encoding] - self.output_bytes[encoding],
+                }
+                for encoding, count in self.responses.items()
+            },
+        }
+
+
+compression_metrics = CompressionMetrics()
+
+
+class CompressionMiddleware:
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = dict(scope["headers"])
+        encoding = negotiate(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start: Optional[dict] = None
+
+        async def compressing_send(message) -> None:
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if start is None:
+                return await send(message)
+            response, start = start, None
+            body = message.get("body", b"")
+            response_headers = [(name.lower(), value) for name, value in response.get("headers", [])]
+            if (
+                message.get("more_body", False)
+                or len(body) < COMPRESS_MIN_BYTES
+                or response["status"] in (204, 304)
+                or any(name == b"content-encoding" for name, _ in response_headers)
+            ):
+                await send(response)
+                return await send(message)
+            compressed = await anyio.to_thread.run_sync(compress, body, encoding)
+            compression_metrics.record(encoding, len(body), len(compressed))
+            response_headers = [
+                (name, weak(value) if name == b"etag" else value)
+                for name, value in response_headers
+                if name not in (b"content-length", b"vary")
+            ]
+            vary = [value for name, value in response.get("headers", []) if name.lower() == b"vary"]
+            response_headers += [
+                (b"content-encoding", encoding.encode()),
+                (b"content-length", str(len(compressed)).encode()),
+                (b"vary", b", ".join([*vary, b"Accept-Encoding"])),
+            ]
+            await send({**response, "headers": response_headers})
+            await send({**message, "body": compressed})
+
+        await self.app(scope, receive, compressing_send)
+
+
+def weak(etag: bytes) -> bytes:
+    """A strong ETag names the exact bytes; the compressed body gets its weak form."""
+    return etag if etag.startswith(b"W/") else b"W/" + etag
@@ -1,12 +1,117 @@
+import json
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
+import time
+from typing import Any
+
+import orjson
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
 
 DATABASE_URL = os.environ.get(
     "DATABASE_URL",
     "postgresql+psycopg2://postgres:eyufyuf@db:5432/network_simulation_db",
 )
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Existing deployments configure a psycopg2/pysqlite URL; the service itself runs on the async drivers.
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "1").lower() not in ("0", "false", "no")
+# Prepared statements cached per connection (asyncpg); 0 disables it, e.g. behind PgBouncer.
+DB_STATEMENT_CACHE_SIZE = int(os.environ.get("DB_STATEMENT_CACHE_SIZE", "256"))
+
+
+def dumps(value: Any) -> str:
+    """Serialize a JSON column value; orjson is several times faster on large topologies."""
+    try:
+        return orjson.dumps(value).decode()
+    except orjson.JSONEncodeError:
+        # Values orjson rejects (non-string keys, integers beyond 64 bits) keep the stdlib behaviour.
+        return json.dumps(value)
+
+
+def async_url(url: str):
+    url = make_url(url)
+    url = url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername))
+    if url.drivername == "postgresql+asyncpg":
+        url = url.update_query_dict({"prepared_statement_cache_size": str(DB_STATEMENT_CACHE_SIZE)})
+    return url
+
+
+def engine_options(url) -> dict[str, Any]:
+    if url.get_backend_name() == "sqlite":
+        # SQLite (used as a local stand-in) keeps the driver's default pool.
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "connect_args": {"statement_cache_size": DB_STATEMENT_CACHE_SIZE},
+    }
+
+
+url = async_url(DATABASE_URL)
+engine = create_async_engine(url, json_serializer=dumps, **engine_options(url))
+SessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
+
+
+class PoolMetrics:
+    """Connection acquisition statistics; the pool itself reports its occupancy."""
+
+    def __init__(self) -> None:
+        self.waiters = 0
+        self.acquired = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    async def acquire(self, session: AsyncSession) -> None:
+        """Check out the session's connection, recording how long the request waited for it."""
+        self.waiters += 1
+        start = time.perf_counter()
+        try:
+            await session.connection()
+        except PoolTimeout:
+            self.timeouts += 1
+            raise
+        else:
+            self.acquired += 1
+        finally:
+            self.waiters -= 1
+            wait = time.perf_counter() - start
+            self.wait_seconds_total += wait
+            self.wait_seconds_max = max(self.wait_seconds_max, wait)
+
+    def snapshot(self) -> dict[str, Any]:
+        pool = engine.pool
+        stats = {
+            name: getattr(pool, name)()
+            for name in ("size", "checkedin", "checkedout", "overflow")
+            if hasattr(pool, name)
+        }
+        return {
+            "pool": type(pool).__name__,
+            **stats,
+            "max_overflow": DB_MAX_OVERFLOW if stats else None,
+            "waiters": self.waiters,
+            "acquired": self.acquired,
+            "timeouts": self.timeouts,
+            "wait_seconds_total": self.wait_seconds_total,
+            "wait_seconds_max": self.wait_seconds_max,
+        }
+
+
+pool_metrics = PoolMetrics()
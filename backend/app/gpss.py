@@ -0,0 +1,57 @@
+"""Topology documents in the form gpss-api receives them.
+
+GPSS World reads ``-`` in a name as minus. Before sending a topology to gpss-api,
+the frontend therefore removes dashes from node and edge ids, node labels and
+the node references of interfaces and channels (``GPSSModal.handleDownload``).
+Canvas ids such as ``leo-1`` become ``leo1`` in every generated name. Background
+jobs apply the same renaming to stored documents, and report loading uses it
+to map GPSS names back to stored nodes.
+"""
+
+from typing import Any
+
+
+def name(value: Any) -> Any:
+    """A stored id or label as it appears in generated GPSS code."""
+    return value.replace("-", "") if isinstance(value, str) else value
+
+
+def renamed(item: Any, *keys: str) -> Any:
+    if not isinstance(item, dict):
+        return item
+    return {**item, **{key: name(item[key]) for key in keys if key in item}}
+
+
+def node(item: Any) -> Any:
+    item = renamed(item, "id")
+    data = item.get("data") if isinstance(item, dict) else None
+    if not isinstance(data, dict):
+        return item
+    data = renamed(data, "label")
+    if isinstance(data.get("interfaces"), list):
+        data["interfaces"] = [
+            renamed(interface, "edgeId", "connectedNodeId", "connectedNodeLabel") for interface in data["interfaces"]
+        ]
+    return {**item, "data": data}
+
+
+def edge(item: Any) -> Any:
+    item = renamed(item, "id", "source", "target")
+    data = item.get("data") if isinstance(item, dict) else None
+    channel = data.get("channel") if isinstance(data, dict) else None
+    if not isinstance(channel, dict):
+        return item
+    ends = {end: renamed(channel[end], "nodeId") for end in ("from", "to") if end in channel}
+    return {**item, "data": {**data, "channel": {**renamed(channel, "id"), **ends}}}
+
+
+def document(data: Any) -> Any:
+    """A copy of a stored topology document with the frontend's GPSS renaming; ``data`` is unchanged."""
+    if not isinstance(data, dict):
+        return data
+    result = dict(data)
+    if isinstance(data.get("nodes"), list):
+        result["nodes"] = [node(item) for item in data["nodes"]]
+    if isinstance(data.get("edges"), list):
+        result["edges"] = [edge(item) for item in data["edges"]]
+    return result
@@ -0,0 +1,217 @@
+"""Background simulation jobs.
+
+A job generates GPSS code for a stored topology and simulates it through
+gpss-api, outside the request that submitted it. The document is renamed the
+way the frontend sends it (``gpss.document``), so the code matches a download. ``JOB_WORKERS`` tasks take jobs
+from a queue bounded by ``JOB_QUEUE_SIZE``; a full queue rejects new jobs
+instead of letting them wait without limit. Progress and statistics over the
+finished replications are written to the ``simulation_jobs`` row, and waiting
+event streams are woken in-process. The final metrics go to
+``simulation_results`` keyed by a hash of the input, so submitting an unchanged
+topology with the same settings is answered from that table without running.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import statistics
+from datetime import datetime
+from typing import Any, Optional
+
+import httpx
+import orjson
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+
+from . import models
+from .database import SessionLocal
+
+GPSS_API_URL = os.environ.get("GPSS_API_URL", "http://gpss-api:8080/api/gpss")
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_QUEUE_SIZE = int(os.environ.get("JOB_QUEUE_SIZE", "100"))
+JOB_MAX_REPLICATIONS = int(os.environ.get("JOB_MAX_REPLICATIONS", "100"))
+# Timeout of one gpss-api call: generation or a single replication.
+JOB_TIMEOUT = float(os.environ.get("JOB_TIMEOUT", "600"))
+# Event streams re-read the job at least this often, e.g. when another process runs it.
+JOB_POLL_SECONDS = float(os.environ.get("JOB_POLL_SECONDS", "5"))
+
+TOTALS = ("generated", "delivered", "lost", "loss_rate")
+FINISHED = ("done", "failed")
+
+
+class JobError(Exception):
+    """gpss-api rejected the input or could not be reached."""
+
+
+def canonical(value: Any) -> bytes:
+    try:
+        return orjson.dumps(value, option=orjson.OPT_SORT_KEYS)
+    except orjson.JSONEncodeError:
+        return json.dumps(value, sort_keys=True, separators=(",", ":")).encode()
+
+
+def input_hash(data: Any, mode: str, seed: Optional[int], replications: int) -> str:
+    """Key of a stored result: the document as sent to gpss-api and every setting that changes the metrics."""
+    key = {"data": data, "mode": mode, "seed": seed, "replications": replications}
+    return hashlib.sha256(canonical(key)).hexdigest()
+
+
+def summary(runs: list[dict[str, Any]]) -> dict[str, Any]:
+    """Mean, standard deviation and range of the totals over the finished replications."""
+    result: dict[str, Any] = {"replications": len(runs)}
+    for name in TOTALS:
+        values = [run[name] for run in runs]
+        result[name] = {
+            "mean": statistics.fmean(values),
+            "std": statistics.stdev(values) if len(values) > 1 else 0.0,
+            "min": min(values),
+            "max": max(values),
+        }
+    return result
+
+
+class JobQueue:
+    """Bounded queue of submitted jobs and the worker tasks that run them."""
+
+    def __init__(self) -> None:
+        self.queue: Optional[asyncio.Queue] = None
+        self.workers: list[asyncio.Task] = []
+        self.client: Optional[httpx.AsyncClient] = None
+        # job id -> event set on the job's next change; replaced after every change.
+        self.changes: dict[int, asyncio.Event] = {}
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.reused = 0
+        self.rejected = 0
+
+    async def start(self) -> None:
+        self.queue = asyncio.Queue(JOB_QUEUE_SIZE)
+        self.client = httpx.AsyncClient(base_url=GPSS_API_URL, timeout=JOB_TIMEOUT)
+        self.workers = [asyncio.create_task(self.work()) for _ in range(JOB_WORKERS)]
+
+    async def stop(self) -> None:
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        await self.client.aclose()
+
+    def full(self) -> bool:
+        return self.queue.full()
+
+    def submit(self, job: models.SimulationJob, data: Any) -> bool:
+        """Queue a committed job; False when the queue is full."""
+        try:
+            self.queue.put_nowait((job.id, job.topology_id, job.input_hash, job.mode, job.seed, job.replications, data))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return False
+        return True
+
+    def watch(self, job_id: int) -> asyncio.Event:
+        """Event set on the next change of the job made by this process."""
+        return self.changes.setdefault(job_id, asyncio.Event())
+
+    def forget(self, job_id: int) -> None:
+        self.changes.pop(job_id, None)
+
+    async def set(self, job_id: int, **values: Any) -> None:
+        async with SessionLocal() as db:
+            await db.execute(update(models.SimulationJob).where(models.SimulationJob.id == job_id).values(**values))
+            await db.commit()
+        event = self.changes.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+    async def work(self) -> None:
+        while True:
+            job_id, *job = await self.queue.get()
+            self.running += 1
+            try:
+                await self.run(job_id, *job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                self.failed += 1
+                await self.set(job_id, status="failed", error=str(error) or type(error).__name__,
+                               finished_at=datetime.utcnow())
+            else:
+                self.completed += 1
+            finally:
+                self.running -= 1
+                self.queue.task_done()
+
+    async def call(self, path: str, body: bytes, **params: Any) -> dict[str, Any]:
+        try:
+            response = await self.client.post(
+                path, content=body, params=params, headers={"Content-Type": "application/json"}
+            )
+        except httpx.HTTPError as error:
+            raise JobError(f"gpss-api is unavailable: {error!r}") from None
+        if response.status_code == 422:
+            raise JobError(f"gpss-api rejected the topology: {response.json().get('detail')}")
+        if response.status_code != 200:
+            raise JobError(f"gpss-api {path} failed with status {response.status_code}")
+        return response.json()
+
+    async def run(
+        self, job_id: int, topology_id: int, key: str, mode: str, seed: Optional[int], replications: int, data: Any
+    ) -> None:
+        """Generate the code, simulate ``replications`` runs and store the result under ``key``."""
+        await self.set(job_id, status="running", started_at=datetime.utcnow())
+        body = await asyncio.to_thread(canonical, data)
+        steps = replications + 1
+        code = (await self.call("/gen", body))["code"]
+        await self.set(job_id, progress=1 / steps)
+        runs: list[dict[str, Any]] = []
+        params: dict[str, Any] = {"mode": mode} if seed is None else {"mode": mode, "seed": seed}
+        for replication in range(replications):
+            # A single run keeps the plain /simulate result; several use independent random streams.
+            extra = {"replication": replication} if replications > 1 else {}
+            runs.append(await self.call("/simulate", body, **params, **extra))
+            await self.set(job_id, progress=(replication + 2) / steps, partial=summary(runs))
+        result_id = await store(topology_id, key, code, {"summary": summary(runs), "runs": runs})
+        await self.set(job_id, status="done", progress=1.0, result_id=result_id, finished_at=datetime.utcnow())
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "workers": len(self.workers),
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+            "queue_size": JOB_QUEUE_SIZE,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "reused": self.reused,
+            "rejected": self.rejected,
+        }
+
+
+async def store(topology_id: int, key: str, code: str, metrics: dict[str, Any]) -> int:
+    """Insert the result, or return the one another job stored for the same input meanwhile."""
+    async with SessionLocal() as db:
+        result = models.SimulationResult(topology_id=topology_id, input_hash=key, code=code, metrics=metrics)
+        db.add(result)
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            return await db.scalar(
+                select(models.SimulationResult.id).where(models.SimulationResult.input_hash == key)
+            )
+        return result.id
+
+
+async def interrupted() -> None:
+    """Fail jobs left queued or running by a previous process; their queue did not survive it."""
+    async with SessionLocal() as db:
+        await db.execute(
+            update(models.SimulationJob)
+            .where(models.SimulationJob.status.in_(("queued", "running")))
+            .values(status="failed", error="interrupted by a restart", finished_at=datetime.utcnow())
+        )
+        await db.commit()
+
+
+job_queue = JobQueue()
@@ -1,50 +1,627 @@
-from fastapi import Depends, FastAPI, HTTPException
-from sqlalchemy.orm import Session
+import asyncio
+import base64
+import binascii
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Optional, Union
 
-from . import models, schemas
-from .database import SessionLocal, engine
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from sqlalchemy import exists, or_, select, tuple_
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.exc import StaleDataError
+from starlette.concurrency import run_in_threadpool
 
-models.Base.metadata.create_all(bind=engine)
+from . import gpss, jobs, migrations, models, patching, reports, schemas, storage
+from .compression import CompressionMiddleware, compression_metrics
+from .database import DB_POOL_TIMEOUT, SessionLocal, engine, pool_metrics
 
-app = FastAPI()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async with engine.begin() as connection:
+        await connection.run_sync(models.Base.metadata.create_all)
+        await connection.run_sync(migrations.upgrade)
+    await jobs.interrupted()
+    await jobs.job_queue.start()
+    yield
+    await jobs.job_queue.stop()
+    await engine.dispose()
 
-def get_db():
-    db = SessionLocal()
-    try:
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(CompressionMiddleware)
+
+
+async def get_db():
+    async with SessionLocal() as db:
+        try:
+            await pool_metrics.acquire(db)
+        except PoolTimeout:
+            raise HTTPException(
+                status_code=503,
+                detail="database connection pool exhausted",
+                headers={"Retry-After": str(max(1, round(DB_POOL_TIMEOUT)))},
+            ) from None
         yield db
-    finally:
-        db.close()
+
+
+@app.get("/metrics/pool")
+async def get_pool_metrics():
+    """Connection pool occupancy and how long requests waited for a connection."""
+    return pool_metrics.snapshot()
+
+
+@app.get("/metrics/compression")
+async def get_compression_metrics():
+    """Response bytes before and after compression, per negotiated encoding."""
+    return compression_metrics.snapshot()
+
+
+@app.get("/metrics/jobs")
+async def get_job_metrics():
+    """Simulation job queue occupancy and outcomes in this process."""
+    return jobs.job_queue.snapshot()
 
 
 @app.post("/topologies", response_model=schemas.Topology)
-def create_topology(topology: schemas.TopologyCreate, db: Session = Depends(get_db)):
+async def create_topology(topology: schemas.TopologyCreate, db: AsyncSession = Depends(get_db)):
     db_topology = models.Topology(name=topology.name, data=topology.data)
     db.add(db_topology)
-    db.commit()
-    db.refresh(db_topology)
+    await db.flush()
+    await storage.written(db, db_topology.id, topology.data)
+    await db.commit()
+    await db.refresh(db_topology)
     return db_topology
 
 
 @app.get("/topologies", response_model=list[schemas.Topology])
-def list_topologies(db: Session = Depends(get_db)):
-    return db.query(models.Topology).order_by(models.Topology.updated_at.desc()).all()
+async def list_topologies(db: AsyncSession = Depends(get_db)):
+    result = await db.scalars(select(models.Topology).order_by(models.Topology.updated_at.desc()))
+    return result.all()
 
 
-@app.put("/topologies/{topology_id}", response_model=schemas.Topology)
-def update_topology(
-    topology_id: int, topology: schemas.TopologyUpdate, db: Session = Depends(get_db)
+def encode_cursor(updated_at: datetime, topology_id: int) -> str:
+    raw = f"{updated_at.isoformat()}|{topology_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        updated_at, topology_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(updated_at), int(topology_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="invalid cursor") from None
+
+
+@app.get("/topologies/summary", response_model=schemas.TopologyPage)
+async def list_topology_summaries(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    node_type: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
 ):
-    db_topology = (
-        db.query(models.Topology).filter(models.Topology.id == topology_id).first()
+    """List topologies newest first without their ``data`` body.
+
+    Pages are keyed on ``(updated_at, id)`` rather than offsets, so each page is
+    an index range scan regardless of how deep the client has paged.
+    ``node_type`` keeps topologies containing at least one node of that type.
+    """
+    query = select(
+        models.Topology.id,
+        models.Topology.name,
+        models.Topology.created_at,
+        models.Topology.updated_at,
+        models.Topology.node_count,
+        models.Topology.edge_count,
+        models.Topology.version,
     )
+    if cursor is not None:
+        query = query.where(
+            tuple_(models.Topology.updated_at, models.Topology.id) < decode_cursor(cursor)
+        )
+    if node_type is not None:
+        await storage.ensure_all(db)
+        query = query.where(
+            exists().where(
+                models.TopologyNode.node_type == node_type,
+                models.TopologyNode.topology_id == models.Topology.id,
+            )
+        )
+    rows = (
+        await db.execute(
+            query.order_by(models.Topology.updated_at.desc(), models.Topology.id.desc()).limit(limit + 1)
+        )
+    ).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].updated_at, rows[-1].id)
+    return schemas.TopologyPage(
+        items=[schemas.TopologySummary(**row._mapping) for row in rows], next_cursor=next_cursor
+    )
+
+
+def etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def expected_version(if_match: Optional[str]) -> Optional[int]:
+    """Version named by an ``If-Match`` header; None for ``*`` or no header."""
+    if if_match is None or if_match.strip() == "*":
+        return None
+    try:
+        return int(if_match.strip().removeprefix("W/").strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="invalid If-Match header") from None
+
+
+@app.get("/topologies/{topology_id}", response_model=schemas.Topology)
+async def get_topology(topology_id: int, response: Response, db: AsyncSession = Depends(get_db)):
+    db_topology = await db.get(models.Topology, topology_id)
+    if db_topology is None:
+        raise HTTPException(status_code=404, detail="topology not found")
+    response.headers["ETag"] = etag(db_topology.version)
+    return db_topology
+
+
+@app.put("/topologies/{topology_id}", response_model=schemas.Topology)
+async def update_topology(
+    topology_id: int,
+    topology: schemas.TopologyUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
+):
+    db_topology = await db.get(models.Topology, topology_id)
     if db_topology is None:
         raise HTTPException(status_code=404, detail="topology not found")
+    version = expected_version(if_match)
+    if version is not None and version != db_topology.version:
+        raise HTTPException(status_code=412, detail="topology was modified")
 
     db_topology.data = topology.data
     if topology.name is not None:
         db_topology.name = topology.name
     db.add(db_topology)
-    db.commit()
-    db.refresh(db_topology)
+    try:
+        await db.flush()
+    except StaleDataError:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="topology was modified concurrently") from None
+    await storage.written(db, topology_id, topology.data)
+    await db.commit()
+    await db.refresh(db_topology)
+    response.headers["ETag"] = etag(db_topology.version)
     return db_topology
+
+
+@app.patch("/topologies/{topology_id}", response_model=schemas.TopologySummary)
+async def patch_topology(
+    topology_id: int,
+    patch: Union[list[schemas.PatchOperation], schemas.TopologyDelta],
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
+):
+    """Apply a JSON Patch (RFC 6902) or a node/edge delta to ``data``.
+
+    ``If-Match`` with the current ETag is required so concurrent editors cannot
+    silently overwrite each other. On PostgreSQL the patch runs as one UPDATE on
+    the ``jsonb`` value, so the document is never sent to the application.
+    """
+    if if_match is None:
+        raise HTTPException(status_code=428, detail="If-Match header is required")
+    version = expected_version(if_match)
+    try:
+        if db.bind.dialect.name == "postgresql" and patching.in_database(patch):
+            row = await patch_in_database(db, topology_id, version, patch)
+        else:
+            row = await patch_in_python(db, topology_id, version, patch)
+    except patching.PatchError as error:
+        await db.rollback()
+        raise HTTPException(status_code=422, detail=str(error)) from None
+    except DBAPIError as error:
+        await db.rollback()
+        raise HTTPException(status_code=422, detail=f"patch cannot be applied: {error.orig}") from None
+    response.headers["ETag"] = etag(row.version)
+    return row
+
+
+async def patch_in_database(
+    db: AsyncSession,
+    topology_id: int,
+    version: Optional[int],
+    patch: Union[list[schemas.PatchOperation], schemas.TopologyDelta],
+) -> schemas.TopologySummary:
+    row = await patching.patch_postgresql(db, topology_id, version, patch)
+    if row is None:
+        current = await db.scalar(select(models.Topology.version).where(models.Topology.id == topology_id))
+        if current is None:
+            raise HTTPException(status_code=404, detail="topology not found")
+        if version is not None and current != version:
+            raise HTTPException(status_code=412, detail="topology was modified")
+        index = await patching.failed_operation(db, topology_id, patch)
+        if index is None:
+            # Every precondition holds on the stored document now: it changed between the two statements.
+            raise HTTPException(status_code=409, detail="topology was modified concurrently")
+        raise patching.PatchError(f"operation {index} ({patch[index].op}) cannot be applied")
+    if isinstance(patch, schemas.TopologyDelta):
+        await storage.delta_written(db, topology_id, patch, row["version"] - 1)
+    else:
+        await storage.written(db, topology_id)
+    await db.commit()
+    return schemas.TopologySummary(**row)
+
+
+async def patch_in_python(
+    db: AsyncSession,
+    topology_id: int,
+    version: Optional[int],
+    patch: Union[list[schemas.PatchOperation], schemas.TopologyDelta],
+) -> models.Topology:
+    db_topology = await db.scalar(
+        select(models.Topology).where(models.Topology.id == topology_id).with_for_update()
+    )
+    if db_topology is None:
+        raise HTTPException(status_code=404, detail="topology not found")
+    if version is not None and version != db_topology.version:
+        raise HTTPException(status_code=412, detail="topology was modified")
+    previous_version = db_topology.version
+    # Copying and patching a large document is CPU-bound; keep it off the event loop.
+    db_topology.data = await run_in_threadpool(patching.apply, db_topology.data, patch)
+    try:
+        await db.flush()
+    except StaleDataError:
+        await db.rollback()
+        raise HTTPException(status_code=412, detail="topology was modified") from None
+    if isinstance(patch, schemas.TopologyDelta):
+        await storage.delta_written(db, topology_id, patch, previous_version)
+    else:
+        await storage.written(db, topology_id, db_topology.data)
+    await db.commit()
+    await db.refresh(db_topology)
+    return db_topology
+
+
+def decode_ord(cursor: Optional[str]) -> int:
+    if cursor is None:
+        return 0
+    try:
+        return int(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="invalid cursor") from None
+
+
+async def item_page(db: AsyncSession, query, model, cursor: Optional[str], limit: int) -> schemas.TopologyItems:
+    rows = (await db.execute(query.where(model.ord > decode_ord(cursor)).order_by(model.ord).limit(limit + 1))).all()
+    next_cursor = str(rows[limit - 1].ord) if len(rows) > limit else None
+    return schemas.TopologyItems(items=[row.data for row in rows[:limit]], next_cursor=next_cursor)
+
+
+async def require_items(db: AsyncSession, topology_id: int) -> None:
+    if not await storage.ensure(db, topology_id):
+        raise HTTPException(status_code=404, detail="topology not found")
+
+
+def viewport(query, min_lat: float, max_lat: float, min_lon: float, max_lon: float):
+    query = query.where(models.TopologyNode.lat.between(min_lat, max_lat))
+    if min_lon <= max_lon:
+        return query.where(models.TopologyNode.lon.between(min_lon, max_lon))
+    # The viewport crosses the antimeridian.
+    return query.where(or_(models.TopologyNode.lon >= min_lon, models.TopologyNode.lon <= max_lon))
+
+
+@app.get("/topologies/{topology_id}/nodes", response_model=schemas.TopologyItems)
+async def list_topology_nodes(
+    topology_id: int,
+    node_type: Optional[str] = None,
+    min_lat: Optional[float] = None,
+    max_lat: Optional[float] = None,
+    min_lon: Optional[float] = None,
+    max_lon: Optional[float] = None,
+    limit: int = Query(1000, ge=1, le=10000),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """Nodes of a topology, optionally by type and inside a lat/lon box, without loading ``data``."""
+    await require_items(db, topology_id)
+    query = select(models.TopologyNode.ord, models.TopologyNode.data).where(
+        models.TopologyNode.topology_id == topology_id
+    )
+    if node_type is not None:
+        query = query.where(models.TopologyNode.node_type == node_type)
+    bounds = (min_lat, max_lat, min_lon, max_lon)
+    if any(bound is not None for bound in bounds):
+        if any(bound is None for bound in bounds):
+            raise HTTPException(status_code=400, detail="min_lat, max_lat, min_lon and max_lon go together")
+        query = viewport(query, *bounds)
+    return await item_page(db, query, models.TopologyNode, cursor, limit)
+
+
+@app.get("/topologies/{topology_id}/edges", response_model=schemas.TopologyItems)
+async def list_topology_edges(
+    topology_id: int,
+    node: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=10000),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """Edges of a topology; ``node`` keeps the edges with that node at either end."""
+    await require_items(db, topology_id)
+    query = select(models.TopologyEdge.ord, models.TopologyEdge.data).where(
+        models.TopologyEdge.topology_id == topology_id
+    )
+    if node is not None:
+        query = query.where(or_(models.TopologyEdge.source == node, models.TopologyEdge.target == node))
+    return await item_page(db, query, models.TopologyEdge, cursor, limit)
+
+
+@app.get("/topologies/{topology_id}/interfaces", response_model=schemas.TopologyItems)
+async def list_topology_interfaces(
+    topology_id: int,
+    node: Optional[str] = None,
+    edge: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=10000),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """Node interfaces, by owning node and/or the edge they are attached to."""
+    await require_items(db, topology_id)
+    query = select(models.TopologyInterface.id, models.TopologyInterface.data).where(
+        models.TopologyInterface.topology_id == topology_id
+    )
+    if node is not None:
+        query = query.where(models.TopologyInterface.node_id == node)
+    if edge is not None:
+        query = query.where(models.TopologyInterface.edge_id == edge)
+    # ``ord`` is only unique within a node, so pages are keyed on the row id.
+    rows = (
+        await db.execute(
+            query.where(models.TopologyInterface.id > decode_ord(cursor))
+            .order_by(models.TopologyInterface.id)
+            .limit(limit + 1)
+        )
+    ).all()
+    next_cursor = str(rows[limit - 1].id) if len(rows) > limit else None
+    return schemas.TopologyItems(items=[row.data for row in rows[:limit]], next_cursor=next_cursor)
+
+
+@app.get("/topologies/{topology_id}/viewport", response_model=schemas.TopologyView)
+async def get_topology_viewport(
+    topology_id: int,
+    min_lat: float = Query(..., ge=-90, le=90),
+    max_lat: float = Query(..., ge=-90, le=90),
+    min_lon: float = Query(..., ge=-180, le=180),
+    max_lon: float = Query(..., ge=-180, le=180),
+    limit: int = Query(5000, ge=1, le=50000),
+    db: AsyncSession = Depends(get_db),
+):
+    """Partial load for a map view: nodes inside the box and the edges touching them."""
+    await require_items(db, topology_id)
+    inside = viewport(
+        select(models.TopologyNode.node_id, models.TopologyNode.data).where(
+            models.TopologyNode.topology_id == topology_id
+        ),
+        min_lat, max_lat, min_lon, max_lon,
+    ).order_by(models.TopologyNode.ord)
+    nodes = (await db.execute(inside.limit(limit + 1))).all()
+    truncated = len(nodes) > limit
+    node_ids = select(inside.limit(limit).subquery().c.node_id)
+    edges = (
+        await db.execute(
+            select(models.TopologyEdge.data)
+            .where(
+                models.TopologyEdge.topology_id == topology_id,
+                or_(models.TopologyEdge.source.in_(node_ids), models.TopologyEdge.target.in_(node_ids)),
+            )
+            .order_by(models.TopologyEdge.ord)
+        )
+    ).all()
+    return schemas.TopologyView(
+        nodes=[node.data for node in nodes[:limit]], edges=[edge.data for edge in edges], truncated=truncated
+    )
+
+
+def queue_full() -> HTTPException:
+    return HTTPException(status_code=503, detail="simulation job queue is full", headers={"Retry-After": "5"})
+
+
+@app.post("/topologies/{topology_id}/jobs", response_model=schemas.Job, status_code=202)
+async def submit_job(
+    topology_id: int, job: schemas.JobCreate, response: Response, db: AsyncSession = Depends(get_db)
+):
+    """Simulate the topology in the background; follow the job at ``/jobs/{id}/events``.
+
+    The result is keyed by a hash of the topology document and the settings. A
+    stored result answers at once (200, ``cached``), and an identical job still
+    queued or running is returned instead of starting another one.
+    """
+    if job.replications > jobs.JOB_MAX_REPLICATIONS:
+        raise HTTPException(
+            status_code=422, detail=f"at most {jobs.JOB_MAX_REPLICATIONS} replications per job"
+        )
+    db_topology = await db.get(models.Topology, topology_id)
+    if db_topology is None:
+        raise HTTPException(status_code=404, detail="topology not found")
+    # gpss-api gets the document renamed the way the frontend sends it, so the code matches a download.
+    document = await run_in_threadpool(gpss.document, db_topology.data)
+    key = await run_in_threadpool(jobs.input_hash, document, job.mode, job.seed, job.replications)
+    settings = {"topology_id": topology_id, "input_hash": key, "mode": job.mode, "seed": job.seed,
+                "replications": job.replications}
+    result = await db.scalar(select(models.SimulationResult).where(models.SimulationResult.input_hash == key))
+    if result is not None:
+        now = datetime.utcnow()
+        db_job = models.SimulationJob(
+            **settings, status="done", progress=1.0, cached=True, result=result, started_at=now, finished_at=now
+        )
+        db.add(db_job)
+        await db.commit()
+        jobs.job_queue.reused += 1
+        response.status_code = 200
+        return db_job
+    running = await db.scalar(
+        select(models.SimulationJob)
+        .where(models.SimulationJob.input_hash == key, models.SimulationJob.status.in_(("queued", "running")))
+        .order_by(models.SimulationJob.id)
+        .limit(1)
+    )
+    if running is not None:
+        return running
+    if jobs.job_queue.full():
+        jobs.job_queue.rejected += 1
+        raise queue_full()
+    db_job = models.SimulationJob(**settings, status="queued")
+    db.add(db_job)
+    await db.commit()
+    # Queued only once committed, so the worker always finds the row.
+    if not jobs.job_queue.submit(db_job, document):
+        await db.delete(db_job)
+        await db.commit()
+        raise queue_full()
+    return db_job
+
+
+async def require_job(db: AsyncSession, job_id: int) -> models.SimulationJob:
+    db_job = await db.get(models.SimulationJob, job_id, populate_existing=True)
+    if db_job is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    return db_job
+
+
+@app.get("/topologies/{topology_id}/jobs", response_model=list[schemas.Job])
+async def list_topology_jobs(
+    topology_id: int, limit: int = Query(50, ge=1, le=500), db: AsyncSession = Depends(get_db)
+):
+    """The topology's jobs, newest first."""
+    result = await db.scalars(
+        select(models.SimulationJob)
+        .where(models.SimulationJob.topology_id == topology_id)
+        .order_by(models.SimulationJob.id.desc())
+        .limit(limit)
+    )
+    return result.unique().all()
+
+
+@app.get("/jobs/{job_id}", response_model=schemas.Job)
+async def get_job(job_id: int, db: AsyncSession = Depends(get_db)):
+    return await require_job(db, job_id)
+
+
+@app.get("/jobs/{job_id}/code", response_class=PlainTextResponse)
+async def get_job_code(job_id: int, db: AsyncSession = Depends(get_db)):
+    """GPSS code the finished job simulated."""
+    db_job = await require_job(db, job_id)
+    if db_job.result is None:
+        raise HTTPException(status_code=409, detail=f"job is {db_job.status}")
+    return PlainTextResponse(db_job.result.code or "")
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: int):
+    """Server-sent events with the job's state: one event per change, named by its status.
+
+    The stream ends after the ``done`` or ``failed`` event, which carries the result or the error.
+    """
+    async with SessionLocal() as db:
+        await require_job(db, job_id)
+
+    async def events():
+        sent = None
+        while True:
+            changed = jobs.job_queue.watch(job_id)
+            async with SessionLocal() as db:
+                db_job = await db.get(models.SimulationJob, job_id)
+                if db_job is None:
+                    return
+                state = schemas.Job.model_validate(db_job, from_attributes=True).model_dump_json()
+            if state != sent:
+                yield f"event: {db_job.status}\ndata: {state}\n\n"
+                sent = state
+            if db_job.status in jobs.FINISHED:
+                jobs.job_queue.forget(job_id)
+                return
+            try:
+                await asyncio.wait_for(changed.wait(), jobs.JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/topologies/{topology_id}/reports", response_model=list[schemas.ReportRun], status_code=201)
+async def upload_report(
+    topology_id: int, request: Request, name: Optional[str] = None, db: AsyncSession = Depends(get_db)
+):
+    """Store a GPSS World standard report of the topology's generated model.
+
+    The body is the report text, read as it arrives. Queues, facilities,
+    storages and savevalues are matched to the nodes and interfaces they were
+    generated for. A file with several reports yields one run per report.
+    """
+    if await db.get(models.Topology, topology_id) is None:
+        raise HTTPException(status_code=404, detail="topology not found")
+    try:
+        runs = await reports.load(db, topology_id, name, request.stream())
+    except reports.ReportError as error:
+        await db.rollback()
+        raise HTTPException(status_code=422, detail=str(error)) from None
+    await db.commit()
+    return runs
+
+
+@app.get("/topologies/{topology_id}/reports", response_model=list[schemas.ReportRun])
+async def list_topology_reports(topology_id: int, db: AsyncSession = Depends(get_db)):
+    result = await db.scalars(
+        select(models.ReportRun).where(models.ReportRun.topology_id == topology_id).order_by(models.ReportRun.id)
+    )
+    return result.all()
+
+
+@app.get("/reports/compare", response_model=schemas.ReportComparison)
+async def compare_reports(
+    runs: list[int] = Query(..., min_length=2, max_length=20),
+    kind: Optional[str] = None,
+    node: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """Entities of several runs side by side, with the change of each run against the first."""
+    found = {run.id: run for run in await db.scalars(select(models.ReportRun).where(models.ReportRun.id.in_(runs)))}
+    if missing := [run_id for run_id in runs if run_id not in found]:
+        raise HTTPException(status_code=404, detail=f"report runs not found: {missing}")
+    return schemas.ReportComparison(
+        runs=[schemas.ReportRun.model_validate(found[run_id], from_attributes=True) for run_id in runs],
+        entities=await reports.compare(db, runs, kind, node),
+    )
+
+
+@app.get("/reports/{run_id}/entities", response_model=schemas.ReportEntities)
+async def list_report_entities(
+    run_id: int,
+    kind: Optional[str] = None,
+    node: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=10000),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """Rows of one run, by table and/or the node they belong to."""
+    if await db.get(models.ReportRun, run_id) is None:
+        raise HTTPException(status_code=404, detail="report run not found")
+    query = select(models.ReportEntity).where(
+        models.ReportEntity.run_id == run_id, models.ReportEntity.id > decode_ord(cursor)
+    )
+    if kind is not None:
+        query = query.where(models.ReportEntity.kind == kind)
+    if node is not None:
+        query = query.where(models.ReportEntity.node_id == node)
+    rows = (await db.scalars(query.order_by(models.ReportEntity.id).limit(limit + 1))).all()
+    next_cursor = str(rows[limit - 1].id) if len(rows) > limit else None
+    return schemas.ReportEntities(
+        items=[schemas.ReportEntity.model_validate(row, from_attributes=True) for row in rows[:limit]],
+        next_cursor=next_cursor,
+    )
@@ -0,0 +1,52 @@
+"""In-place schema upgrades for existing databases.
+
+The service has no migration tool and ``metadata.create_all`` only creates
+missing tables. Columns and indexes added to ``topologies`` after it was first
+created are therefore applied here on startup, and existing rows are backfilled.
+"""
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+
+from . import models
+
+# column name -> (DDL type, backfill statement per dialect)
+COLUMNS: dict[str, tuple[str, dict[str, str]]] = {
+    "node_count": (
+        "INTEGER NOT NULL DEFAULT 0",
+        {
+            "postgresql": "UPDATE topologies SET node_count = CASE WHEN jsonb_typeof(data->'nodes') = 'array' "
+            "THEN jsonb_array_length(data->'nodes') ELSE 0 END",
+            "sqlite": "UPDATE topologies SET node_count = COALESCE(json_array_length(data, '$.nodes'), 0)",
+        },
+    ),
+    "edge_count": (
+        "INTEGER NOT NULL DEFAULT 0",
+        {
+            "postgresql": "UPDATE topologies SET edge_count = CASE WHEN jsonb_typeof(data->'edges') = 'array' "
+            "THEN jsonb_array_length(data->'edges') ELSE 0 END",
+            "sqlite": "UPDATE topologies SET edge_count = COALESCE(json_array_length(data, '$.edges'), 0)",
+        },
+    ),
+    "version": ("INTEGER NOT NULL DEFAULT 1", {}),
+    "items_version": ("INTEGER", {}),
+}
+
+
+def upgrade(connection: Connection) -> None:
+    """Add missing ``topologies`` columns and indexes declared on the model.
+
+    Runs on a sync connection, e.g. through ``AsyncConnection.run_sync``.
+    """
+    inspector = inspect(connection)
+    if not inspector.has_table(models.Topology.__tablename__):
+        return
+    existing = {column["name"] for column in inspector.get_columns(models.Topology.__tablename__)}
+    for name, (ddl, backfill) in COLUMNS.items():
+        if name in existing:
+            continue
+        connection.execute(text(f"ALTER TABLE topologies ADD COLUMN {name} {ddl}"))
+        if connection.dialect.name in backfill:
+            connection.execute(text(backfill[connection.dialect.name]))
+    for index in models.Topology.__table__.indexes:
+        index.create(bind=connection, checkfirst=True)
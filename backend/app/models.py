@@ -1,6 +1,9 @@
 from datetime import datetime
-from sqlalchemy import Column, DateTime, Integer, String
+from typing import Any
+
+from sqlalchemy import JSON, Boolean, Column, DateTime, Float, ForeignKey, Index, Integer, String, Text
 from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import relationship, validates
 
 from .database import Base
 
@@ -10,8 +13,197 @@ class Topology(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
-    data = Column(JSONB, nullable=False)
+    # JSONB on PostgreSQL; plain JSON elsewhere so the model also runs on SQLite.
+    data = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(
         DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False
     )
+    # Denormalised sizes of ``data`` so listings never have to read the JSON body.
+    node_count = Column(Integer, default=0, server_default="0", nullable=False)
+    edge_count = Column(Integer, default=0, server_default="0", nullable=False)
+    # Bumped on every write; clients send it back in If-Match for optimistic locking.
+    version = Column(Integer, default=1, server_default="1", nullable=False)
+    # ``version`` the node/interface/edge rows were last built from; NULL or
+    # behind ``version`` means they are stale (see ``storage``).
+    items_version = Column(Integer, nullable=True)
+
+    __mapper_args__ = {"version_id_col": version}
+
+    # Keyset pagination walks (updated_at, id) in descending order.
+    __table_args__ = (Index("ix_topologies_updated_at_id", "updated_at", "id"),)
+
+    @validates("data")
+    def _count_items(self, key: str, data: Any) -> Any:
+        self.node_count = count_items(data, "nodes")
+        self.edge_count = count_items(data, "edges")
+        return data
+
+
+def _items_data() -> Column:
+    return Column(JSON().with_variant(JSONB(), "postgresql"), nullable=False)
+
+
+class TopologyNode(Base):
+    """One element of ``Topology.data["nodes"]``, kept for indexed queries."""
+
+    __tablename__ = "topology_nodes"
+
+    id = Column(Integer, primary_key=True)
+    topology_id = Column(Integer, ForeignKey("topologies.id", ondelete="CASCADE"), nullable=False)
+    node_id = Column(String, nullable=False)
+    # Sort key preserving document order; not an array index after deletions.
+    ord = Column(Integer, nullable=False)
+    node_type = Column(String, nullable=True)
+    label = Column(String, nullable=True)
+    lat = Column(Float, nullable=True)
+    lon = Column(Float, nullable=True)
+    altitude = Column(Float, nullable=True)
+    data = _items_data()
+
+    __table_args__ = (
+        Index("ix_topology_nodes_topology_id_ord", "topology_id", "ord"),
+        Index("ix_topology_nodes_topology_id_node_id", "topology_id", "node_id"),
+        Index("ix_topology_nodes_node_type_topology_id", "node_type", "topology_id"),
+        Index("ix_topology_nodes_topology_id_lat_lon", "topology_id", "lat", "lon"),
+    )
+
+
+class TopologyInterface(Base):
+    """One element of a node's ``data.interfaces``."""
+
+    __tablename__ = "topology_interfaces"
+
+    id = Column(Integer, primary_key=True)
+    topology_id = Column(Integer, ForeignKey("topologies.id", ondelete="CASCADE"), nullable=False)
+    node_id = Column(String, nullable=False)
+    interface_id = Column(String, nullable=False)
+    ord = Column(Integer, nullable=False)
+    direction = Column(String, nullable=True)
+    idx = Column(Integer, nullable=True)
+    edge_id = Column(String, nullable=True)
+    data = _items_data()
+
+    __table_args__ = (
+        Index("ix_topology_interfaces_topology_id_node_id", "topology_id", "node_id", "ord"),
+        Index("ix_topology_interfaces_topology_id_edge_id", "topology_id", "edge_id"),
+    )
+
+
+class TopologyEdge(Base):
+    """One element of ``Topology.data["edges"]`` with its endpoints."""
+
+    __tablename__ = "topology_edges"
+
+    id = Column(Integer, primary_key=True)
+    topology_id = Column(Integer, ForeignKey("topologies.id", ondelete="CASCADE"), nullable=False)
+    edge_id = Column(String, nullable=False)
+    ord = Column(Integer, nullable=False)
+    source = Column(String, nullable=True)
+    target = Column(String, nullable=True)
+    data = _items_data()
+
+    __table_args__ = (
+        Index("ix_topology_edges_topology_id_ord", "topology_id", "ord"),
+        Index("ix_topology_edges_topology_id_edge_id", "topology_id", "edge_id"),
+        Index("ix_topology_edges_topology_id_source", "topology_id", "source"),
+        Index("ix_topology_edges_topology_id_target", "topology_id", "target"),
+    )
+
+
+class SimulationResult(Base):
+    """Generated code and metrics of one simulated input, shared by every job with the same ``input_hash``."""
+
+    __tablename__ = "simulation_results"
+
+    id = Column(Integer, primary_key=True)
+    # Topology the input was first read from; the result outlives it for other identical inputs.
+    topology_id = Column(Integer, ForeignKey("topologies.id", ondelete="SET NULL"), nullable=True, index=True)
+    input_hash = Column(String(64), nullable=False, unique=True)
+    code = Column(Text, nullable=True)
+    metrics = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class SimulationJob(Base):
+    """One submitted simulation of a topology; see ``jobs``."""
+
+    __tablename__ = "simulation_jobs"
+
+    id = Column(Integer, primary_key=True)
+    topology_id = Column(Integer, ForeignKey("topologies.id", ondelete="CASCADE"), nullable=False)
+    input_hash = Column(String(64), nullable=False)
+    mode = Column(String, nullable=False)
+    seed = Column(Integer, nullable=True)
+    replications = Column(Integer, nullable=False)
+    # queued -> running -> done | failed
+    status = Column(String, nullable=False)
+    progress = Column(Float, default=0.0, server_default="0", nullable=False)
+    # Statistics over the replications finished so far.
+    partial = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=True)
+    error = Column(Text, nullable=True)
+    # True when the result was found stored rather than computed by this job.
+    cached = Column(Boolean, default=False, server_default="0", nullable=False)
+    result_id = Column(Integer, ForeignKey("simulation_results.id", ondelete="SET NULL"), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    result = relationship(SimulationResult, lazy="joined")
+
+    __table_args__ = (
+        Index("ix_simulation_jobs_topology_id_id", "topology_id", "id"),
+        Index("ix_simulation_jobs_input_hash_status", "input_hash", "status"),
+    )
+
+
+class ReportRun(Base):
+    """One GPSS World report uploaded for a topology; see ``reports``."""
+
+    __tablename__ = "report_runs"
+
+    id = Column(Integer, primary_key=True)
+    topology_id = Column(Integer, ForeignKey("topologies.id", ondelete="CASCADE"), nullable=False)
+    name = Column(String, nullable=True)
+    # Model title from the report header and the report's number within the upload.
+    model = Column(String, nullable=True)
+    report = Column(Integer, nullable=False)
+    start_time = Column(Float, nullable=True)
+    end_time = Column(Float, nullable=True)
+    entities = Column(Integer, default=0, nullable=False)
+    # Entities whose name matches no node or interface of the topology.
+    unmatched = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (Index("ix_report_runs_topology_id_id", "topology_id", "id"),)
+
+
+class ReportEntity(Base):
+    """One row of a report's FACILITY, QUEUE, STORAGE or SAVEVALUE table."""
+
+    __tablename__ = "report_entities"
+
+    id = Column(Integer, primary_key=True)
+    run_id = Column(Integer, ForeignKey("report_runs.id", ondelete="CASCADE"), nullable=False)
+    kind = Column(String, nullable=False)
+    name = Column(String, nullable=False)
+    node_id = Column(String, nullable=True)
+    interface_id = Column(String, nullable=True)
+    entries = Column(Integer, nullable=True)
+    utilization = Column(Float, nullable=True)
+    avg_time = Column(Float, nullable=True)
+    avg_content = Column(Float, nullable=True)
+    max_content = Column(Integer, nullable=True)
+    value = Column(Float, nullable=True)
+    # Every column of the report row.
+    data = _items_data()
+
+    __table_args__ = (
+        Index("ix_report_entities_run_id_kind_name", "run_id", "kind", "name"),
+        Index("ix_report_entities_run_id_node_id", "run_id", "node_id"),
+    )
+
+
+def count_items(data: Any, key: str) -> int:
+    items = data.get(key) if isinstance(data, dict) else None
+    return len(items) if isinstance(items, list) else 0
@@ -0,0 +1,383 @@
+"""Partial updates of a topology's ``data`` document.
+
+Two kinds of patch are supported:
+
+* RFC 6902 JSON Patch operations (``add``, ``remove``, ``replace``, ``move``,
+  ``copy``, ``test``);
+* a node/edge-level delta (``schemas.TopologyDelta``): upserts and removals by
+  ``id`` plus replacement of the ``model``/``gpss`` sections. It uses the same
+  envelope as gpss-api's ``/gpss/gen-delta``.
+
+On PostgreSQL a patch is compiled into a chain of single-row CTEs over ``jsonb``
+(``jsonb_set``, ``jsonb_insert``, ``#-``, ...). Each step sees the previous
+document, so the statement grows linearly with the number of operations and
+the document never leaves the database. Long JSON Patches and other dialects
+apply the same semantics in Python.
+"""
+
+import copy
+from typing import Any, Optional, Union
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import schemas
+from .database import dumps
+
+MAX_OPERATIONS = 1000
+# Every CTE step rebuilds the whole ``jsonb`` value, so long JSON Patches are
+# cheaper to apply once in Python under a row lock.
+IN_DATABASE_MAX_OPERATIONS = 32
+# Delta upserts up to this many items per array are written in place by position;
+# larger batches and removals rebuild the array in one pass.
+IN_PLACE_MAX_ITEMS = 4
+
+
+class PatchError(ValueError):
+    """The patch is malformed or cannot be applied to the current document."""
+
+
+def pointer(path: str) -> list[str]:
+    """Split an RFC 6901 JSON Pointer into unescaped reference tokens."""
+    if path == "":
+        return []
+    if not path.startswith("/"):
+        raise PatchError(f"invalid JSON pointer {path!r}")
+    return [token.replace("~1", "/").replace("~0", "~") for token in path[1:].split("/")]
+
+
+def is_index(token: str) -> bool:
+    """Whether ``token`` is an array index RFC 6901 allows: digits without leading zeros."""
+    return token.isdigit() and not (len(token) > 1 and token[0] == "0")
+
+
+def array_index(token: str, length: int, allow_end: bool = False) -> int:
+    if allow_end and token == "-":
+        return length
+    if not is_index(token):
+        raise PatchError(f"invalid array index {token!r}")
+    index = int(token)
+    if index > length or (index == length and not allow_end):
+        raise PatchError(f"array index {index} out of range")
+    return index
+
+
+def resolve(document: Any, tokens: list[str]) -> Any:
+    for token in tokens:
+        if isinstance(document, dict):
+            if token not in document:
+                raise PatchError(f"path /{'/'.join(tokens)} does not exist")
+            document = document[token]
+        elif isinstance(document, list):
+            document = document[array_index(token, len(document))]
+        else:
+            raise PatchError(f"path /{'/'.join(tokens)} does not exist")
+    return document
+
+
+def add(document: Any, tokens: list[str], value: Any) -> Any:
+    if not tokens:
+        return value
+    parent = resolve(document, tokens[:-1])
+    if isinstance(parent, dict):
+        parent[tokens[-1]] = value
+    elif isinstance(parent, list):
+        parent.insert(array_index(tokens[-1], len(parent), allow_end=True), value)
+    else:
+        raise PatchError(f"cannot add to a scalar at /{'/'.join(tokens[:-1])}")
+    return document
+
+
+def remove(document: Any, tokens: list[str]) -> tuple[Any, Any]:
+    if not tokens:
+        raise PatchError("cannot remove the whole document")
+    parent = resolve(document, tokens[:-1])
+    if isinstance(parent, dict):
+        if tokens[-1] not in parent:
+            raise PatchError(f"path /{'/'.join(tokens)} does not exist")
+        return document, parent.pop(tokens[-1])
+    if isinstance(parent, list):
+        return document, parent.pop(array_index(tokens[-1], len(parent)))
+    raise PatchError(f"path /{'/'.join(tokens)} does not exist")
+
+
+def apply_operations(document: Any, operations: list[schemas.PatchOperation]) -> Any:
+    """Apply JSON Patch operations to a copy of ``document``."""
+    if len(operations) > MAX_OPERATIONS:
+        raise PatchError(f"at most {MAX_OPERATIONS} operations per patch")
+    document = copy.deepcopy(document)
+    for index, operation in enumerate(operations):
+        try:
+            tokens = pointer(operation.path)
+            if operation.op == "add":
+                document = add(document, tokens, copy.deepcopy(operation.value))
+            elif operation.op == "remove":
+                document, _ = remove(document, tokens)
+            elif operation.op == "replace":
+                resolve(document, tokens)
+                if tokens:
+                    document, _ = remove(document, tokens)
+                document = add(document, tokens, copy.deepcopy(operation.value))
+            elif operation.op == "move":
+                source = pointer(operation.from_)
+                if tokens[: len(source)] == source and tokens != source:
+                    raise PatchError("cannot move a value into its own child")
+                document, value = remove(document, source)
+                document = add(document, tokens, value)
+            elif operation.op == "copy":
+                value = copy.deepcopy(resolve(document, pointer(operation.from_)))
+                document = add(document, tokens, value)
+            elif resolve(document, tokens) != operation.value:
+                raise PatchError(f"test failed at {operation.path}")
+        except PatchError as error:
+            raise PatchError(f"operation {index} ({operation.op}): {error}") from None
+    return document
+
+
+def merge_items(items: Any, upserts: list[dict[str, Any]], removed: list[str]) -> list[Any]:
+    """Drop ``removed`` ids, replace items in place by ``id`` and append new ones."""
+    items = [item for item in items if not (isinstance(item, dict) and item.get("id") in removed)] \
+        if isinstance(items, list) else []
+    position = {item["id"]: k for k, item in enumerate(items) if isinstance(item, dict) and "id" in item}
+    for item in upserts:
+        if item["id"] in position:
+            items[position[item["id"]]] = item
+        else:
+            position[item["id"]] = len(items)
+            items.append(item)
+    return items
+
+
+def apply_delta(document: Any, delta: schemas.TopologyDelta) -> Any:
+    """Apply a node/edge-level delta to a copy of ``document``."""
+    document = dict(document) if isinstance(document, dict) else {}
+    for section in ("model", "gpss"):
+        if section in delta.model_fields_set:
+            document[section] = copy.deepcopy(getattr(delta, section))
+    document["nodes"] = merge_items(copy.deepcopy(document.get("nodes")), delta.nodes, delta.remove_nodes)
+    document["edges"] = merge_items(copy.deepcopy(document.get("edges")), delta.edges, delta.remove_edges)
+    return document
+
+
+def apply(document: Any, patch: Union[list[schemas.PatchOperation], schemas.TopologyDelta]) -> Any:
+    if isinstance(patch, list):
+        return apply_operations(document, patch)
+    return apply_delta(document, patch)
+
+
+class Steps:
+    """Builder for the PostgreSQL CTE chain ``s0 .. sN`` with ``(d, failed)`` columns.
+
+    ``d`` is the document after the step. ``failed`` holds the index of the
+    first operation whose precondition did not hold, or NULL.
+    """
+
+    def __init__(self) -> None:
+        self.steps: list[str] = []
+        self.params: dict[str, Any] = {}
+
+    def param(self, value: Any, cast: Optional[str] = None) -> str:
+        name = f"p{len(self.params)}"
+        self.params[name] = value
+        return f"CAST(:{name} AS {cast})" if cast else f":{name}"
+
+    def json(self, value: Any) -> str:
+        return self.param(dumps(value), "jsonb")
+
+    def path(self, tokens: list[str]) -> str:
+        return self.param(list(tokens), "text[]")
+
+    def step(
+        self, document: str, condition: Optional[str] = None, index: Optional[int] = None, lateral: str = ""
+    ) -> None:
+        failed = "failed"
+        if condition is not None:
+            failed = f"CASE WHEN failed IS NULL AND NOT COALESCE({condition}, false) THEN {index} ELSE failed END"
+        previous = f"s{len(self.steps)}"
+        lateral = f", LATERAL ({lateral}) AS l" if lateral else ""
+        self.steps.append(f"SELECT {document} AS d, {failed} AS failed FROM {previous}{lateral}")
+
+    def valid(self, tokens: list[str]) -> list[str]:
+        """Conditions that no token indexes an array in a way ``array_index`` rejects.
+
+        ``#>``, ``#-`` and ``jsonb_set`` also take negative and zero-padded array
+        indices (``-1`` is the last element); the Python path refuses them.
+        """
+        return [
+            f"jsonb_typeof({f'(d #> {self.path(tokens[:k])})' if k else 'd'}) <> 'array'"
+            for k, token in enumerate(tokens)
+            if not is_index(token)
+        ]
+
+    def exists(self, tokens: list[str]) -> str:
+        if not tokens:
+            return "true"
+        return " AND ".join([*self.valid(tokens), f"(d #> {self.path(tokens)}) IS NOT NULL"])
+
+    def add(self, tokens: list[str], value: str, index: int, condition: Optional[str] = None) -> None:
+        if not tokens:
+            self.step(value, condition, index)
+            return
+        parent, last = tokens[:-1], tokens[-1]
+        container = f"(d #> {self.path(parent)})" if parent else "d"
+        checks = [*self.valid(parent), f"jsonb_typeof({container}) IN ('object', 'array')"]
+        if condition is not None:
+            checks.insert(0, condition)
+        if last == "-":
+            appended = f"{container} || jsonb_build_array({value})"
+            document = (
+                f"CASE WHEN jsonb_typeof({container}) = 'array' "
+                f"THEN {f'jsonb_set(d, {self.path(parent)}, {appended})' if parent else appended} "
+                f"ELSE jsonb_set(d, {self.path(tokens)}, {value}, true) END"
+            )
+        else:
+            if is_index(last):
+                checks.append(
+                    f"(jsonb_typeof({container}) <> 'array' OR {int(last)} <= jsonb_array_length({container}))"
+                )
+            else:
+                checks.append(f"jsonb_typeof({container}) <> 'array'")
+            document = (
+                f"CASE WHEN jsonb_typeof({container}) = 'array' "
+                f"THEN jsonb_insert(d, {self.path(tokens)}, {value}) "
+                f"ELSE jsonb_set(d, {self.path(tokens)}, {value}, true) END"
+            )
+        self.step(document, " AND ".join(checks), index)
+
+    def operation(self, index: int, operation: schemas.PatchOperation) -> None:
+        tokens = pointer(operation.path)
+        if operation.op == "add":
+            self.add(tokens, self.json(operation.value), index)
+        elif operation.op == "remove":
+            if not tokens:
+                raise PatchError(f"operation {index} (remove): cannot remove the whole document")
+            self.step(f"d #- {self.path(tokens)}", self.exists(tokens), index)
+        elif operation.op == "replace":
+            document = (
+                f"jsonb_set(d, {self.path(tokens)}, {self.json(operation.value)}, false)"
+                if tokens else self.json(operation.value)
+            )
+            self.step(document, self.exists(tokens), index)
+        elif operation.op in ("move", "copy"):
+            source = pointer(operation.from_)
+            if operation.op == "move" and tokens[: len(source)] == source and tokens != source:
+                raise PatchError(f"operation {index} (move): cannot move a value into its own child")
+            value = f"(d #> {self.path(source)})" if source else "d"
+            self.step(f"d || jsonb_build_object('_patch_value', {value})", self.exists(source), index)
+            if operation.op == "move" and source:
+                self.step(f"d #- {self.path(source)}")
+            carried = "(d -> '_patch_value')"
+            self.step(f"d - '_patch_value' || jsonb_build_object('_patch_carry', {carried})")
+            self.add(tokens, "(d -> '_patch_carry')", index)
+            self.step("d - '_patch_carry'")
+        else:
+            test = f"(d #> {self.path(tokens)}) = {self.json(operation.value)}"
+            self.step("d", " AND ".join([*self.valid(tokens), test]), index)
+
+    def delta(self, delta: schemas.TopologyDelta) -> None:
+        sections = {section: getattr(delta, section) for section in ("model", "gpss") if section in delta.model_fields_set}
+        if sections:
+            self.step(f"d || {self.json(sections)}")
+        for key, upserts, removed in (
+            ("nodes", delta.nodes, delta.remove_nodes),
+            ("edges", delta.edges, delta.remove_edges),
+        ):
+            if not upserts and not removed:
+                continue
+            items = f"(CASE WHEN jsonb_typeof(d -> '{key}') = 'array' THEN d -> '{key}' ELSE '[]'::jsonb END)"
+            if not removed and len(upserts) <= IN_PLACE_MAX_ITEMS:
+                # Find the stored position by id and overwrite it, or append.
+                for item in upserts:
+                    value = self.json(item)
+                    position = (
+                        f"SELECT (SELECT e.ord - 1 FROM jsonb_array_elements({items}) WITH ORDINALITY AS e(item, ord) "
+                        f"WHERE e.item ->> 'id' = {self.param(item['id'])} LIMIT 1) AS position"
+                    )
+                    self.step(
+                        f"CASE WHEN l.position IS NULL THEN jsonb_set(d, '{{{key}}}', {items} || jsonb_build_array({value})) "
+                        f"ELSE jsonb_set(d, ARRAY['{key}', l.position::text], {value}) END",
+                        lateral=position,
+                    )
+                continue
+            upserts_param, removed_param = self.json(upserts), self.param(list(removed), "text[]")
+            # One pass over the kept items: matches are replaced in place, the
+            # remaining upserts sort after every stored position.
+            merged = (
+                "(SELECT COALESCE(jsonb_agg(COALESCE(u.item, e.item) "
+                "ORDER BY COALESCE(e.ord, 2147483647 + u.ord)), '[]'::jsonb) "
+                f"FROM (SELECT * FROM jsonb_array_elements({items}) WITH ORDINALITY AS k(item, ord) "
+                f"WHERE NOT COALESCE(k.item ->> 'id' = ANY({removed_param}), false)) AS e "
+                f"FULL JOIN jsonb_array_elements({upserts_param}) WITH ORDINALITY AS u(item, ord) "
+                "ON u.item ->> 'id' = e.item ->> 'id')"
+            )
+            self.step(f"jsonb_set(d, '{{{key}}}', {merged}, true)")
+
+    def sql(self, head: str, tail: str) -> str:
+        ctes = [f"s0 AS MATERIALIZED ({head})"] + [f"s{k + 1} AS MATERIALIZED ({step})" for k, step in enumerate(self.steps)]
+        return f"WITH {', '.join(ctes)} {tail.format(last=f's{len(self.steps)}')}"
+
+
+def in_database(patch: Union[list[schemas.PatchOperation], schemas.TopologyDelta]) -> bool:
+    """Whether ``patch`` should run as a single ``jsonb`` UPDATE on PostgreSQL."""
+    return not isinstance(patch, list) or len(patch) <= IN_DATABASE_MAX_OPERATIONS
+
+
+def unique_items(items: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Keep the last upsert per ``id`` at the position of its first occurrence."""
+    merged: dict[Any, dict[str, Any]] = {}
+    for item in items:
+        merged[item["id"]] = item
+    return list(merged.values())
+
+
+def compile_patch(patch: Union[list[schemas.PatchOperation], schemas.TopologyDelta]) -> Steps:
+    steps = Steps()
+    if isinstance(patch, list):
+        for index, operation in enumerate(patch):
+            steps.operation(index, operation)
+    else:
+        patch = patch.model_copy(update={"nodes": unique_items(patch.nodes), "edges": unique_items(patch.edges)})
+        steps.delta(patch)
+    return steps
+
+
+async def patch_postgresql(
+    db: AsyncSession,
+    topology_id: int,
+    version: Optional[int],
+    patch: Union[list[schemas.PatchOperation], schemas.TopologyDelta],
+) -> Optional[dict[str, Any]]:
+    """Apply ``patch`` in a single UPDATE; returns the new summary row or None if nothing matched.
+
+    Callers distinguish a missing row, a version mismatch and a failed
+    precondition with ``failed_operation``.
+    """
+    steps = compile_patch(patch)
+    steps.params.update(topology_id=topology_id, version=version)
+    head = (
+        "SELECT data AS d, CAST(NULL AS integer) AS failed FROM topologies "
+        "WHERE id = :topology_id AND (CAST(:version AS integer) IS NULL OR version = :version) FOR UPDATE"
+    )
+    tail = (
+        "UPDATE topologies SET data = {last}.d, "
+        "node_count = CASE WHEN jsonb_typeof({last}.d -> 'nodes') = 'array' "
+        "THEN jsonb_array_length({last}.d -> 'nodes') ELSE 0 END, "
+        "edge_count = CASE WHEN jsonb_typeof({last}.d -> 'edges') = 'array' "
+        "THEN jsonb_array_length({last}.d -> 'edges') ELSE 0 END, "
+        "version = topologies.version + 1, updated_at = timezone('utc', now()) "
+        "FROM {last} WHERE topologies.id = :topology_id AND {last}.failed IS NULL "
+        "RETURNING topologies.id, topologies.name, topologies.created_at, topologies.updated_at, "
+        "topologies.node_count, topologies.edge_count, topologies.version"
+    )
+    row = (await db.execute(text(steps.sql(head, tail)), steps.params)).mappings().first()
+    return dict(row) if row is not None else None
+
+
+async def failed_operation(
+    db: AsyncSession, topology_id: int, patch: Union[list[schemas.PatchOperation], schemas.TopologyDelta]
+) -> Optional[int]:
+    """Index of the first operation whose precondition fails on the stored document."""
+    steps = compile_patch(patch)
+    steps.params.update(topology_id=topology_id)
+    head = "SELECT data AS d, CAST(NULL AS integer) AS failed FROM topologies WHERE id = :topology_id"
+    return await db.scalar(text(steps.sql(head, "SELECT failed FROM {last}")), steps.params)
@@ -0,0 +1,281 @@
+"""GPSS World standard reports of generated models.
+
+``ReportParser`` reads a report line by line as its bytes arrive and yields the
+rows of the FACILITY, QUEUE, STORAGE and SAVEVALUE tables; it keeps only the
+current line and the table it is in, so memory does not grow with the report.
+``load`` maps every row back to the node and interface it was generated for and
+inserts the rows into ``report_entities`` in batches of ``REPORT_BATCH_ROWS``.
+
+gpss-api names entities after the interface label ``{direction}_int{idx}_{node}``
+(queues ``queue_*``, facilities ``service_*``, loss counters ``loss_*_``) and
+after the node id for the processing queue, storage and loss counter of SC,
+HAPS and ES nodes. The node in a name has its dashes removed (``gpss.name``),
+and a loss counter carries a trailing ``_`` so that it does not clash with the
+``loss_*`` block label. GPSS World prints names in upper case, so they are
+matched case-insensitively.
+"""
+
+import os
+from typing import Any, AsyncIterator, Iterator, Optional, Union
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import gpss, models, storage
+
+REPORT_BATCH_ROWS = int(os.environ.get("REPORT_BATCH_ROWS", "1000"))
+REPORT_MAX_LINE = int(os.environ.get("REPORT_MAX_LINE", "65536"))
+
+# Table header -> (second header word, columns after the entity name).
+TABLES: dict[str, tuple[str, tuple[str, ...]]] = {
+    "FACILITY": (
+        "ENTRIES",
+        ("entries", "utilization", "avg_time", "available", "owner", "pending", "interrupted", "retry", "delay"),
+    ),
+    "QUEUE": (
+        "MAX",
+        ("max", "content", "entries", "zero_entries", "avg_content", "avg_time", "avg_time_nonzero", "retry"),
+    ),
+    "STORAGE": (
+        "CAP.",
+        ("capacity", "remaining", "min", "max", "entries", "available", "avg_content", "utilization", "retry", "delay"),
+    ),
+    "SAVEVALUE": ("RETRY", ("retry", "value")),
+}
+# Indexed columns of ``report_entities`` filled from each table.
+TYPED: dict[str, dict[str, str]] = {
+    "facility": {"entries": "entries", "utilization": "utilization", "avg_time": "avg_time"},
+    "queue": {"entries": "entries", "avg_content": "avg_content", "avg_time": "avg_time", "max": "max_content"},
+    "storage": {"entries": "entries", "avg_content": "avg_content", "utilization": "utilization", "max": "max_content"},
+    "savevalue": {"value": "value"},
+}
+METRICS = ("entries", "utilization", "avg_time", "avg_content", "max_content", "value")
+INTEGERS = ("entries", "max_content")
+# Entity name prefix -> suffix after the label.
+PREFIXES = {"QUEUE_": "", "SERVICE_": "", "LOSS_": "_"}
+
+
+class ReportError(ValueError):
+    """The upload is not a GPSS report."""
+
+
+def value(token: str) -> Optional[float]:
+    try:
+        return float(token)
+    except ValueError:
+        return None
+
+
+def decode(line: bytes) -> str:
+    # GPSS World writes reports in the Windows code page; names themselves are ASCII.
+    try:
+        return line.decode()
+    except UnicodeDecodeError:
+        return line.decode("cp1251", errors="replace")
+
+
+class ReportParser:
+    """Incremental parser; ``feed`` chunks in order, then ``close``.
+
+    ``reports`` holds the header of every report in the upload (a file may hold
+    several, one per ``START``); rows carry the 1-based number of their report.
+    """
+
+    def __init__(self) -> None:
+        self.reports: list[dict[str, Any]] = []
+        self.lines = 0
+        self.rows = 0
+        self._rest = b""
+        self._table: Optional[str] = None
+        self._times = False
+
+    def feed(self, chunk: bytes) -> Iterator[tuple[int, str, str, dict[str, Union[float, str]]]]:
+        lines = (self._rest + chunk).split(b"\n")
+        self._rest = lines.pop()
+        if len(self._rest) > REPORT_MAX_LINE:
+            raise ReportError(f"line {self.lines + 1} is longer than {REPORT_MAX_LINE} bytes")
+        for line in lines:
+            row = self.line(decode(line))
+            if row is not None:
+                yield row
+
+    def close(self) -> Iterator[tuple[int, str, str, dict[str, Union[float, str]]]]:
+        rest, self._rest = self._rest, b""
+        if rest:
+            row = self.line(decode(rest))
+            if row is not None:
+                yield row
+
+    def report(self) -> dict[str, Any]:
+        if not self.reports:
+            self.reports.append({"model": None, "start_time": None, "end_time": None})
+        return self.reports[-1]
+
+    def line(self, text: str) -> Optional[tuple[int, str, str, dict[str, Union[float, str]]]]:
+        self.lines += 1
+        tokens = text.split()
+        if not tokens:
+            return None
+        if self._table is not None and len(tokens) >= 2:
+            # Table rows are by far the most common lines: numbers after the entity name.
+            try:
+                row: dict[str, Union[float, str]] = dict(zip(TABLES[self._table][1], map(float, tokens[1:])))
+            except ValueError:
+                row = self.savevalue(tokens) if self._table == "SAVEVALUE" else None
+            if row is not None:
+                self.rows += 1
+                self.report()
+                return len(self.reports), self._table.lower(), tokens[0], row
+        self._table = None
+        if "Simulation Report" in text:
+            _, _, model = text.partition(" - ")
+            self.reports.append({"model": model.strip() or None, "start_time": None, "end_time": None})
+            return None
+        if tokens[:4] == ["START", "TIME", "END", "TIME"]:
+            self._times = True
+            return None
+        if self._times:
+            self._times = False
+            if len(tokens) >= 2 and value(tokens[0]) is not None and value(tokens[1]) is not None:
+                report = self.report()
+                report["start_time"], report["end_time"] = value(tokens[0]), value(tokens[1])
+                return None
+        if len(tokens) >= 2 and tokens[0] in TABLES and tokens[1] == TABLES[tokens[0]][0]:
+            self._table = tokens[0]
+        return None
+
+    @staticmethod
+    def savevalue(tokens: list[str]) -> Optional[dict[str, Union[float, str]]]:
+        # A SAVEVALUE may hold a string instead of a number.
+        retry = value(tokens[1])
+        if retry is None or len(tokens) < 3:
+            return None
+        return {"retry": retry, "value": " ".join(tokens[2:])}
+
+
+async def owners(db: AsyncSession, topology_id: int) -> dict[str, tuple[str, Optional[str]]]:
+    """Upper-cased generated label -> (node id, interface id or None for the node itself)."""
+    await storage.ensure(db, topology_id)
+    labels: dict[str, tuple[str, Optional[str]]] = {}
+    for (node_id,) in await db.execute(
+        select(models.TopologyNode.node_id).where(models.TopologyNode.topology_id == topology_id)
+    ):
+        labels.setdefault(gpss.name(node_id).upper(), (node_id, None))
+    interfaces = select(
+        models.TopologyInterface.node_id,
+        models.TopologyInterface.interface_id,
+        models.TopologyInterface.direction,
+        models.TopologyInterface.idx,
+    ).where(models.TopologyInterface.topology_id == topology_id)
+    for node_id, interface_id, direction, idx in await db.execute(interfaces):
+        if direction is not None and idx is not None:
+            labels.setdefault(f"{direction}_int{idx}_{gpss.name(node_id)}".upper(), (node_id, interface_id))
+    return labels
+
+
+def owner(labels: dict[str, tuple[str, Optional[str]]], name: str) -> Optional[tuple[str, Optional[str]]]:
+    upper = name.upper()
+    for prefix, suffix in PREFIXES.items():
+        if not upper.startswith(prefix):
+            continue
+        label = upper[len(prefix):]
+        if suffix and label.endswith(suffix):
+            label = label[: -len(suffix)]
+        if label in labels:
+            return labels[label]
+    return None
+
+
+def typed(kind: str, row: dict[str, Union[float, str]]) -> dict[str, Any]:
+    result: dict[str, Any] = dict.fromkeys(METRICS)
+    for column, target in TYPED[kind].items():
+        number = row.get(column)
+        if type(number) is float:
+            if target in INTEGERS:
+                number = int(number) if number.is_integer() and abs(number) <= storage.INTEGER_MAX else None
+            result[target] = number
+    return result
+
+
+async def load(
+    db: AsyncSession, topology_id: int, name: Optional[str], chunks: AsyncIterator[bytes]
+) -> list[models.ReportRun]:
+    """Parse an uploaded report into one ``report_runs`` row per report it holds; the caller commits."""
+    parser = ReportParser()
+    labels = await owners(db, topology_id)
+    runs: list[models.ReportRun] = []
+    # (entities, unmatched) per run, kept off the ORM objects until the end.
+    counts: list[list[int]] = []
+    batch: list[dict[str, Any]] = []
+    table = models.ReportEntity.__table__
+
+    async def open_runs(number: int) -> None:
+        while len(runs) < number:
+            runs.append(models.ReportRun(topology_id=topology_id, name=name, report=len(runs) + 1))
+            counts.append([0, 0])
+            db.add(runs[-1])
+            await db.flush()
+
+    async def add(number: int, kind: str, entity: str, row: dict[str, Union[float, str]]) -> None:
+        if number > len(runs):
+            await open_runs(number)
+        node_id, interface_id = owner(labels, entity) or (None, None)
+        count = counts[number - 1]
+        count[0] += 1
+        count[1] += node_id is None
+        batch.append({"run_id": runs[number - 1].id, "kind": kind, "name": entity, "node_id": node_id,
+                      "interface_id": interface_id, "data": row, **typed(kind, row)})
+        if len(batch) >= REPORT_BATCH_ROWS:
+            await db.execute(table.insert(), batch)
+            batch.clear()
+
+    async for chunk in chunks:
+        for row in parser.feed(chunk):
+            await add(*row)
+    for row in parser.close():
+        await add(*row)
+    if not parser.reports:
+        raise ReportError("no GPSS report header or FACILITY, QUEUE, STORAGE or SAVEVALUE table found")
+    if batch:
+        await db.execute(table.insert(), batch)
+    await open_runs(len(parser.reports))
+    for report_run, header, (entities, unmatched) in zip(runs, parser.reports, counts):
+        report_run.entities = entities
+        report_run.unmatched = unmatched
+        report_run.model = header["model"]
+        report_run.start_time = header["start_time"]
+        report_run.end_time = header["end_time"]
+    await db.flush()
+    return runs
+
+
+def change(first: Optional[dict[str, Any]], other: Optional[dict[str, Any]]) -> Optional[dict[str, Any]]:
+    if first is None or other is None:
+        return None
+    return {
+        metric: other[metric] - first[metric] if other[metric] is not None and first[metric] is not None else None
+        for metric in METRICS
+    }
+
+
+async def compare(
+    db: AsyncSession, run_ids: list[int], kind: Optional[str] = None, node: Optional[str] = None
+) -> list[dict[str, Any]]:
+    """Entities of the runs side by side, matched by table and name, with changes against the first run."""
+    column = {run_id: k for k, run_id in enumerate(run_ids)}
+    query = select(models.ReportEntity).where(models.ReportEntity.run_id.in_(run_ids))
+    if kind is not None:
+        query = query.where(models.ReportEntity.kind == kind)
+    if node is not None:
+        query = query.where(models.ReportEntity.node_id == node)
+    entities: dict[tuple[str, str], dict[str, Any]] = {}
+    for entity in await db.scalars(query.order_by(models.ReportEntity.kind, models.ReportEntity.name)):
+        item = entities.setdefault(
+            (entity.kind, entity.name),
+            {"kind": entity.kind, "name": entity.name, "node_id": entity.node_id,
+             "interface_id": entity.interface_id, "values": [None] * len(run_ids)},
+        )
+        item["values"][column[entity.run_id]] = {metric: getattr(entity, metric) for metric in METRICS}
+    for item in entities.values():
+        item["change"] = [change(item["values"][0], values) for values in item["values"]]
+    return list(entities.values())
@@ -1,7 +1,7 @@
 from datetime import datetime
-from typing import Any
+from typing import Any, Literal, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, validator
 
 
 class TopologyCreate(BaseModel):
@@ -27,6 +27,183 @@ class Topology(BaseModel):
     data: Any
     created_at: datetime
     updated_at: datetime
+    version: int
 
     class Config:
         orm_mode = True
+
+
+class TopologySummary(BaseModel):
+    """Listing entry without the topology body."""
+
+    id: int
+    name: str
+    created_at: datetime
+    updated_at: datetime
+    node_count: int
+    edge_count: int
+    version: int
+
+    class Config:
+        orm_mode = True
+
+
+class TopologyPage(BaseModel):
+    """One page of summaries; pass ``next_cursor`` back as ``cursor`` for the next page."""
+
+    items: list[TopologySummary]
+    next_cursor: Optional[str] = None
+
+
+class TopologyItems(BaseModel):
+    """One page of stored nodes, interfaces or edges in document order."""
+
+    items: list[Any]
+    next_cursor: Optional[str] = None
+
+
+class TopologyView(BaseModel):
+    """Nodes inside a geographic viewport and every edge touching them."""
+
+    nodes: list[Any]
+    edges: list[Any]
+    truncated: bool = False
+
+
+class PatchOperation(BaseModel):
+    """One RFC 6902 JSON Patch operation on the topology's ``data`` document."""
+
+    op: Literal["add", "remove", "replace", "move", "copy", "test"]
+    path: str
+    value: Any = None
+    from_: Optional[str] = Field(None, alias="from")
+
+    @validator("from_", always=True)
+    def _require_from(cls, from_: Optional[str], values: dict[str, Any]) -> Optional[str]:
+        if values.get("op") in ("move", "copy") and from_ is None:
+            raise ValueError("'from' is required for move and copy")
+        return from_
+
+
+class TopologyDelta(BaseModel):
+    """Node/edge-level update of the topology's ``data`` document.
+
+    Items in ``nodes``/``edges`` replace stored items with the same ``id`` or
+    are appended; ``remove_*`` list ids to drop. ``model`` and ``gpss`` replace
+    those sections when present. Same envelope as gpss-api's ``/gpss/gen-delta``.
+    """
+
+    model: Any = None
+    gpss: Any = None
+    nodes: list[dict[str, Any]] = []
+    edges: list[dict[str, Any]] = []
+    remove_nodes: list[str] = []
+    remove_edges: list[str] = []
+
+    @validator("nodes", "edges", each_item=True)
+    def _require_id(cls, item: dict[str, Any]) -> dict[str, Any]:
+        if not isinstance(item.get("id"), str):
+            raise ValueError("every item needs a string 'id'")
+        return item
+
+
+class JobCreate(BaseModel):
+    """Simulation settings; the topology is read as it is when the job is submitted."""
+
+    mode: Literal["event", "vector"] = "event"
+    seed: Optional[int] = None
+    replications: int = Field(1, ge=1)
+
+
+class SimulationResult(BaseModel):
+    """Stored metrics: the mean and spread of the totals plus every replication's statistics."""
+
+    id: int
+    topology_id: Optional[int] = None
+    input_hash: str
+    metrics: Any
+    created_at: datetime
+
+    class Config:
+        orm_mode = True
+
+
+class Job(BaseModel):
+    id: int
+    topology_id: int
+    input_hash: str
+    mode: str
+    seed: Optional[int] = None
+    replications: int
+    status: Literal["queued", "running", "done", "failed"]
+    progress: float
+    partial: Any = None
+    error: Optional[str] = None
+    cached: bool
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    result: Optional[SimulationResult] = None
+
+    class Config:
+        orm_mode = True
+
+
+class ReportRun(BaseModel):
+    id: int
+    topology_id: int
+    name: Optional[str] = None
+    model: Optional[str] = None
+    report: int
+    start_time: Optional[float] = None
+    end_time: Optional[float] = None
+    entities: int
+    unmatched: int
+    created_at: datetime
+
+    class Config:
+        orm_mode = True
+
+
+class ReportMetrics(BaseModel):
+    """Indexed figures of a report row; which are set depends on its table."""
+
+    entries: Optional[int] = None
+    utilization: Optional[float] = None
+    avg_time: Optional[float] = None
+    avg_content: Optional[float] = None
+    max_content: Optional[int] = None
+    value: Optional[float] = None
+
+
+class ReportEntity(ReportMetrics):
+    kind: Literal["facility", "queue", "storage", "savevalue"]
+    name: str
+    node_id: Optional[str] = None
+    interface_id: Optional[str] = None
+    data: Any
+
+    class Config:
+        orm_mode = True
+
+
+class ReportEntities(BaseModel):
+    items: list[ReportEntity]
+    next_cursor: Optional[str] = None
+
+
+class EntityComparison(BaseModel):
+    """One entity across the compared runs; ``values`` and ``change`` follow the order of ``runs``."""
+
+    kind: str
+    name: str
+    node_id: Optional[str] = None
+    interface_id: Optional[str] = None
+    values: list[Optional[ReportMetrics]]
+    # Difference from the first run; None where either run lacks the entity.
+    change: list[Optional[ReportMetrics]]
+
+
+class ReportComparison(BaseModel):
+    runs: list[ReportRun]
+    entities: list[EntityComparison]
@@ -0,0 +1,308 @@
+"""Normalised node/interface/edge rows mirroring ``Topology.data``.
+
+``data`` stays the source of truth; ``topology_nodes``, ``topology_interfaces``
+and ``topology_edges`` copy its items so that queries by node type, edge
+endpoint or geographic viewport are index scans instead of document parses.
+
+``TOPOLOGY_STORAGE`` selects when the rows are written:
+
+* ``normalized`` (default) - in the same transaction as every write;
+* ``document`` - only ``data`` is written; rows are rebuilt on the first query
+  that needs them.
+
+``Topology.items_version`` records the ``version`` the rows were built from, so
+stale rows are detected in either mode. On PostgreSQL the rows are built with
+``INSERT ... SELECT`` over the ``jsonb`` value; other dialects build them in
+Python.
+"""
+
+import os
+from typing import Any, Iterable, Optional
+
+from sqlalchemy import delete, func, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models, patching, schemas
+
+TOPOLOGY_STORAGE = os.environ.get("TOPOLOGY_STORAGE", "normalized")
+if TOPOLOGY_STORAGE not in ("normalized", "document"):
+    raise ValueError(f"TOPOLOGY_STORAGE must be 'normalized' or 'document', not {TOPOLOGY_STORAGE!r}")
+
+INTEGER_MAX = 2**31 - 1
+ITEM_TABLES = (models.TopologyInterface, models.TopologyEdge, models.TopologyNode)
+
+
+def string(value: Any) -> Optional[str]:
+    return value if isinstance(value, str) else None
+
+
+def first(*values: Optional[str]) -> Optional[str]:
+    return next((value for value in values if value is not None), None)
+
+
+def number(value: Any) -> Optional[float]:
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+def integer(value: Any) -> Optional[int]:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return int(value) if float(value).is_integer() and abs(value) <= INTEGER_MAX else None
+
+
+def keyed(items: Any) -> Iterable[tuple[int, dict[str, Any]]]:
+    """``(ord, item)`` for the object items with a string ``id``; ``ord`` counts from 1."""
+    if not isinstance(items, list):
+        return
+    for ord_, item in enumerate(items, start=1):
+        if isinstance(item, dict) and isinstance(item.get("id"), str):
+            yield ord_, item
+
+
+def node_rows(
+    topology_id: int, nodes: Iterable[tuple[int, dict[str, Any]]]
+) -> tuple[list[dict[str, Any]], list[dict[str, Any]]]:
+    node_values, interface_values = [], []
+    for ord_, item in nodes:
+        data = item.get("data") if isinstance(item.get("data"), dict) else {}
+        node_values.append(
+            {
+                "topology_id": topology_id,
+                "node_id": item["id"],
+                "ord": ord_,
+                "node_type": first(string(data.get("nodeType")), string(item.get("type"))),
+                "label": string(data.get("label")),
+                "lat": number(data.get("lat")),
+                "lon": number(data.get("lon")),
+                "altitude": number(data.get("altitude")),
+                "data": item,
+            }
+        )
+        for interface_ord, interface in keyed(data.get("interfaces")):
+            interface_values.append(
+                {
+                    "topology_id": topology_id,
+                    "node_id": item["id"],
+                    "interface_id": interface["id"],
+                    "ord": interface_ord,
+                    "direction": string(interface.get("direction")),
+                    "idx": integer(interface.get("idx")),
+                    "edge_id": string(interface.get("edgeId")),
+                    "data": interface,
+                }
+            )
+    return node_values, interface_values
+
+
+def edge_rows(topology_id: int, edges: Iterable[tuple[int, dict[str, Any]]]) -> list[dict[str, Any]]:
+    values = []
+    for ord_, item in edges:
+        data = item.get("data") if isinstance(item.get("data"), dict) else {}
+        channel = data.get("channel") if isinstance(data.get("channel"), dict) else {}
+        ends = [channel.get(end) if isinstance(channel.get(end), dict) else {} for end in ("from", "to")]
+        values.append(
+            {
+                "topology_id": topology_id,
+                "edge_id": item["id"],
+                "ord": ord_,
+                "source": first(string(item.get("source")), string(ends[0].get("nodeId"))),
+                "target": first(string(item.get("target")), string(ends[1].get("nodeId"))),
+                "data": item,
+            }
+        )
+    return values
+
+
+async def insert(db: AsyncSession, nodes: list[dict[str, Any]], interfaces: list[dict[str, Any]], edges: list[dict[str, Any]]):
+    for model, values in (
+        (models.TopologyNode, nodes),
+        (models.TopologyInterface, interfaces),
+        (models.TopologyEdge, edges),
+    ):
+        if values:
+            await db.execute(model.__table__.insert(), values)
+
+
+# jsonb text/number extraction that yields NULL for other JSON types, like ``string``/``number`` above.
+def _text(item: str, *path: str) -> str:
+    value = f"({item} #> '{{{','.join(path)}}}')"
+    return f"CASE WHEN jsonb_typeof({value}) = 'string' THEN {value} #>> '{{}}' END"
+
+
+def _number(item: str, *path: str) -> str:
+    value = f"({item} #> '{{{','.join(path)}}}')"
+    return f"CASE WHEN jsonb_typeof({value}) = 'number' THEN {value}::double precision END"
+
+
+def _integer(item: str, *path: str) -> str:
+    value = f"({item} #> '{{{','.join(path)}}}')"
+    return (
+        f"CASE WHEN jsonb_typeof({value}) = 'number' AND {value}::numeric % 1 = 0 "
+        f"AND abs({value}::numeric) <= {INTEGER_MAX} THEN {value}::numeric::integer END"
+    )
+
+
+def _elements(array: str, alias: str) -> str:
+    return (
+        f"jsonb_array_elements(CASE WHEN jsonb_typeof({array}) = 'array' THEN {array} ELSE '[]'::jsonb END) "
+        f"WITH ORDINALITY AS {alias}(item, ord)"
+    )
+
+
+def _keyed(alias: str) -> str:
+    return f"jsonb_typeof({alias}.item) = 'object' AND jsonb_typeof({alias}.item -> 'id') = 'string'"
+
+
+SYNC_POSTGRESQL = [
+    "DELETE FROM topology_interfaces WHERE topology_id = :topology_id",
+    "DELETE FROM topology_edges WHERE topology_id = :topology_id",
+    "DELETE FROM topology_nodes WHERE topology_id = :topology_id",
+    "INSERT INTO topology_nodes (topology_id, node_id, ord, node_type, label, lat, lon, altitude, data) "
+    f"SELECT t.id, n.item ->> 'id', n.ord, COALESCE({_text('n.item', 'data', 'nodeType')}, {_text('n.item', 'type')}), "
+    f"{_text('n.item', 'data', 'label')}, {_number('n.item', 'data', 'lat')}, "
+    f"{_number('n.item', 'data', 'lon')}, {_number('n.item', 'data', 'altitude')}, n.item "
+    f"FROM topologies AS t, {_elements('t.data -> ' + repr('nodes'), 'n')} "
+    f"WHERE t.id = :topology_id AND {_keyed('n')}",
+    "INSERT INTO topology_interfaces (topology_id, node_id, interface_id, ord, direction, idx, edge_id, data) "
+    f"SELECT t.id, n.item ->> 'id', i.item ->> 'id', i.ord, {_text('i.item', 'direction')}, "
+    f"{_integer('i.item', 'idx')}, {_text('i.item', 'edgeId')}, i.item "
+    f"FROM topologies AS t, {_elements('t.data -> ' + repr('nodes'), 'n')}, "
+    f"{_elements('n.item #> ' + repr('{data,interfaces}'), 'i')} "
+    f"WHERE t.id = :topology_id AND {_keyed('n')} AND {_keyed('i')}",
+    "INSERT INTO topology_edges (topology_id, edge_id, ord, source, target, data) "
+    f"SELECT t.id, e.item ->> 'id', e.ord, "
+    f"COALESCE({_text('e.item', 'source')}, {_text('e.item', 'data', 'channel', 'from', 'nodeId')}), "
+    f"COALESCE({_text('e.item', 'target')}, {_text('e.item', 'data', 'channel', 'to', 'nodeId')}), e.item "
+    f"FROM topologies AS t, {_elements('t.data -> ' + repr('edges'), 'e')} "
+    f"WHERE t.id = :topology_id AND {_keyed('e')}",
+]
+
+
+async def mark_synced(db: AsyncSession, topology_id: int) -> None:
+    # Core UPDATE: an ORM change would bump ``version`` through ``version_id_col``.
+    await db.execute(
+        update(models.Topology.__table__)
+        .where(models.Topology.__table__.c.id == topology_id)
+        .values(items_version=models.Topology.__table__.c.version)
+    )
+
+
+async def sync(db: AsyncSession, topology_id: int, data: Any = None) -> None:
+    """Rebuild all item rows of a topology from its stored ``data``.
+
+    ``data`` may be passed when the caller already holds the document; it is
+    only used on dialects where rows are built in Python.
+    """
+    if db.bind.dialect.name == "postgresql":
+        for statement in SYNC_POSTGRESQL:
+            await db.execute(text(statement), {"topology_id": topology_id})
+    else:
+        if data is None:
+            data = (
+                await db.execute(select(models.Topology.data).where(models.Topology.id == topology_id))
+            ).scalar_one()
+        for model in ITEM_TABLES:
+            await db.execute(delete(model.__table__).where(model.__table__.c.topology_id == topology_id))
+        nodes = data.get("nodes") if isinstance(data, dict) else None
+        edges = data.get("edges") if isinstance(data, dict) else None
+        await insert(db, *node_rows(topology_id, keyed(nodes)), edge_rows(topology_id, keyed(edges)))
+    await mark_synced(db, topology_id)
+
+
+async def written(db: AsyncSession, topology_id: int, data: Any = None) -> None:
+    """Call after ``data`` changed and was flushed, inside the same transaction."""
+    if TOPOLOGY_STORAGE == "normalized":
+        await sync(db, topology_id, data)
+
+
+async def delta_written(db: AsyncSession, topology_id: int, delta: schemas.TopologyDelta, previous_version: int) -> None:
+    """Apply a node/edge delta to the item rows instead of rebuilding them.
+
+    Falls back to ``sync`` when the rows were not current before the write.
+    """
+    if TOPOLOGY_STORAGE != "normalized":
+        return
+    table = models.Topology.__table__
+    current = (
+        await db.execute(
+            update(table)
+            .where(table.c.id == topology_id, table.c.items_version == previous_version)
+            .values(items_version=table.c.version)
+        )
+    ).rowcount
+    if not current:
+        await sync(db, topology_id)
+        return
+    node_ids = [item["id"] for item in delta.nodes]
+    nodes = await replaced(db, models.TopologyNode, models.TopologyNode.node_id, topology_id,
+                     patching.unique_items(delta.nodes), delta.remove_nodes)
+    edges = await replaced(db, models.TopologyEdge, models.TopologyEdge.edge_id, topology_id,
+                     patching.unique_items(delta.edges), delta.remove_edges)
+    interfaces_table = models.TopologyInterface.__table__
+    await db.execute(
+        delete(interfaces_table).where(
+            interfaces_table.c.topology_id == topology_id,
+            interfaces_table.c.node_id.in_(node_ids + list(delta.remove_nodes)),
+        )
+    )
+    await insert(db, *node_rows(topology_id, nodes), edge_rows(topology_id, edges))
+
+
+async def replaced(
+    db: AsyncSession, model: type, key: Any, topology_id: int, upserts: list[dict[str, Any]], removed: list[str]
+) -> list[tuple[int, dict[str, Any]]]:
+    """Delete the rows of upserted and removed ids; return upserts with their ``ord``.
+
+    Upserts keep the ``ord`` of the row they replace; new ids sort after the last row,
+    matching ``patching.merge_items``.
+    """
+    table = model.__table__
+    scope = table.c.topology_id == topology_id
+    ords = dict(
+        (
+            await db.execute(
+                select(key, func.min(table.c.ord))
+                .where(scope, key.in_([item["id"] for item in upserts]), key.not_in(removed))
+                .group_by(key)
+            )
+        ).all()
+    ) if upserts else {}
+    last = await db.scalar(select(func.coalesce(func.max(table.c.ord), 0)).where(scope))
+    if upserts or removed:
+        await db.execute(delete(table).where(scope, key.in_([item["id"] for item in upserts] + list(removed))))
+    result = []
+    for item in upserts:
+        if item["id"] not in ords:
+            last += 1
+            ords[item["id"]] = last
+        result.append((ords[item["id"]], item))
+    return result
+
+
+async def ensure(db: AsyncSession, topology_id: int) -> bool:
+    """Rebuild stale rows of one topology; False if it does not exist."""
+    version, items_version = (
+        await db.execute(
+            select(models.Topology.version, models.Topology.items_version).where(models.Topology.id == topology_id)
+        )
+    ).first() or (None, None)
+    if version is None:
+        return False
+    if items_version != version:
+        await sync(db, topology_id)
+        await db.commit()
+    return True
+
+
+async def ensure_all(db: AsyncSession) -> None:
+    """Rebuild stale rows of every topology (first query after ``document`` mode or an upgrade)."""
+    stale = (
+        await db.scalars(
+            select(models.Topology.id).where(
+                (models.Topology.items_version.is_(None)) | (models.Topology.items_version != models.Topology.version)
+            )
+        )
+    ).all()
+    for topology_id in stale:
+        await sync(db, topology_id)
+        await db.commit()
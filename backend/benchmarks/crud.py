@@ -0,0 +1,276 @@
+"""Benchmarks for the ``/topologies`` CRUD endpoints.
+
+Runs the real FastAPI app in-process (``TestClient``, needs ``httpx``) against
+``DATABASE_URL``. When that is not set, a throwaway SQLite file stands in for
+PostgreSQL::
+
+    python -m benchmarks.crud [--sizes 10 100 1000 10000 50000] [--rows 20]
+                              [--repeat 3] [--concurrency 50]
+                              [--output results.json]
+                              [--compare baseline.json]
+
+Each size measures creating a topology, updating it in full (PUT) and by a
+one-node delta (PATCH), listing ``--rows`` stored topologies of that size, both
+in full and as summaries, searching them by node type, loading one topology's
+nodes inside a small lat/lon box, and ``--concurrency`` simultaneous summary
+requests sharing the connection pool. Set ``TOPOLOGY_STORAGE=document``
+to measure without the normalised rows. Results are written as JSON in the same
+layout as the gpss-api suite so runs can be compared.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(
+        tempfile.mkdtemp(prefix="topologies-"), "bench.db"
+    )
+
+import httpx  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import delete  # noqa: E402
+
+from app import models  # noqa: E402
+from app.database import SessionLocal, engine, pool_metrics  # noqa: E402
+from app.main import app  # noqa: E402
+
+
+def port(node_id: str, direction: str, idx: int) -> dict[str, Any]:
+    key = "in" if direction == "in" else "out"
+    return {
+        "id": f"{node_id}_{key}{idx}",
+        "nodeId": node_id,
+        "dir": direction,
+        "idx": idx,
+        "label": f"{key} {idx}",
+        "queue": {f"q_{key}": 20},
+        "service": {f"mu_{key}": 10, f"servers_{key}": 1, f"dist_{key}": "Exponential"},
+        "persistent": False,
+        "locked": False,
+    }
+
+
+def topology(nodes: int, ports: int = 4) -> dict[str, Any]:
+    """Build a frontend-shaped topology: a ring of nodes with ``ports`` links each."""
+    kinds = ["SC", "HAPS", "ES", "AS", "SSOP"]
+    payload_nodes, payload_edges = [], []
+    for k in range(nodes):
+        node_id = f"node-{k}"
+        kind = kinds[k % len(kinds)]
+        payload_nodes.append(
+            {
+                "id": node_id,
+                "type": kind,
+                "position": {"x": (k % 100) * 120, "y": (k // 100) * 120},
+                "data": {
+                    "id": node_id,
+                    "type": kind,
+                    "name": f"{kind} {k}",
+                    "lat": round((k * 7.31) % 180 - 90, 3),
+                    "lon": round((k * 13.7) % 360 - 180, 3),
+                    "inPorts": [port(node_id, "in", idx) for idx in range(1, ports + 1)],
+                    "outPorts": [port(node_id, "out", idx) for idx in range(1, ports + 1)],
+                    "processing": {
+                        "serviceLines": 3,
+                        "q": 20,
+                        "mu": 30,
+                        "dist": "Exponential",
+                        "routingTable": [{"type": 1, "outPort": 1}, {"type": 2, "outPort": 2}],
+                    },
+                },
+            }
+        )
+        for idx in range(1, ports + 1):
+            target = f"node-{(k + idx) % nodes}"
+            payload_edges.append(
+                {
+                    "id": f"{node_id}-{idx}",
+                    "source": node_id,
+                    "target": target,
+                    "sourceHandle": f"{node_id}_out{idx}",
+                    "targetHandle": f"{target}_in{idx}",
+                    "data": {
+                        "from": {"nodeId": node_id, "outPortIdx": idx},
+                        "to": {"kind": "node", "nodeId": target, "inPortIdx": idx},
+                        "bandwidth": 1000,
+                        "propDelay": 0.01,
+                    },
+                }
+            )
+    model = {
+        "model": {"id": f"synthetic-{nodes}"},
+        "sim": {"duration": 1000},
+        "time": {"unit": "s"},
+        "rng": {"seed": 1},
+        "traffic": {"capacity": {"dist": "duniform", "params": {"min": 64, "max": 1500}}},
+        "packet": {"mtu": 65535},
+    }
+    return {"model": model, "nodes": payload_nodes, "edges": payload_edges}
+
+
+def measure(function: Callable[[], Any], repeat: int) -> dict[str, float]:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return {"min": min(times), "mean": sum(times) / len(times)}
+
+
+async def clear() -> None:
+    async with SessionLocal() as db:
+        for model in (models.TopologyInterface, models.TopologyEdge, models.TopologyNode, models.Topology):
+            await db.execute(delete(model))
+        await db.commit()
+
+
+async def burst(concurrency: int, rows: int) -> None:
+    """``concurrency`` summary requests issued at once on the app's event loop."""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        responses = await asyncio.gather(
+            *(client.get("/topologies/summary", params={"limit": rows}) for _ in range(concurrency))
+        )
+    for response in responses:
+        response.raise_for_status()
+
+
+def cases(client: TestClient, size: int, rows: int, repeat: int, concurrency: int) -> list[dict[str, Any]]:
+    data = topology(size)
+    body = json.dumps({"name": f"bench-{size}", "data": data})
+    headers = {"Content-Type": "application/json"}
+
+    def create() -> int:
+        response = client.post("/topologies", content=body, headers=headers)
+        response.raise_for_status()
+        return response.json()["id"]
+
+    client.portal.call(clear)
+    created = measure(create, repeat)
+    topology_id = create()
+    update_body = json.dumps({"data": data})
+
+    def update() -> None:
+        client.put(f"/topologies/{topology_id}", content=update_body, headers=headers).raise_for_status()
+
+    updated = measure(update, repeat)
+    node = dict(data["nodes"][size // 2], position={"x": 0, "y": 0})
+    patch_body = json.dumps({"nodes": [node]})
+
+    def patch() -> None:
+        client.patch(
+            f"/topologies/{topology_id}", content=patch_body, headers={**headers, "If-Match": "*"}
+        ).raise_for_status()
+
+    patched = measure(patch, repeat)
+    for _ in range(max(rows - repeat - 1, 0)):
+        create()
+
+    def list_all() -> None:
+        client.get("/topologies").raise_for_status()
+
+    listed = measure(list_all, repeat)
+
+    def list_summary() -> None:
+        client.get("/topologies/summary", params={"limit": rows}).raise_for_status()
+
+    summarised = measure(list_summary, repeat)
+
+    def search() -> None:
+        client.get("/topologies/summary", params={"limit": rows, "node_type": "HAPS"}).raise_for_status()
+
+    searched = measure(search, repeat)
+
+    def viewport() -> None:
+        client.get(
+            f"/topologies/{topology_id}/viewport",
+            params={"min_lat": 0, "max_lat": 10, "min_lon": 0, "max_lon": 10},
+        ).raise_for_status()
+
+    viewed = measure(viewport, repeat)
+    concurrent = measure(lambda: client.portal.call(burst, concurrency, rows), repeat)
+    common = {"size": size, "nodes": size, "edges": len(data["edges"]), "bytes": len(body), "repeat": repeat}
+    return [
+        {"name": "create", **common, "seconds": created},
+        {"name": "update", **common, "seconds": updated},
+        {"name": "patch", **common, "seconds": patched},
+        {"name": f"list_{max(rows, repeat + 1)}", **common, "seconds": listed},
+        {"name": f"summary_{max(rows, repeat + 1)}", **common, "seconds": summarised},
+        {"name": "search", **common, "seconds": searched},
+        {"name": "viewport", **common, "seconds": viewed},
+        {"name": f"concurrent_{concurrency}", **common, "seconds": concurrent},
+    ]
+
+
+def environment() -> dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "suite": "backend",
+        "date": datetime.now(timezone.utc).isoformat(),
+        "commit": commit,
+        "database": engine.dialect.name,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+
+
+def compare(results: list[dict[str, Any]], baseline_path: str) -> None:
+    with open(baseline_path, encoding="utf-8") as file:
+        baseline = {(row["name"], row["size"]): row for row in json.load(file)["results"]}
+    print(f"\n{'case':<14} {'size':>7} {'baseline, s':>12} {'current, s':>12} {'ratio':>7}")
+    for row in results:
+        previous = baseline.get((row["name"], row["size"]))
+        if previous is None:
+            continue
+        ratio = row["seconds"]["min"] / previous["seconds"]["min"]
+        print(
+            f"{row['name']:<14} {row['size']:>7} {previous['seconds']['min']:>12.4f} "
+            f"{row['seconds']['min']:>12.4f} {ratio:>7.2f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--rows", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--compare", default=None)
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'case':<14} {'size':>7} {'min, s':>10} {'mean, s':>10} {'MiB':>8}")
+    # The context manager runs the app's lifespan (schema setup) and keeps one event loop for the run.
+    with TestClient(app) as client:
+        for size in args.sizes:
+            for row in cases(client, size, args.rows, args.repeat, args.concurrency):
+                results.append(row)
+                print(
+                    f"{row['name']:<14} {row['size']:>7} {row['seconds']['min']:>10.4f} "
+                    f"{row['seconds']['mean']:>10.4f} {row['bytes'] / 2 ** 20:>8.2f}"
+                )
+        client.portal.call(clear)
+        pool = pool_metrics.snapshot()
+    print(f"\npool: {pool}")
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump({"environment": {**environment(), "pool": pool}, "results": results}, file, indent=2)
+    if args.compare is not None:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# ``app.database`` creates its engine on import; tests must not reach for the deployment database.
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "tests.db"))
@@ -0,0 +1,147 @@
+"""JSON Patch semantics of the Python path and of the PostgreSQL CTE chain.
+
+Every case runs through ``apply_operations``. With ``TEST_POSTGRESQL_URL`` set
+(e.g. ``postgresql://postgres@/postgres?host=/tmp/pgdata``), it also runs
+through ``compile_patch`` against a literal document, and both must agree.
+"""
+
+import asyncio
+import json
+import os
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app import patching, schemas
+from app.database import async_url, dumps
+
+DOCUMENT = {
+    "model": {"duration": 100},
+    "nodes": [{"id": "n1"}, {"id": "n2"}, {"id": "n3"}],
+    "edges": [],
+}
+FAILS = None
+
+# (operations, document after the patch or FAILS)
+CASES = {
+    "add into array": (
+        [{"op": "add", "path": "/nodes/1", "value": {"id": "x"}}],
+        {**DOCUMENT, "nodes": [{"id": "n1"}, {"id": "x"}, {"id": "n2"}, {"id": "n3"}]},
+    ),
+    "add at end": (
+        [{"op": "add", "path": "/nodes/-", "value": {"id": "x"}}],
+        {**DOCUMENT, "nodes": [*DOCUMENT["nodes"], {"id": "x"}]},
+    ),
+    "add at length": (
+        [{"op": "add", "path": "/nodes/3", "value": {"id": "x"}}],
+        {**DOCUMENT, "nodes": [*DOCUMENT["nodes"], {"id": "x"}]},
+    ),
+    "add member": (
+        [{"op": "add", "path": "/model/seed", "value": 7}],
+        {**DOCUMENT, "model": {"duration": 100, "seed": 7}},
+    ),
+    "add past end": ([{"op": "add", "path": "/nodes/4", "value": 1}], FAILS),
+    "add zero-padded index": ([{"op": "add", "path": "/nodes/01", "value": 1}], FAILS),
+    "add under negative index": ([{"op": "add", "path": "/nodes/-1/label", "value": "a"}], FAILS),
+    "add under missing parent": ([{"op": "add", "path": "/gpss/seed", "value": 1}], FAILS),
+    "remove element": (
+        [{"op": "remove", "path": "/nodes/0"}],
+        {**DOCUMENT, "nodes": [{"id": "n2"}, {"id": "n3"}]},
+    ),
+    "remove member": ([{"op": "remove", "path": "/model/duration"}], {**DOCUMENT, "model": {}}),
+    "remove negative index": ([{"op": "remove", "path": "/nodes/-1"}], FAILS),
+    "remove zero-padded index": ([{"op": "remove", "path": "/nodes/01"}], FAILS),
+    "remove past end": ([{"op": "remove", "path": "/nodes/3"}], FAILS),
+    "remove missing member": ([{"op": "remove", "path": "/model/seed"}], FAILS),
+    "replace nested": (
+        [{"op": "replace", "path": "/nodes/1/id", "value": "y"}],
+        {**DOCUMENT, "nodes": [{"id": "n1"}, {"id": "y"}, {"id": "n3"}]},
+    ),
+    "replace document": ([{"op": "replace", "path": "", "value": {"a": 1}}], {"a": 1}),
+    "replace negative index": ([{"op": "replace", "path": "/nodes/-1/id", "value": "y"}], FAILS),
+    "replace missing member": ([{"op": "replace", "path": "/model/seed", "value": 1}], FAILS),
+    "move element to end": (
+        [{"op": "move", "from": "/nodes/0", "path": "/nodes/-"}],
+        {**DOCUMENT, "nodes": [{"id": "n2"}, {"id": "n3"}, {"id": "n1"}]},
+    ),
+    "move member": (
+        [{"op": "move", "from": "/model/duration", "path": "/model/horizon"}],
+        {**DOCUMENT, "model": {"horizon": 100}},
+    ),
+    "move from negative index": ([{"op": "move", "from": "/nodes/-1", "path": "/edges/-"}], FAILS),
+    "move into own child": ([{"op": "move", "from": "/model", "path": "/model/inner"}], FAILS),
+    "copy element": (
+        [{"op": "copy", "from": "/nodes/2", "path": "/edges/0"}],
+        {**DOCUMENT, "edges": [{"id": "n3"}]},
+    ),
+    "copy from zero-padded index": ([{"op": "copy", "from": "/nodes/00", "path": "/edges/-"}], FAILS),
+    "copy from missing member": ([{"op": "copy", "from": "/model/seed", "path": "/edges/-"}], FAILS),
+    "test passes": ([{"op": "test", "path": "/nodes/0/id", "value": "n1"}], DOCUMENT),
+    "test differs": ([{"op": "test", "path": "/nodes/0/id", "value": "n2"}], FAILS),
+    "test negative index": ([{"op": "test", "path": "/nodes/-1/id", "value": "n3"}], FAILS),
+    "test after add": (
+        [
+            {"op": "add", "path": "/nodes/0", "value": {"id": "x"}},
+            {"op": "test", "path": "/nodes/1/id", "value": "n1"},
+            {"op": "remove", "path": "/nodes/3"},
+        ],
+        {**DOCUMENT, "nodes": [{"id": "x"}, {"id": "n1"}, {"id": "n2"}]},
+    ),
+    "later operation fails": (
+        [{"op": "remove", "path": "/nodes/0"}, {"op": "remove", "path": "/nodes/2"}],
+        FAILS,
+    ),
+}
+
+
+def operations(raw: list[dict]) -> list[schemas.PatchOperation]:
+    return [schemas.PatchOperation.parse_obj(operation) for operation in raw]
+
+
+@pytest.mark.parametrize("raw, expected", CASES.values(), ids=CASES.keys())
+def test_apply_operations(raw, expected):
+    document = json.loads(json.dumps(DOCUMENT))
+    if expected is FAILS:
+        with pytest.raises(patching.PatchError):
+            patching.apply_operations(document, operations(raw))
+    else:
+        assert patching.apply_operations(document, operations(raw)) == expected
+    assert document == DOCUMENT
+
+
+@pytest.fixture(scope="module")
+def postgresql():
+    url = os.environ.get("TEST_POSTGRESQL_URL")
+    if not url:
+        pytest.skip("TEST_POSTGRESQL_URL is not set")
+    with asyncio.Runner() as runner:
+        engine = create_async_engine(async_url(url))
+        yield runner, engine
+        runner.run(engine.dispose())
+
+
+async def compiled(engine, raw: list[dict]):
+    """The document after the CTE chain, or FAILS when a step failed or PostgreSQL rejected it."""
+    try:
+        steps = patching.compile_patch(operations(raw))
+    except patching.PatchError:
+        return FAILS
+    steps.params["document"] = dumps(DOCUMENT)
+    head = "SELECT CAST(:document AS jsonb) AS d, CAST(NULL AS integer) AS failed"
+    async with engine.connect() as connection:
+        try:
+            row = (await connection.execute(text(steps.sql(head, "SELECT d, failed FROM {last}")), steps.params)).one()
+        except DBAPIError:
+            return FAILS
+    if row.failed is not None:
+        return FAILS
+    # Drivers without a ``jsonb`` codec return the text.
+    return json.loads(row.d) if isinstance(row.d, str) else row.d
+
+
+@pytest.mark.parametrize("raw, expected", CASES.values(), ids=CASES.keys())
+def test_compile_patch_matches_python(postgresql, raw, expected):
+    runner, engine = postgresql
+    assert runner.run(compiled(engine, raw)) == expected
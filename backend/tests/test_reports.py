@@ -0,0 +1,195 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app import reports
+
+# A cluster subscriber and a switching centre as the canvas stores them: ids with dashes.
+INTERFACE = {"queue": {"q_{d}": 20}, "service": {"mu_{d}": 10, "servers_{d}": 1, "dist_{d}": "Exponential"}}
+
+
+def interface(node_id, direction, idx, edge_id):
+    settings = {
+        key: {name.format(d=direction): value for name, value in group.items()} for key, group in INTERFACE.items()
+    }
+    return {
+        "id": f"{node_id}_{direction}{idx}",
+        "idx": idx,
+        "name": f"{direction} {idx}",
+        "edgeId": edge_id,
+        "direction": direction,
+        **settings,
+    }
+
+
+def edge(edge_id, source, target, port):
+    return {
+        "id": edge_id,
+        "source": source,
+        "target": target,
+        "data": {"channel": {"id": edge_id, "to": {"nodeId": target, "portId": port}}},
+    }
+
+
+TOPOLOGY = {
+    "model": {
+        "rng": {"seed": 42},
+        "sim": {"duration": 100},
+        "time": {"unit": "min"},
+        "model": {"id": "m"},
+        "packet": {"mtu": 65535},
+        "traffic": {"capacity": {"dist": "duniform", "params": {"minBytes": 100, "maxBytes": 1500000}}},
+    },
+    "nodes": [
+        {
+            "id": "AS-1",
+            "data": {
+                "label": "AS 1",
+                "nodeType": "AS",
+                "generator": {"lambda": 2, "typeData": 1, "capacitySource": "capacity"},
+                "interfaces": [interface("AS-1", "out", 1, "e1"), interface("AS-1", "in", 1, "e2")],
+            },
+        },
+        {
+            "id": "SC-1",
+            "data": {
+                "label": "SC 1",
+                "nodeType": "SC",
+                "interfaces": [interface("SC-1", "in", 1, "e1"), interface("SC-1", "out", 1, "e2")],
+                "processing": {
+                    "mu": 30,
+                    "dist": "Exponential",
+                    "queue": 20,
+                    "serviceLines": 3,
+                    "routingTable": [{"type": 1, "outPort": 1}],
+                },
+            },
+        },
+    ],
+    "edges": [edge("e1", "AS-1", "SC-1", "SC-1_in1"), edge("e2", "SC-1", "AS-1", "AS-1_in1")],
+}
+
+# Standard report of the model gpss-api generates for TOPOLOGY; the entity names
+# are the ones in the generated code (SAVEVALUE loss_*_+,1, STORAGE service_SC1).
+REPORT = """\
+              GPSS World Simulation Report - topology.gps.1.1
+
+
+                   Saturday, October 17, 2026 10:12:45
+
+           START TIME           END TIME  BLOCKS  FACILITIES  STORAGES
+                0.000            100.000     52          2          1
+
+
+FACILITY         ENTRIES  UTIL.   AVE. TIME AVAIL. OWNER PEND INTER RETRY DELAY
+ SERVICE_IN_INT1_SC1    198    0.197       0.099  1        0    0    0     0      0
+ SERVICE_OUT_INT1_SC1   197    0.203       0.103  1        0    0    0     0      0
+
+
+QUEUE              MAX CONT. ENTRY ENTRY(0) AVE.CONT. AVE.TIME   AVE.(-0) RETRY
+ QUEUE_IN_INT1_SC1    3    0    198    162     0.041      0.021      0.115   0
+ QUEUE_SC1            2    0    198    190     0.004      0.002      0.050   0
+ QUEUE_OUT_INT1_SC1   4    1    197    158     0.052      0.026      0.133   0
+
+
+STORAGE            CAP. REM. MIN. MAX.  ENTRIES AVL.  AVE.C. UTIL. RETRY DELAY
+ SERVICE_SC1         3    3    0    2      198    1    0.066 0.022    0    0
+
+
+SAVEVALUE               RETRY       VALUE
+ LOSS_IN_INT1_SC1_        0          1.000
+ LOSS_SC1_                0          0.000
+ LOSS_OUT_INT1_SC1_       0          2.000
+ CAPACITY                 0        815.000
+"""
+
+OWNERS = {
+    "SERVICE_IN_INT1_SC1": ("SC-1", "SC-1_in1"),
+    "SERVICE_OUT_INT1_SC1": ("SC-1", "SC-1_out1"),
+    "QUEUE_IN_INT1_SC1": ("SC-1", "SC-1_in1"),
+    "QUEUE_SC1": ("SC-1", None),
+    "QUEUE_OUT_INT1_SC1": ("SC-1", "SC-1_out1"),
+    "SERVICE_SC1": ("SC-1", None),
+    "LOSS_IN_INT1_SC1_": ("SC-1", "SC-1_in1"),
+    "LOSS_SC1_": ("SC-1", None),
+    "LOSS_OUT_INT1_SC1_": ("SC-1", "SC-1_out1"),
+    "CAPACITY": (None, None),
+}
+
+
+def parse(text, size):
+    parser = reports.ReportParser()
+    data = text.encode()
+    rows = []
+    for start in range(0, len(data), size):
+        rows.extend(parser.feed(data[start : start + size]))
+    rows.extend(parser.close())
+    return parser, rows
+
+
+@pytest.mark.parametrize("size", [7, 64, 1 << 16])
+def test_parser(size):
+    parser, rows = parse(REPORT, size)
+    assert parser.reports == [{"model": "topology.gps.1.1", "start_time": 0.0, "end_time": 100.0}]
+    assert [(kind, name) for _, kind, name, _ in rows] == [
+        ("facility", "SERVICE_IN_INT1_SC1"),
+        ("facility", "SERVICE_OUT_INT1_SC1"),
+        ("queue", "QUEUE_IN_INT1_SC1"),
+        ("queue", "QUEUE_SC1"),
+        ("queue", "QUEUE_OUT_INT1_SC1"),
+        ("storage", "SERVICE_SC1"),
+        ("savevalue", "LOSS_IN_INT1_SC1_"),
+        ("savevalue", "LOSS_SC1_"),
+        ("savevalue", "LOSS_OUT_INT1_SC1_"),
+        ("savevalue", "CAPACITY"),
+    ]
+    assert rows[0][3]["entries"] == 198.0 and rows[0][3]["utilization"] == 0.197
+    assert rows[5][3]["capacity"] == 3.0 and rows[5][3]["avg_content"] == 0.066
+    assert rows[8][3] == {"retry": 0.0, "value": 2.0}
+
+
+def test_parser_several_reports():
+    parser, rows = parse(REPORT + "\n" + REPORT.replace("100.000", "200.000"), 64)
+    assert [report["end_time"] for report in parser.reports] == [100.0, 200.0]
+    assert [number for number, *_ in rows] == [1] * 10 + [2] * 10
+
+
+@pytest.mark.parametrize("name, expected", OWNERS.items())
+def test_owner(name, expected):
+    labels = {
+        "AS1": ("AS-1", None),
+        "SC1": ("SC-1", None),
+        "OUT_INT1_AS1": ("AS-1", "AS-1_out1"),
+        "IN_INT1_AS1": ("AS-1", "AS-1_in1"),
+        "IN_INT1_SC1": ("SC-1", "SC-1_in1"),
+        "OUT_INT1_SC1": ("SC-1", "SC-1_out1"),
+    }
+    assert (reports.owner(labels, name) or (None, None)) == expected
+
+
+def test_owner_loss_block_label():
+    # Only the SAVEVALUE carries the trailing underscore; a bare loss_* is the block label.
+    labels = {"SC1": ("SC-1", None)}
+    assert reports.owner(labels, "LOSS_SC1_") == ("SC-1", None)
+    assert reports.owner(labels, "LOSS_SC1__") is None
+    assert reports.owner(labels, "SERVICE_SC1_") is None
+
+
+@pytest.fixture
+def client():
+    from app.main import app
+
+    with TestClient(app) as client:
+        yield client
+
+
+def test_upload_maps_dashed_ids(client):
+    topology = client.post("/topologies", json={"name": "reports", "data": TOPOLOGY}).json()
+    response = client.post(f"/topologies/{topology['id']}/reports", content=REPORT.encode())
+    assert response.status_code == 201, response.text
+    (run,) = response.json()
+    assert (run["entities"], run["unmatched"]) == (10, 1)
+    items = client.get(f"/reports/{run['id']}/entities").json()["items"]
+    assert {item["name"]: (item["node_id"], item["interface_id"]) for item in items} == OWNERS
+    assert [item["name"] for item in client.get(f"/reports/{run['id']}/entities?node=SC-1").json()["items"]] == [
+        name for name, (node_id, _) in OWNERS.items() if node_id == "SC-1"
+    ]
@@ -16,23 +16,50 @@ interface Topology {
   updated_at: string
 }
 
+interface TopologySummary {
+  id: number
+  name: string
+  updated_at: string
+  node_count: number
+  edge_count: number
+}
+
+interface TopologyPage {
+  items: TopologySummary[]
+  next_cursor: string | null
+}
+
+const PAGE_SIZE = 50
+
 interface Props {
   onClose: () => void
 }
 
 export default function TopologyModal({ onClose }: Props) {
   const dispatch = useAppDispatch()
-  const [topologies, setTopologies] = useState<Topology[]>([])
+  const [topologies, setTopologies] = useState<TopologySummary[]>([])
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
   const [name, setName] = useState('')
 
-  useEffect(() => {
-    fetch('/api/topologies')
+  const loadPage = (cursor: string | null) => {
+    const params = new URLSearchParams({ limit: String(PAGE_SIZE) })
+    if (cursor) params.set('cursor', cursor)
+    return fetch(`/api/topologies/summary?${params}`)
       .then(res => res.json())
-      .then(data => setTopologies(data))
-      .catch(() => setTopologies([]))
+      .then((page: TopologyPage) => {
+        setTopologies(prev => (cursor ? [...prev, ...page.items] : page.items))
+        setNextCursor(page.next_cursor)
+      })
+  }
+
+  useEffect(() => {
+    loadPage(null).catch(() => setTopologies([]))
   }, [])
 
-  const handleSelect = (topology: Topology) => {
+  const handleSelect = async (summary: TopologySummary) => {
+    const res = await fetch(`/api/topologies/${summary.id}`)
+    if (!res.ok) return
+    const topology: Topology = await res.json()
     dispatch(
       setTopology({
         id: topology.id,
@@ -104,6 +131,14 @@ export default function TopologyModal({ onClose }: Props) {
             </li>
           ))}
         </ul>
+        {nextCursor && (
+          <button
+            onClick={() => loadPage(nextCursor)}
+            className="text-sm text-blue-600 hover:underline mb-4"
+          >
+            Показать ещё
+          </button>
+        )}
         <div className="flex gap-2">
           <input
             type="text"
@@ -0,0 +1,180 @@
+from typing import Any, AsyncIterable, AsyncIterator, Iterator, Optional
+from concurrent.futures.process import BrokenProcessPool
+from hashlib import sha256
+from time import monotonic
+import asyncio
+import codecs
+import json
+import re
+
+from pydantic import ValidationError
+
+from app.schemas.gpss_code import GPSSCode
+
+from . import gpss_sweep
+from .gpss_cache import body_errors, cached, model_key, parse, store
+from .gpss_generator import Generator
+from .gpss_graph import TopologyError
+from .gpss_metrics import collected, failed, registry, validated
+
+
+WHITESPACE = ' \t\r\n'
+SKIP = re.compile(r'[ \t\r\n]*')
+
+
+class Splitter:
+    '''
+    Разбиение потока байтов на отдельные JSON-документы.
+    Поддерживаются JSON Lines (по документу в строке) и JSON-массив (`[{...}, {...}]`);
+    формат определяется по первому непробельному байту. Элемент массива выделяется
+    `JSONDecoder.raw_decode`; пока элемент не пришёл целиком, повторная попытка делается
+    только после удвоения буфера, поэтому суммарная работа линейна по размеру тела.
+    '''
+    decoder = json.JSONDecoder()
+
+    def __init__(self):
+        self.array: Optional[bool] = None
+        self.text = codecs.getincrementaldecoder('utf-8')()
+        self.parts: list[str] = []
+        self.length = 0
+        self.attempt = 0
+        self.expect: Optional[str] = '['
+
+    def feed(self, chunk: bytes) -> Iterator[bytes]:
+        text = self.text.decode(chunk)
+        self.parts.append(text)
+        self.length += len(text)
+        if self.array is None:
+            head = ''.join(self.parts).lstrip(WHITESPACE)
+            self.parts, self.length = [head], len(head)
+            if not head:
+                return
+            self.array = head[0] == '['
+        if self.array:
+            if self.length >= self.attempt:
+                yield from self.split_array(final=False)
+        elif '\n' in text:
+            yield from self.split_lines(final=False)
+
+    def close(self) -> Iterator[bytes]:
+        self.parts.append(self.text.decode(b'', final=True))
+        if not self.array:
+            yield from self.split_lines(final=True)
+            return
+        yield from self.split_array(final=True)
+        if self.expect is not None:
+            raise ValueError('Unexpected end of the JSON array.')
+
+    def split_lines(self, final: bool) -> Iterator[bytes]:
+        *lines, rest = ''.join(self.parts).split('\n')
+        if final:
+            lines.append(rest)
+            rest = ''
+        self.parts, self.length = [rest], len(rest)
+        for line in lines:
+            if line.strip(WHITESPACE):
+                yield line.encode()
+
+    def split_array(self, final: bool) -> Iterator[bytes]:
+        text = ''.join(self.parts)
+        position = 0
+        while (position := SKIP.match(text, position).end()) < len(text):
+            symbol = text[position]
+            if self.expect is None:
+                raise ValueError('Unexpected data after the JSON array.')
+            if self.expect == '[':
+                self.expect, position = 'first', position + 1
+            elif self.expect == ',' or (self.expect == 'first' and symbol == ']'):
+                if symbol not in ',]':
+                    raise ValueError('Expected `,` or `]` between JSON array elements.')
+                self.expect, position = 'value' if symbol == ',' else None, position + 1
+            else:
+                try:
+                    _, end = self.decoder.raw_decode(text, position)
+                except json.JSONDecodeError as error:
+                    if final:
+                        raise ValueError(f'Invalid JSON array element: {error.msg}.') from None
+                    break
+                # Число в конце буфера может продолжиться в следующей части тела.
+                if end == len(text) and not final and text[end - 1] not in '}]"':
+                    break
+                yield text[position:end].encode()
+                self.expect, position = ',', end
+        text = text[position:]
+        self.parts, self.length = [text], len(text)
+        self.attempt = 2 * len(text)
+
+
+async def documents(chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    '''Документы пакета по мере поступления тела запроса.'''
+    splitter = Splitter()
+    async for chunk in chunks:
+        for document in splitter.feed(chunk):
+            yield document
+    for document in splitter.close():
+        yield document
+
+
+def generate(index: int, body: bytes) -> tuple[dict[str, Any], Optional[str], Optional[GPSSCode]]:
+    '''
+    Валидация и генерация одной модели пакета (исполняется в процессе пула).
+    Возвращает строку результата, ключ кэша и код; ошибка модели записывается в строку результата.
+    '''
+    row: dict[str, Any] = {'index': index}
+    try:
+        start_time = monotonic()
+        data = parse(body)
+        validated(data, len(body), monotonic() - start_time)
+        row['model'] = data.model.model.id
+        return row, model_key(data), Generator(data=data).code()
+    except ValidationError as error:
+        failed(error)
+        row['error'] = f'ValidationError: {error.error_count()} validation error(s)'
+        row['detail'] = body_errors(json.loads(error.json(include_url=False)), body)
+    except TopologyError as error:
+        failed(error)
+        row['error'] = f'TopologyError: {error}'
+        row['detail'] = error.detail()
+    except Exception as error:
+        failed(error)
+        row['error'] = f'{type(error).__name__}: {error}'
+    return row, None, None
+
+
+async def process(index: int, body: bytes) -> tuple[dict[str, Any], Optional[GPSSCode]]:
+    '''
+    Обработка модели пакета через кэш: по хэшу сырого документа код берётся без пула,
+    при промахе генерируется в общем пуле `gpss_sweep` и сохраняется в кэш.
+    Падение процесса пула (например, из-за нехватки памяти) записывается в строку модели,
+    а сломанный пул пересоздаётся для следующих моделей.
+    '''
+    raw = sha256(body).hexdigest()
+    if (found := cached(raw)) is not None:
+        key, code = found
+        return {'index': index, 'key': key, 'cached': True}, code
+    pool = gpss_sweep.executor()
+    try:
+        (row, key, code), observations = await asyncio.get_running_loop().run_in_executor(
+            pool, collected, generate, index, body)
+    except BrokenProcessPool as error:
+        gpss_sweep.discard(pool)
+        failed(error)
+        return {'index': index, 'error': f'{type(error).__name__}: {error}'}, None
+    registry.merge(observations)
+    if code is None:
+        return row, None
+    store(raw, key, code, hit=False)
+    return {**row, 'key': key, 'cached': False}, code
+
+
+async def completed(tasks: list[asyncio.Task]) -> AsyncIterator[tuple[dict[str, Any], Optional[GPSSCode]]]:
+    '''Результаты в порядке готовности; при разрыве соединения оставшиеся задачи отменяются.'''
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
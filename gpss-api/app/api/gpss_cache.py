@@ -0,0 +1,364 @@
+from typing import Any, Callable, Iterator, Optional, TypeVar
+from collections import OrderedDict
+from datetime import datetime
+from hashlib import sha256
+from pathlib import Path
+from threading import Lock
+from time import monotonic
+import json
+
+from fastapi import HTTPException
+from fastapi.exceptions import RequestValidationError
+from pydantic import TypeAdapter, ValidationError
+
+from app.core.config import settings
+from app.schemas.gpss_model_data import (EDGE_GEOMETRY_FIELDS, NODE_GEOMETRY_FIELDS, EdgeData, ModelData, NodeData,
+                                         keyed_errors)
+from app.schemas.gpss_code import GPSSCode
+from app.schemas.gpss_topology import TopologyReport
+from app.schemas.gpss_geometry import GeometryReport
+
+from .gpss_generator import Generator, duration, timing
+from .gpss_geometry import report as link_report
+from .gpss_graph import TopologyError, TopologyGraph
+from .gpss_metrics import collected, failed, registry, validated
+from .gpss_stream import chunked
+from .gpss_workers import workers
+
+
+T = TypeVar('T')
+
+NODES = TypeAdapter(dict[str, NodeData])
+EDGES = TypeAdapter(dict[str, EdgeData])
+
+
+class GPSSCache:
+    '''
+    LRU-кэш сгенерированного GPSS-кода с ограничением по объёму в байтах.
+    Ключ — хэш канонического представления проверенной `ModelData`; дополнительно
+    хранится соответствие хэша сырого тела запроса ключу, чтобы повторный запрос
+    с тем же телом не проходил ни валидацию, ни генерацию.
+    Файлы `directory` образуют второй уровень LRU с ограничением `max_directory_bytes`:
+    порядок восстанавливается по времени изменения файлов, попадание обновляет его.
+    '''
+    def __init__(self, max_bytes: int, max_entry_bytes: Optional[int] = None,
+                 directory: Optional[str] = None, max_directory_bytes: Optional[int] = None,
+                 max_aliases: int = 4096):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = min(max_entry_bytes or max_bytes, max_bytes)
+        self.max_aliases = max_aliases
+        self.directory = Path(directory) if directory else None
+        self.max_directory_bytes = max_directory_bytes or max_bytes
+        self.files: OrderedDict[str, int] = OrderedDict()
+        self.directory_size = 0
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            for path, stat in sorted(((path, path.stat()) for path in self.directory.glob('*.json')),
+                                     key=lambda item: item[1].st_mtime):
+                self.files[path.stem] = stat.st_size
+                self.directory_size += stat.st_size
+        self.entries: OrderedDict[str, tuple[GPSSCode, int]] = OrderedDict()
+        self.aliases: OrderedDict[str, str] = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.raw_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.file_evictions = 0
+        self.lock = Lock()
+        if self.directory is not None:
+            self._trim()
+
+    def resolve(self, raw: str) -> Optional[str]:
+        with self.lock:
+            key = self.aliases.get(raw)
+            if key is not None:
+                self.aliases.move_to_end(raw)
+            return key
+
+    def alias(self, raw: str, key: str):
+        with self.lock:
+            self.aliases[raw] = key
+            self.aliases.move_to_end(raw)
+            while len(self.aliases) > self.max_aliases:
+                self.aliases.popitem(last=False)
+
+    def get(self, key: str) -> Optional[GPSSCode]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                return entry[0]
+        if self.directory is not None and (path := self.directory / f'{key}.json').exists():
+            try:
+                code = GPSSCode.model_validate_json(path.read_bytes())
+                path.touch()
+            except FileNotFoundError:
+                # Файл вытеснен другим процессом с тем же каталогом.
+                return None
+            self._store(key, code)
+            with self.lock:
+                self.disk_hits += 1
+                if key in self.files:
+                    self.files.move_to_end(key)
+            return code
+        return None
+
+    def put(self, key: str, code: GPSSCode):
+        self._store(key, code)
+        if self.directory is not None:
+            data = code.model_dump_json().encode()
+            if len(data) > self.max_directory_bytes:
+                return
+            (self.directory / f'{key}.json').write_bytes(data)
+            with self.lock:
+                self.directory_size += len(data) - self.files.pop(key, 0)
+                self.files[key] = len(data)
+            self._trim()
+
+    def _trim(self):
+        '''Удаление самых давних файлов, пока каталог превышает `max_directory_bytes`.'''
+        with self.lock:
+            evicted = []
+            while self.directory_size > self.max_directory_bytes:
+                key, size = self.files.popitem(last=False)
+                self.directory_size -= size
+                self.file_evictions += 1
+                evicted.append(key)
+        for key in evicted:
+            (self.directory / f'{key}.json').unlink(missing_ok=True)
+
+    def _store(self, key: str, code: GPSSCode):
+        size = len(code.code.encode())
+        if size > self.max_entry_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[1]
+            self.entries[key] = (code, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.size -= evicted
+                self.evictions += 1
+
+    def count(self, hit: bool, raw: bool = False):
+        with self.lock:
+            if hit:
+                self.hits += 1
+                self.raw_hits += raw
+            else:
+                self.misses += 1
+
+    def stats(self) -> dict[str, int]:
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'raw_hits': self.raw_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'files': len(self.files),
+                'file_bytes': self.directory_size,
+                'file_evictions': self.file_evictions,
+            }
+
+
+cache = GPSSCache(max_bytes=settings.CACHE_MAX_BYTES, max_entry_bytes=settings.CACHE_ENTRY_MAX_BYTES,
+                  directory=settings.CACHE_DIR, max_directory_bytes=settings.CACHE_DIR_MAX_BYTES)
+
+
+def model_key(data: ModelData) -> str:
+    '''
+    Ключ кэша: хэш канонического представления проверенных данных модели.
+    Координаты узлов и физика каналов входят в ключ, только если включены расписания связей.
+    '''
+    if data.model.geometry is not None:
+        return sha256(data.model_dump_json().encode()).hexdigest()
+    digest = sha256(data.model.model_dump_json().encode())
+    digest.update(NODES.dump_json(data.nodes, exclude={'__all__': NODE_GEOMETRY_FIELDS}))
+    digest.update(EDGES.dump_json(data.edges, exclude={'__all__': EDGE_GEOMETRY_FIELDS}))
+    return digest.hexdigest()
+
+
+def cached(raw: str) -> Optional[tuple[str, GPSSCode]]:
+    '''Код по хэшу сырого тела запроса, без валидации.'''
+    key = cache.resolve(raw)
+    if key is not None and (code := cache.get(key)) is not None:
+        cache.count(hit=True, raw=True)
+        return key, code
+    return None
+
+
+def parse(body: bytes) -> ModelData:
+    '''Проверка `ModelData` напрямую из байтов тела запроса, без промежуточных словарей.'''
+    return ModelData.model_validate_json(body)
+
+
+def body_errors(errors: list[dict[str, Any]], body: bytes) -> list[dict[str, Any]]:
+    '''Ошибки `parse` с ключами элементов вместо индексов в `loc` (тело разбирается повторно только здесь).'''
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        payload = None
+    return keyed_errors(errors, payload)
+
+
+def validate(body: bytes) -> ModelData:
+    start_time = monotonic()
+    try:
+        data = parse(body)
+        validated(data, len(body), monotonic() - start_time)
+        return data
+    except ValidationError as error:
+        raise RequestValidationError([{**item, 'loc': ('body', *item['loc'])}
+                                      for item in body_errors(error.errors(include_url=False), body)]) from None
+
+
+def lookup(body: bytes) -> tuple[str, Optional[GPSSCode], Optional[TopologyGraph]]:
+    '''
+    Поиск кода по сырому телу запроса.
+    Возвращает ключ (он же ETag), код из кэша или, при промахе, граф проверенной модели:
+    ошибки топологии выявляются до начала потоковой отдачи, а генератор использует тот же индекс.
+    '''
+    raw = sha256(body).hexdigest()
+    if (found := cached(raw)) is not None:
+        return *found, None
+    data = validate(body)
+    key = model_key(data)
+    cache.alias(raw, key)
+    code = cache.get(key)
+    cache.count(hit=code is not None)
+    if code is not None:
+        return key, code, None
+    graph = TopologyGraph(data)
+    graph.raise_for_errors()
+    return key, None, graph
+
+
+def render(body: bytes) -> tuple[str, GPSSCode, bool]:
+    '''
+    Валидация и генерация по сырому телу запроса (исполняется в пуле генерации).
+    Кэш только читается; в пуле процессов у каждого процесса он свой, и совпадение там
+    возможно лишь через `CACHE_DIR`. Третий элемент — признак попадания.
+    '''
+    data = validate(body)
+    key = model_key(data)
+    if (code := cache.get(key)) is not None:
+        return key, code, True
+    return key, Generator(data=data).code(), False
+
+
+def check(body: bytes) -> TopologyReport:
+    '''Проверка модели без генерации (исполняется в пуле генерации): валидация и анализ графа.'''
+    data = validate(body)
+    start_time = monotonic()
+    report = TopologyGraph(data).report()
+    report.check_time = monotonic() - start_time
+    return report
+
+
+def geometry(body: bytes) -> GeometryReport:
+    '''Расписания связей модели без генерации (исполняется в пуле генерации).'''
+    return link_report(validate(body))
+
+
+def store(raw: str, key: str, code: GPSSCode, hit: bool):
+    '''Запись результата `render` в кэш основного процесса.'''
+    cache.alias(raw, key)
+    cache.count(hit=hit)
+    if not hit:
+        cache.put(key, code)
+
+
+async def offload(function: Callable[..., T], *args) -> T:
+    '''
+    Исполнение в пуле `workers` с переносом наблюдений метрик в основной процесс;
+    ошибки модели учитываются в `gpss_errors_total`, ошибки топологии возвращаются как 422.
+    '''
+    try:
+        result, observations = await workers.run(collected, function, *args)
+    except HTTPException:
+        raise
+    except TopologyError as error:
+        failed(error)
+        raise HTTPException(status_code=422, detail=error.detail()) from None
+    except Exception as error:
+        failed(error)
+        raise
+    registry.merge(observations)
+    return result
+
+
+async def generate(body: bytes) -> tuple[str, GPSSCode, bool]:
+    '''Код по сырому телу запроса через кэш; при промахе генерация идёт в пуле `workers`.'''
+    raw = sha256(body).hexdigest()
+    if (found := cached(raw)) is not None:
+        return *found, True
+    key, code, hit = await offload(render, body)
+    store(raw, key, code, hit)
+    return key, code, hit
+
+
+async def prepare(body: bytes) -> tuple[str, Optional[GPSSCode], Optional[TopologyGraph], bool]:
+    '''
+    `lookup` для потоковой отдачи с валидацией в пуле `workers`; четвёртый элемент — признак попадания.
+    В пуле потоков код затем генерируется потоком (`stream_code` через `workers.stream`);
+    в пуле процессов генератор не передать между процессами, поэтому код генерируется целиком.
+    '''
+    raw = sha256(body).hexdigest()
+    if (found := cached(raw)) is not None:
+        return *found, None, True
+    if workers.kind == 'thread':
+        key, code, graph = await offload(lookup, body)
+        return key, code, graph, code is not None
+    key, code, hit = await offload(render, body)
+    store(raw, key, code, hit)
+    return key, code, None, hit
+
+
+def stream_code(key: str, code: Optional[GPSSCode], graph: Optional[TopologyGraph],
+                add_time: bool = False) -> Iterator[str]:
+    '''
+    Потоковая отдача кода из кэша или генератора.
+    При промахе части накапливаются для кэша, пока не превышен `max_entry_bytes`;
+    более крупные модели только отдаются, и память не растёт с размером топологии.
+    С `add_time` блок с датой генерации выдаётся перед кодом, время генерации — после него.
+    '''
+    if code is not None:
+        if add_time:
+            # Ширина рамок не хранится в кэше: первая строка кода — рамка шириной `code_width` + 2.
+            yield timing(code.code.index('\n') - 2, code.gen_date)
+        yield from chunked(code.code)
+        if add_time:
+            yield duration(code.gen_time)
+        return
+    parts: Optional[list[str]] = []
+    size = 0
+    try:
+        generator = Generator(data=graph.data, graph=graph)
+        start_time = monotonic()
+        gen_date = datetime.now()
+        if add_time:
+            yield timing(generator.code_width, gen_date)
+        for chunk in generator.stream():
+            if parts is not None:
+                size += len(chunk)
+                if size <= cache.max_entry_bytes:
+                    parts.append(chunk)
+                else:
+                    parts = None
+            yield chunk
+    except Exception as error:
+        failed(error)
+        raise
+    gen_time = monotonic() - start_time
+    if parts is not None:
+        cache.put(key, GPSSCode(code=''.join(parts), gen_time=gen_time, gen_date=gen_date,
+                                  folding=generator.fold_report()))
+    if add_time:
+        yield duration(gen_time)
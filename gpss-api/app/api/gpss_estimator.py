@@ -0,0 +1,243 @@
+from typing import Callable
+from math import exp, floor, inf, log
+from time import monotonic
+
+import numpy as np
+
+from app.schemas.gpss_model_data import ModelData
+from app.schemas.gpss_estimate import Estimate
+
+from .gpss_simulator import SimModel, Station, SINK, LOSS
+
+
+# Математическое ожидание `{dist}(1,a,b)` для библиотечных функций из `gpss_simulator.DISTRIBUTIONS`.
+MEANS: dict[str, Callable[[float, float], float]] = {
+    'exponential': lambda locate, scale: locate + scale,
+    'uniform': lambda low, high: (low + high) / 2,
+    'duniform': lambda low, high: (low + high) / 2,
+}
+
+
+def mean(name: str, a: float, b: float) -> float:
+    try:
+        return MEANS[name](a, b)
+    except KeyError:
+        raise ValueError(f'Unsupported distribution `{name}`.') from None
+
+
+def mean_packets(name: str, low: float, high: float, mtu: int) -> float:
+    '''Среднее число транзактов после `SPLIT (P$cap_data/mtu)`, включая родительский.'''
+    def floor_sum(n: int) -> float:
+        # sum_{c=0}^{n} floor(c / mtu)
+        q, r = divmod(n, mtu)
+        return mtu * q * (q - 1) / 2 + q * (r + 1)
+
+    def floor_integral(x: float) -> float:
+        # int_0^x floor(t / mtu) dt
+        q = floor(x / mtu)
+        return mtu * q * (q - 1) / 2 + q * (x - q * mtu)
+
+    match name:
+        case 'duniform':
+            low, high = int(low), int(high)
+            return (floor_sum(high) - floor_sum(low - 1)) / (high - low + 1) + 1
+        case 'uniform':
+            if high == low:
+                return floor(low / mtu) + 1
+            return (floor_integral(high) - floor_integral(low)) / (high - low) + 1
+        case 'exponential':
+            # E[floor(X / mtu)] = sum_k P(X >= k * mtu) для X = locate + Exp(scale)
+            first = floor(low / mtu) + 1
+            return first - 1 + exp(-(first * mtu - low) / high) / (1 - exp(-mtu / high)) + 1
+        case _:
+            raise ValueError(f'Unsupported distribution `{name}`.')
+
+
+def mmck(rate: float, mu: float, servers: int, buffer: float) -> tuple[float, float]:
+    '''
+    Система M/M/c/K с `buffer` местами ожидания (K = c + buffer).
+    Возвращает вероятность блокировки и среднюю длину очереди; перегруженная система
+    с неограниченным буфером — `(0, inf)`.
+    '''
+    if rate <= 0:
+        return 0.0, 0.0
+    load = rate / mu
+    # log(min(n, c)!) для n = 0..c.
+    log_factorial = np.concatenate(([0.0], np.cumsum(np.log(np.arange(1, servers + 1)))))
+    if not np.isfinite(buffer):
+        rho = load / servers
+        if rho >= 1:
+            return 0.0, inf
+        # Формула Эрланга C через логарифмы для устойчивости при больших `servers`.
+        n = np.arange(servers)
+        head = np.exp(n * log(load) - log_factorial[:-1])
+        tail = exp(servers * log(load) - log_factorial[-1]) / (1 - rho)
+        wait = tail / (head.sum() + tail)
+        return 0.0, wait * rho / (1 - rho)
+    size = servers + int(buffer)
+    n = np.arange(size + 1)
+    waiting = np.maximum(n - servers, 0)
+    log_terms = n * log(load) - log_factorial[np.minimum(n, servers)] - waiting * log(servers)
+    p = np.exp(log_terms - log_terms.max())
+    p /= p.sum()
+    return float(p[-1]), float((waiting * p).sum())
+
+
+def components(successors: list[list[int]]) -> list[list[int]]:
+    '''Компоненты сильной связности (алгоритм Тарьяна без рекурсии) в топологическом порядке.'''
+    index = [-1] * len(successors)
+    low = [0] * len(successors)
+    on_stack = [False] * len(successors)
+    stack: list[int] = []
+    result: list[list[int]] = []
+    counter = 0
+    for root in range(len(successors)):
+        if index[root] >= 0:
+            continue
+        work = [(root, 0)]
+        while work:
+            node, position = work.pop()
+            if position == 0:
+                index[node] = low[node] = counter
+                counter += 1
+                stack.append(node)
+                on_stack[node] = True
+            for k in range(position, len(successors[node])):
+                target = successors[node][k]
+                if index[target] < 0:
+                    work.append((node, k + 1))
+                    work.append((target, 0))
+                    break
+                if on_stack[target]:
+                    low[node] = min(low[node], index[target])
+            else:
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = False
+                        component.append(member)
+                        if member == node:
+                            break
+                    result.append(component)
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+    return result[::-1]
+
+
+class Estimator:
+    '''
+    Аналитическая оценка сети массового обслуживания по `ModelData`.
+    Трафик каждого типа `type_data` идёт по фиксированному маршруту (`Station.route`), поэтому
+    уравнения баланса потоков решаются одним проходом по станциям в топологическом порядке
+    компонент сильной связности: на вход станции приходит пропущенный поток предшественников,
+    блокировка считается по M/M/c/K (метод пониженной нагрузки) один раз на станцию.
+    Итерации нужны только внутри компонент с петлями маршрутизации. Перегруженная станция
+    с неограниченным буфером неустойчива (`stable=False`) и пропускает дальше `c * mu`.
+    '''
+    def __init__(self, data: ModelData, max_iterations: int = 100, tolerance: float = 1e-10):
+        self.model = SimModel(data)
+        self.max_iterations = max_iterations
+        self.tolerance = tolerance
+
+    def passing(self, station: Station, service: float, rate: float) -> tuple[float, float, float]:
+        '''Доля поступившего потока, которую станция передаёт дальше, блокировка и длина очереди.'''
+        block, queue_length = mmck(rate, 1 / service, station.capacity, station.limit)
+        if queue_length == inf:
+            return station.capacity / service / rate, block, queue_length
+        return 1 - block, block, queue_length
+
+    def settle(self, members: list[int], offered: list[list[float]], routes: list[list[int]],
+               service: list[float]) -> int:
+        '''
+        Потоки внутри компоненты с петлёй маршрутизации: пропущенный поток станции снова
+        поступает в компоненту, поэтому поток и блокировки уточняются итерациями до сходимости.
+        Результат записывается в `offered`; возвращает число итераций.
+        '''
+        stations = self.model.stations
+        member = {idx: position for position, idx in enumerate(members)}
+        # Переходы внутри компоненты: (откуда, тип, куда) в локальной нумерации.
+        source, k, target = np.array([(position, k, member[target])
+                                      for position, idx in enumerate(members)
+                                      for k, target in enumerate(routes[idx]) if target in member],
+                                     dtype=np.int64).T
+        base = np.array([offered[idx] for idx in members])
+        inflow = base
+        for step in range(1, self.max_iterations + 1):
+            share = np.array([self.passing(stations[idx], service[idx], rate)[0]
+                              for idx, rate in zip(members, inflow.sum(axis=1).tolist())])
+            updated = base.copy()
+            np.add.at(updated, (target, k), inflow[source, k] * share[source])
+            converged = np.allclose(updated, inflow, rtol=self.tolerance, atol=0)
+            inflow = updated
+            if converged:
+                break
+        for idx, row in zip(members, inflow.tolist()):
+            offered[idx] = row
+        return step
+
+    def estimate(self) -> Estimate:
+        start_time = monotonic()
+        model = self.model
+        stations = model.stations
+        types = sorted({source.type_data for source in model.sources})
+        column = {type_data: k for k, type_data in enumerate(types)}
+        packets = mean_packets(model.capacity_dist_name, *model.capacity_params, model.mtu)
+
+        offered = [[0.0] * len(types) for _ in stations]
+        generated = delivered = 0.0
+        for source in model.sources:
+            rate = packets / mean(source.dist_name, 0, 1 / source.lambda_)
+            generated += rate
+            if source.target == SINK:
+                delivered += rate
+            else:
+                offered[source.target][column[source.type_data]] += rate
+
+        routes = [[station.route(type_data) for type_data in types] for station in stations]
+        service = [mean(station.dist_name, 0, 1 / station.mu) for station in stations]
+        queueing: list[tuple[float, float, float]] = [(1.0, 0.0, 0.0)] * len(stations)
+        iterations = 1
+        for members in components([[target for target in dict.fromkeys(targets) if target >= 0]
+                                   for targets in routes]):
+            if len(members) > 1 or members[0] in routes[members[0]]:
+                iterations = max(iterations, self.settle(members, offered, routes, service))
+            inside = set(members)
+            for idx in members:
+                queueing[idx] = self.passing(stations[idx], service[idx], sum(offered[idx]))
+                share = queueing[idx][0]
+                for k, target in enumerate(routes[idx]):
+                    if target == SINK:
+                        delivered += offered[idx][k] * share
+                    elif target != LOSS and target not in inside:
+                        offered[target][k] += offered[idx][k] * share
+
+        result = []
+        for idx, station in enumerate(stations):
+            rate = sum(offered[idx])
+            share, block, queue_length = queueing[idx]
+            stable = queue_length != inf
+            throughput = rate * share
+            wait = (queue_length / throughput if throughput else 0.0) if stable else None
+            result.append(Estimate.Station(
+                name=station.label,
+                node_id=station.node_id,
+                kind='processing' if station.storage else 'interface',
+                servers=station.capacity,
+                buffer=int(station.limit) if np.isfinite(station.limit) else None,
+                arrival_rate=rate,
+                throughput=throughput,
+                utilization=min(throughput * service[idx] / station.capacity, 1.0),
+                blocking=block,
+                stable=stable,
+                queue_length=queue_length if stable else None,
+                wait_time=wait,
+                sojourn_time=wait + service[idx] if stable else None))
+        return Estimate(
+            generated_rate=generated,
+            delivered_rate=delivered,
+            loss_rate=1 - delivered / generated if generated else 0.0,
+            stations=result,
+            iterations=iterations,
+            est_time=monotonic() - start_time)
@@ -0,0 +1,121 @@
+from typing import Hashable, Optional
+
+from app.schemas.gpss_code import GPSSCode
+from app.schemas.gpss_model_data import ModelData, NodeData
+
+
+# Типы узлов, блоки которых сворачиваются: узлы с обработкой и маршрутизацией.
+FOLDED_TYPES = ('sc', 'haps', 'es')
+# Явные номера объектов свёрнутых групп; именованным объектам GPSS World выдаёт номера с 10000.
+MAX_ENTITY = 9999
+
+
+def signature(node: NodeData) -> Optional[Hashable]:
+    '''
+    Структурная сигнатура узла: тип, параметры обработки, таблица маршрутизации и параметры
+    интерфейсов по `(direction, idx)`. Узлы с равной сигнатурой дают одинаковый код с точностью
+    до меток и переходов. `None` — узел не сворачивается (другой тип, генератор, повтор `idx`).
+    '''
+    node_data = node.data
+    processing = node_data.processing
+    if str(node_data.nodeType).lower() not in FOLDED_TYPES or processing is None or node_data.generator is not None:
+        return None
+    interfaces = sorted((interface.direction, interface.idx, interface.queue.q, interface.service.mu,
+                         interface.service.dist)
+                        for interface in node_data.interfaces.values())
+    slots = [interface[:2] for interface in interfaces]
+    if len(set(slots)) != len(slots) or any(direction not in ('in', 'out') for direction, _ in slots):
+        return None
+    return (node_data.nodeType, processing.serviceLines, processing.queue, processing.mu, processing.dist,
+            tuple((route.type, route.outPort) for route in processing.routingTable), tuple(interfaces))
+
+
+class Group:
+    '''
+    Класс эквивалентности узлов, код которого выдаётся один раз. Объекты участника `m` (1..N)
+    имеют номера `base + (m - 1) * stride + слот`: слот 0 — обработка, далее интерфейсы `in`
+    и `out` по возрастанию `idx`.
+    '''
+    __slots__ = ('name', 'node_type', 'members', 'slots', 'base')
+
+    def __init__(self, name: str, node_type: str, members: list[str], slots: list[tuple[str, int]], base: int):
+        self.name = name
+        self.node_type = node_type
+        self.members = members
+        self.slots = slots
+        self.base = base
+
+    @property
+    def stride(self) -> int:
+        return len(self.slots) + 1
+
+    @property
+    def size(self) -> int:
+        return len(self.members) * self.stride
+
+    def slot_label(self, slot: tuple[str, int], node_id: str) -> str:
+        direction, idx = slot
+        return f'{direction}_int{idx}_{node_id}'
+
+    def number(self, member: int, slot: int) -> int:
+        return self.base + (member - 1) * self.stride + slot
+
+    def labels(self) -> dict[int, str]:
+        '''Номер объекта → исходная метка: id узла для обработки, метка интерфейса для слотов.'''
+        labels = {}
+        for member, node_id in enumerate(self.members, start=1):
+            labels[self.number(member, 0)] = node_id
+            for slot, key in enumerate(self.slots, start=1):
+                labels[self.number(member, slot)] = self.slot_label(key, node_id)
+        return labels
+
+
+class Folding:
+    '''
+    Поиск структурно эквивалентных узлов модели (`model.fold`): узлы группируются по хэшу
+    сигнатуры, классы не меньше `min_members` сворачиваются. Связи участников различаются
+    и передаются данными — таблицей переходов по номеру участника, поэтому соседи узлов
+    в сигнатуру не входят. Узлы из `excluded` (например, со связями по расписанию) не сворачиваются.
+    '''
+    def __init__(self, data: ModelData, min_members: int, excluded: frozenset[str] = frozenset()):
+        self.nodes = len(data.nodes)
+        self.groups: list[Group] = []
+        self.member_of: dict[str, tuple[Group, int]] = {}
+        self.lines = 0
+        self.unfolded_lines = 0
+        classes: dict[Hashable, list[str]] = {}
+        for node_id, node in data.nodes.items():
+            if node_id not in excluded and (key := signature(node)) is not None:
+                classes.setdefault(key, []).append(node_id)
+        base = 1
+        for members in classes.values():
+            if len(members) < min_members:
+                continue
+            node_data = data.nodes[members[0]].data
+            slots = sorted((interface.direction, interface.idx) for interface in node_data.interfaces.values())
+            group = Group(self.name(data), node_data.nodeType, members, slots, base)
+            if base + group.size - 1 > MAX_ENTITY:
+                continue
+            base += group.size
+            self.groups.append(group)
+            for member, node_id in enumerate(members, start=1):
+                self.member_of[node_id] = (group, member)
+
+    def name(self, data: ModelData) -> str:
+        # Имя группы входит в метки её блоков и не должно совпадать с id узла.
+        name = f'fold{len(self.groups) + 1}'
+        while name in data.nodes:
+            name += '_'
+        return name
+
+    def report(self) -> GPSSCode.Folding:
+        return GPSSCode.Folding(
+            nodes=self.nodes,
+            folded_nodes=sum(len(group.members) for group in self.groups),
+            lines=self.lines,
+            unfolded_lines=self.unfolded_lines,
+            groups=[GPSSCode.Folding.Group(
+                name=group.name, node_type=group.node_type, members=group.members, base=group.base,
+                stride=group.stride, slots=[f'{direction}_int{idx}' for direction, idx in group.slots])
+                for group in self.groups],
+            labels={number: label for group in self.groups for number, label in group.labels().items()})
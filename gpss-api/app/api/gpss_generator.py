@@ -1,24 +1,55 @@
-from typing import Optional, Literal
+from typing import Iterator, Optional, Literal
 from time import monotonic
 from datetime import datetime
+import textwrap
 
 from app.schemas.gpss_model_data import ModelData, NodeData
 from app.schemas.gpss_code import GPSSCode
 
+from .gpss_templates import Templates, templates
+from .gpss_graph import PROCESSING, TopologyGraph
+from .gpss_folding import Folding, Group
+from .gpss_geometry import LinkGeometry, link_geometry, number
+from .gpss_metrics import generated
+
+
+class GenerationContext:
+    '''
+    Общие для всех блоков модели величины, вычисляемые один раз на `ModelData`:
+    ширина поля меток, отступ и скомпилированные шаблоны блоков. Индекс связь → метка
+    интерфейса назначения и исходящие интерфейсы узлов по `idx` берутся из `TopologyGraph`;
+    при ошибках топологии генерация не начинается (`TopologyError`). При `model.geometry`
+    исходящие интерфейсы узлов обработки получают расписания связей (`schedules`: метка → номер связи).
+    '''
+    def __init__(self, data: ModelData, graph: Optional[TopologyGraph] = None):
+        self.graph: TopologyGraph = graph if graph is not None else TopologyGraph(data)
+        self.graph.raise_for_errors()
+        self.code_margin: int = self.graph.label_width + 5
+        self.code_width: int = self.code_margin * 4 + 16
+        self.indent: str = '\n' + ' ' * (self.code_margin + 1)
+        self.destinations: dict[str, str] = self.graph.destinations
+        self.out_interfaces: dict[str, dict[int, NodeData.Data.Interface]] = self.graph.out_interfaces
+        self.templates: Templates = templates(self.code_margin)
+        self.geometry: Optional[LinkGeometry] = None
+        self.schedules: dict[str, int] = {}
+        if data.model.geometry is not None:
+            self.geometry = link_geometry(data)
+            self.schedules = {link[3]: k for k, link in enumerate(self.geometry.links)
+                              if str(data.nodes[link[1]].data.nodeType).lower() in PROCESSING}
+
 
 class Block:
-    def __init__(self, data: ModelData):
+    def __init__(self, data: ModelData, context: Optional[GenerationContext] = None):
         self.global_data: ModelData = data
+        self.context: GenerationContext = context if context is not None else GenerationContext(data)
         self.code_header: Optional[str] = ''
         self.code_footer: Optional[str] = ''
-        self.code_margin: int = max(len(interface.base_label) 
-                                    for node in data.nodes.values() 
-                                    for interface in node.data.interfaces.values()) + 5
-        self.code_width: int = self.code_margin * 4 + 16
+        self.code_margin: int = self.context.code_margin
+        self.code_width: int = self.context.code_width
 
 
 class Node(Block):
-    def __new__(cls, node_key: str, data: ModelData):
+    def __new__(cls, node_key: str, data: ModelData, context: Optional[GenerationContext] = None):
         node_data = data.nodes[node_key]
         match str(node_data.data.nodeType).lower():
             case 'as':
@@ -34,8 +65,8 @@ class Node(Block):
             case _:
                 raise TypeError(f'Unexpected `nodeType` (`{node_data.data.nodeType}`) in NodeData.')
 
-    def __init__(self, node_key: str, data: ModelData):
-        super().__init__(data)
+    def __init__(self, node_key: str, data: ModelData, context: Optional[GenerationContext] = None):
+        super().__init__(data, context)
         self.data: NodeData = data.nodes[node_key]
         self.header_label = f' | {self.data.data.label}' if self.data.data.label is not None else ''
         
@@ -55,159 +86,108 @@ class Node(Block):
     def next_int_name(self, interface: NodeData.Data.Interface, direction: Literal['in', 'out']) -> str:
             if direction == 'in':
                 return f'processing_{self.data.id}'
-            next_int_data = self.global_data.edges[interface.edgeId].data.channel.to
-            next_interface = self.global_data.nodes[next_int_data.nodeId].data.interfaces[next_int_data.portId]
-            return next_interface.base_label
+            return self.context.destinations[interface.edgeId]
 
     def gen_input_data(self) -> str:
-        template = '{data__gen}{data__proc}{data__int}'
-        template_gen = '{la:<{width}} EQU       {la_val}'
-        template_proc = (
-            '{service_name:<{width}} STORAGE   {service_lines}\n'
-            '{queue:<{width}} EQU       {queue_val}\n'
-            '{mu:<{width}} EQU       {mu_val}')
-        template_int = (
-            '{queue:<{width}} EQU       {queue_val}\n'
-            '{mu:<{width}} EQU       {mu_val}')
+        templates = self.context.templates
+        node_data = self.data.data
         interfaces = [interface 
-                      for interface in self.data.data.interfaces.values() 
+                      for interface in node_data.interfaces.values() 
                       if interface.queue.q > 0]
-        return template.format(
-            data__gen=template_gen.format(
-                    width=self.code_margin,
-                    la=f'la_gen_{self.data.id}',
-                    la_val=self.data.data.generator.lambda_
-                ) if self.data.data.generator is not None else '',
-            data__proc=template_proc.format(
-                width=self.code_margin,
-                service_name=f'service_{self.data.id}',
-                service_lines=self.data.data.processing.serviceLines,
-                queue=f' q_{self.data.id}',
-                queue_val=self.data.data.processing.queue,
-                mu=f'mu_{self.data.id}',
-                mu_val=self.data.data.processing.mu
-            ) + '\n' if self.data.data.processing is not None else '',
-            data__int='\n'.join(template_int.format(
-                width=self.code_margin,
-                queue=f' q_{interface.base_label}',
-                queue_val=interface.queue.q,
-                mu=f'mu_{interface.base_label}',
-                mu_val=interface.service.mu
-            ) for interface in interfaces
-            ) + '\n' if interfaces else ''
-        )
+        data__gen = templates.generator_input.render(
+            self.data.id, node_data.generator.lambda_) if node_data.generator is not None else ''
+        data__proc = templates.processing_input.render(
+            self.data.id, node_data.processing.serviceLines, node_data.processing.queue,
+            node_data.processing.mu) + '\n' if node_data.processing is not None else ''
+        data__int = '\n'.join(
+            templates.interface_input.render(interface.base_label, interface.queue.q, interface.service.mu)
+            if interface.base_label not in self.context.schedules else self.gen_schedule_input(interface)
+            for interface in interfaces) + '\n' if interfaces else ''
+        return f'{data__gen}{data__proc}{data__int}'
+
+    def gen_schedule_input(self, interface: NodeData.Data.Interface) -> str:
+        '''Функции `mu_*` и `vis_*` интерфейса со связью по расписанию.'''
+        geometry = self.context.geometry
+        k = self.context.schedules[interface.base_label]
+        # Связь без физики канала или ни разу не видимая: постоянная интенсивность интерфейса.
+        rates = ((geometry.rates[k] is not None and geometry.function(geometry.rates[k]))
+                 or [f'{number(geometry.duration)},{interface.service.mu}'])
+        windows = geometry.function(geometry.visibility[k])
+        return self.context.templates.schedule_input.render(
+            interface.base_label, interface.queue.q, len(rates), self.points(rates), len(windows), self.points(windows))
+
+    def points(self, points: list[str]) -> str:
+        '''Строки точек функции `x,y/x,y/...` не шире `code_width`.'''
+        lines, line = [], ''
+        for point in points:
+            if line and len(line) + len(point) + 1 > self.code_width:
+                lines.append(line)
+                line = point
+            else:
+                line = f'{line}/{point}' if line else point
+        lines.append(line)
+        return '\n'.join(lines)
 
     def gen_interfaces_data(self, direction: Literal['in', 'out']) -> str:
-        template = (
-            '{name}'
-            '{block:<{width}} ASSIGN    {key_int_idx},{val_int_idx}'
-            '{indent}TEST L    Q${queue_name},{queue},{loss}'
-            '{indent}QUEUE     {queue_name}'
-            '{indent}SEIZE     {service_name}'
-            '{indent}DEPART    {queue_name}'
-            '{indent}ADVANCE   ({dist}(1,0,1/{mu}))'
-            '{indent}RELEASE   {service_name}'
-            '{indent}TRANSFER  ,{next_block}\n\n'
-            '{loss:<{width}} SAVEVALUE {loss}_+,1'
-            '{indent}TERMINATE')
+        templates = self.context.templates
+        schedules = self.context.schedules
+        node_type = self.data.data.nodeType
         return '\n\n'.join(
-            template.format(
-                name=f'* {interface.name}\n' if interface.name is not None else '',
-                block=interface.base_label,
-                width=self.code_margin,
-                key_int_idx=f'number_{direction}_int_{self.data.data.nodeType}',
-                val_int_idx=interface.idx,
-                indent='\n' + ' ' * (self.code_margin + 1),
-                queue_name=f'queue_{interface.base_label}',
-                queue=f'q_{interface.base_label}',
-                loss=f'loss_{interface.base_label}',
-                service_name=f'service_{interface.base_label}',
-                dist=interface.service.dist,
-                mu=f'mu_{interface.base_label}',
-                next_block=self.next_int_name(interface=interface,
-                                              direction=direction),
-            ) for interface in self.data.data.interfaces.values()
+            (templates.scheduled_interface if interface.base_label in schedules else templates.interface).render(
+                interface.name,
+                interface.base_label,
+                direction,
+                node_type,
+                interface.idx,
+                interface.service.dist,
+                self.next_int_name(interface=interface, direction=direction))
+            for interface in self.data.data.interfaces.values()
             if interface.direction == direction
         ) 
 
     def gen_processing_data(self) -> str:
-        template = (
-            '* Обработка\n'
-            '{proc_name:<{width}} TEST L    Q${queue_name},{queue},{loss}'
-            '{indent}QUEUE     {queue_name}'
-            '{indent}ENTER     {service_name},1'
-            '{indent}DEPART    {queue_name}'
-            '{indent}ADVANCE   ({dist}(1,0,1/{mu}))'
-            '{indent}LEAVE     {service_name},1\n'
-            '{routing}\n'
-            '{loss:<{width}} SAVEVALUE {loss}_+,1'
-            '{indent}TERMINATE')
-        template_test_routing = '{indent}TEST E    P$type_data,{type},{route_name}'
-        template_test =  '{route_name:<{width}} TRANSFER  ,{next_block}'
-        indent = '\n' + ' ' * (self.code_margin + 1)
-        out_interfaces = {interface.idx: interface 
-                          for interface in self.data.data.interfaces.values() 
-                          if interface.direction == 'out'}
-        return template.format(
-            proc_name=f'processing_{self.data.id}',
-            width=self.code_margin,
-            indent=indent,
-            queue_name=f'queue_{self.data.id}',
-            queue=f'q_{self.data.id}',
-            loss=f'loss_{self.data.id}',
-            service_name=f'service_{self.data.id}',
-            dist=self.data.data.processing.dist,
-            mu=f'mu_{self.data.id}',
-            routing=''.join(template_test_routing.format(
-                indent=indent,
-                type=route.type,
-                route_name=f'TEST_{self.data.id}_{route.outPort}'
-            ) for route in self.data.data.processing.routingTable) + '\n\n' + '\n'.join(template_test.format(
-                route_name=f'TEST_{self.data.id}_{route.outPort}',
-                width=self.code_margin,
-                next_block=out_interfaces[route.outPort].base_label
-            ) for route in self.data.data.processing.routingTable) + '\n'
-        ) 
+        templates = self.context.templates
+        out_interfaces = self.context.out_interfaces[self.data.id]
+        processing = self.data.data.processing
+        routes = [(route, f'TEST_{self.data.id}_{route.outPort}') for route in processing.routingTable]
+        routing = (
+            ''.join('\n' + templates.route_test.render(route.type, route_name) for route, route_name in routes)
+            + '\n\n'
+            + '\n'.join(templates.route_transfer.render(route_name, out_interfaces[route.outPort].base_label)
+                        for route, route_name in routes)
+            + '\n')
+        return templates.processing.render(self.data.id, processing.dist, routing)
 
 
 class AS(Node):
-    def __init__(self, node_key, data):
-        super().__init__(node_key, data)
+    def __init__(self, node_key, data, context=None):
+        super().__init__(node_key, data, context)
         self.code_header = f'[Генератор трафика от абонентов кластера | {self.data.id}{self.header_label}]'
         
     def code_generator(self):
-        template_gen = (
-            f'{self.gen_input_data()}\n'
-            '{indent}GENERATE  ({val__dist}(1,0,1/{key__la_gen}))'
-            '{indent}ASSIGN    {key__cap_data},(V${key__capacity})'
-            '{indent}SPLIT     (P${key__cap_data}/{mtu})'
-            '{indent}ASSIGN    {key__type_data},{val__type_data}'
-            '{indent}TRANSFER  ,{key__out_int}\n\n')
+        template = self.context.templates.source
+        node_data = self.data.data
+        input_data = self.gen_input_data()
         return '{generator}{key__in_ints}\n\n'.format(
-            generator='\n'.join(template_gen.format(
-                width=self.code_margin,
-                indent='\n' + ' ' * (self.code_margin + 1),
-                key__la_gen=f'la_gen_{self.data.id}',
-                val__la_gen=self.data.data.generator.lambda_,
-                val__dist=interface.service.dist,
-                key__cap_data=f'cap_data_AS',
-                mtu=self.global_data.model.packet.mtu,
-                key__capacity=self.data.data.generator.capacitySource,
-                key__type_data='type_data',
-                val__type_data=self.data.data.generator.typeData,
-                key__out_int=self.next_int_name(interface=interface, direction='out'))
-                for interface in self.data.data.interfaces.values() if interface.direction == 'out'),
-            key__in_ints=f'\n'.join(
-                '{key__in_int:<{width}} TERMINATE'.format(
-                    width=self.code_margin,
-                    key__in_int=interface.base_label) 
-                for interface in self.data.data.interfaces.values() if interface.direction == 'in')
+            generator='\n'.join(template.render(
+                input_data,
+                interface.service.dist,
+                self.data.id,
+                'AS',
+                node_data.generator.capacitySource,
+                self.global_data.model.packet.mtu,
+                node_data.generator.typeData,
+                self.next_int_name(interface=interface, direction='out'))
+                for interface in node_data.interfaces.values() if interface.direction == 'out'),
+            key__in_ints='\n'.join(
+                self.context.templates.terminate.render(interface.base_label)
+                for interface in node_data.interfaces.values() if interface.direction == 'in')
         )
 
 
 class SC(Node):
-    def __init__(self, node_key, data):
-        super().__init__(node_key, data)
+    def __init__(self, node_key, data, context=None):
+        super().__init__(node_key, data, context)
         self.code_header = f'[КА с обработкой на борту | {self.data.id}{self.header_label}]'
     
     def code_generator(self):
@@ -219,8 +199,8 @@ class SC(Node):
 
 
 class HAPS(Node):
-    def __init__(self, node_key, data):
-        super().__init__(node_key, data)
+    def __init__(self, node_key, data, context=None):
+        super().__init__(node_key, data, context)
         self.code_header = f'[HAPS с обработкой на борту | {self.data.id}{self.header_label}]'
 
     def code_generator(self):
@@ -232,8 +212,8 @@ class HAPS(Node):
 
 
 class ES(Node):
-    def __init__(self, node_key, data):
-        super().__init__(node_key, data)
+    def __init__(self, node_key, data, context=None):
+        super().__init__(node_key, data, context)
         self.code_header = f'[Земная станция | {self.data.id}{self.header_label}]'
 
     def code_generator(self):
@@ -245,94 +225,267 @@ class ES(Node):
 
 
 class SSOP(Node):
-    def __init__(self, node_key, data):
-        super().__init__(node_key, data)
+    def __init__(self, node_key, data, context=None):
+        super().__init__(node_key, data, context)
         self.code_header = f'[ССОП | {self.data.id}{self.header_label}]'
         
     def code_generator(self):
-        template = (
+        templates = self.context.templates
+        node_data = self.data.data
+        key__in_ints = '\n'.join(
+            templates.terminate.render(interface.base_label)
+            for interface in node_data.interfaces.values()
+            if interface.direction == 'in')
+        return templates.ssop.render(
+            self.gen_input_data(),
+            self.data.id,
+            list(node_data.interfaces.values())[0].service.dist,
+            node_data.generator.capacitySource,
+            self.global_data.model.packet.mtu,
+            node_data.generator.typeData,
+            ','.join(self.next_int_name(interface=interface, direction='out')
+                     for interface in node_data.interfaces.values()
+                     if interface.direction == 'out'),
+            key__in_ints.ljust(self.code_margin))
+
+
+class FoldedGroup(Block):
+    '''
+    Код класса эквивалентных узлов (`Folding`): общие блоки интерфейсов и обработки адресуют
+    очереди, устройства, памяти и SAVEVALUE номером участника, переходы наружу идут через
+    таблицу `TRANSFER` по номеру участника. Для каждого участника остаются входные метки
+    интерфейсов (присваивание `fold_member` и переход в общий блок) и определение памяти.
+    '''
+    def __init__(self, group: Group, data: ModelData, context: GenerationContext, targets: set[str]):
+        super().__init__(data, context)
+        self.group = group
+        self.targets = targets
+        self.nodes: list[NodeData] = [data.nodes[node_id] for node_id in group.members]
+        self.interfaces: list[dict[tuple[str, int], NodeData.Data.Interface]] = [
+            {(interface.direction, interface.idx): interface for interface in node.data.interfaces.values()}
+            for node in self.nodes]
+        self.code_header = f'[Свёрнутая группа {group.name} | {group.node_type}, узлов: {len(group.members)}]'
+
+    def code(self) -> str:
+        header = f'*{self.code_header:=^{self.code_width}}*\n\n'
+        code = self.code_generator().lstrip('\n').rstrip('\n')
+        footer = f'\n\n*{self.code_footer:=^{self.code_width}}*'
+        return f'{header}{code}{footer}'
+
+    def block(self, slot: tuple[str, int]) -> str:
+        return self.group.slot_label(slot, self.group.name)
+
+    def code_generator(self) -> str:
+        return (
+            f'{self.gen_description()}\n\n'
             f'{self.gen_input_data()}\n\n'
-            '{key__to:<{width}} TERMINATE\n'
-            '{indent}GENERATE  ({val__dist}(1,0,1/{key__la_gen}))'
-            '{indent}ASSIGN    {key__cap_data},(V${key__capacity})'
-            '{indent}SPLIT     (P${key__cap_data}/{mtu})'
-            '{indent}ASSIGN    {key__type_data},{val__type_data}'
-            '{indent}TRANSFER  ,{key__in_int}\n\n'
-            '{key__in_ints:<{width}}\n\n')
-        return template.format(
-            width=self.code_margin,
-            indent='\n' + ' ' * (self.code_margin + 1),
-            key__la_gen=f'la_gen_{self.data.id}',
-            val__la_gen=self.data.data.generator.lambda_,
-            val__dist=list(self.data.data.interfaces.values())[0].service.dist,
-            key__cap_data=f'cap_data_SSOP',
-            mtu=self.global_data.model.packet.mtu,
-            key__capacity=self.data.data.generator.capacitySource,
-            key__type_data='type_data',
-            val__type_data=self.data.data.generator.typeData,
-            key__in_int=','.join(self.next_int_name(interface=interface,
-                                                     direction='out')
-                                 for interface in self.data.data.interfaces.values()
-                                 if interface.direction == 'out'),
-            key__in_ints=f'\n'.join(
-                '{key__in_int:<{width}} TERMINATE'.format(
-                    width=self.code_margin,
-                    key__in_int=interface.base_label) 
-                for interface in self.data.data.interfaces.values()
-                if interface.direction == 'in'))
-    
+            f'{self.gen_entries()}\n\n\n'
+            f'{self.gen_interfaces_data(direction='in')}\n\n\n'
+            f'{self.gen_processing_data()}\n\n\n'
+            f'{self.gen_interfaces_data(direction='out')}\n\n'
+            f'{self.gen_jumps()}')
+
+    def gen_description(self) -> str:
+        group = self.group
+        members = ', '.join(f'{member} {node_id}' for member, node_id in enumerate(group.members, start=1))
+        slots = ', '.join(['0 обработка'] + [f'{slot} {direction}_int{idx}'
+                                             for slot, (direction, idx) in enumerate(group.slots, start=1)])
+        return '\n'.join(
+            textwrap.wrap(f'Участники: {members}', width=self.code_width, initial_indent='* ', subsequent_indent='* ')
+            + [f'* Номер объекта: {group.base} + (P$fold_member-1)*{group.stride} + слот',
+               f'* Слоты: {slots}'])
+
+    def gen_input_data(self) -> str:
+        templates = self.context.templates
+        processing = self.nodes[0].data.processing
+        data__proc = templates.interface_input.render(self.group.name, processing.queue, processing.mu)
+        data__int = ''.join(
+            '\n' + templates.interface_input.render(self.block(slot), interface.queue.q, interface.service.mu)
+            for slot, interface in self.interfaces[0].items() if interface.queue.q > 0)
+        data__storage = '\n'.join(
+            templates.fold_storage.render(node_id, self.group.number(member, 0), processing.serviceLines)
+            for member, node_id in enumerate(self.group.members, start=1))
+        return f'{data__proc}{data__int}\n\n{data__storage}'
+
+    def gen_entries(self) -> str:
+        template = self.context.templates.fold_entry
+        return '\n'.join(
+            template.render(interfaces[slot].base_label, member, self.block(slot))
+            for member, interfaces in enumerate(self.interfaces, start=1)
+            for slot in self.group.slots
+            if slot[0] == 'in' or interfaces[slot].base_label in self.targets)
+
+    def gen_interfaces_data(self, direction: Literal['in', 'out']) -> str:
+        template = self.context.templates.fold_interface
+        group = self.group
+        return '\n\n'.join(
+            template.render(
+                self.block(slot),
+                self.block(slot),
+                direction,
+                group.node_type,
+                slot[1],
+                group.number(1, index),
+                group.stride,
+                self.interfaces[0][slot].service.dist,
+                f'processing_{group.name}' if direction == 'in' else f'(to_{self.block(slot)}+P$fold_member-1)')
+            for index, slot in enumerate(group.slots, start=1)
+            if slot[0] == direction)
+
+    def gen_processing_data(self) -> str:
+        templates = self.context.templates
+        group = self.group
+        processing = self.nodes[0].data.processing
+        routes = [(route, f'TEST_{group.name}_{route.outPort}') for route in processing.routingTable]
+        routing = (
+            ''.join('\n' + templates.route_test.render(route.type, route_name) for route, route_name in routes)
+            + '\n\n'
+            + '\n'.join(templates.route_transfer.render(route_name, self.block(('out', route.outPort)))
+                        for route, route_name in routes)
+            + '\n')
+        return templates.fold_processing.render(group.name, group.number(1, 0), group.stride, processing.dist, routing)
+
+    def gen_jumps(self) -> str:
+        templates = self.context.templates
+        destinations = self.context.destinations
+        return '\n\n'.join(
+            '\n'.join(
+                templates.route_transfer.render(f'to_{self.block(slot)}', destinations[interfaces[slot].edgeId])
+                if member == 0 else templates.fold_jump.render(destinations[interfaces[slot].edgeId])
+                for member, interfaces in enumerate(self.interfaces))
+            for slot in self.group.slots if slot[0] == 'out')
 
 
 class Generator(Block):
-    def __init__(self, data: ModelData):
-        super().__init__(data)
+    def __init__(self, data: ModelData, graph: Optional[TopologyGraph] = None):
+        super().__init__(data, GenerationContext(data, graph))
         self.data: ModelData = data
+        self.timings: dict[str, float] = {}
+        self.counts: dict[str, int] = {}
+        fold = data.model.fold
+        scheduled = frozenset(self.context.geometry.links[k][1] for k in self.context.schedules.values())
+        self.folding: Optional[Folding] = Folding(data, fold.min_members, scheduled) if fold is not None else None
+
+    def node_code(self, node_id: str) -> str:
+        '''Код узла; время генерации накапливается по типу узла (`AS`, `SC`, `HAPS`, `ES`, `SSOP`).'''
+        start_time = monotonic()
+        node = Node(node_id, self.data, self.context)
+        code = node.code()
+        node_type = type(node).__name__
+        self.timings[node_type] = self.timings.get(node_type, 0.0) + monotonic() - start_time
+        self.counts[node_type] = self.counts.get(node_type, 0) + 1
+        return code
+
+    def group_code(self, group: Group) -> str:
+        '''
+        Код свёрнутой группы; для отчёта о свёртке считается и размер кода без неё —
+        блок первого участника, умноженный на число участников.
+        '''
+        start_time = monotonic()
+        code = FoldedGroup(group, self.data, self.context, set(self.context.destinations.values())).code()
+        self.timings['fold'] = self.timings.get('fold', 0.0) + monotonic() - start_time
+        self.counts['fold'] = self.counts.get('fold', 0) + len(group.members)
+        unfolded = Node(group.members[0], self.data, self.context).code()
+        self.folding.lines += code.count('\n') + 1
+        self.folding.unfolded_lines += (unfolded.count('\n') + 1) * len(group.members)
+        return code
+
+    def node_blocks(self) -> Iterator[tuple[str, str]]:
+        '''Код узлов в порядке `data.nodes`; свёрнутая группа выдаётся на месте первого участника.'''
+        for node_id in self.data.nodes.keys():
+            if self.folding is None or (found := self.folding.member_of.get(node_id)) is None:
+                yield node_id, self.node_code(node_id)
+            elif found[1] == 1:
+                yield node_id, self.group_code(found[0])
+
+    def blocks(self) -> dict[str, str]:
+        '''Код каждого узла модели в порядке `data.nodes`.'''
+        return dict(self.node_blocks())
+
+    def fold_report(self) -> Optional[GPSSCode.Folding]:
+        return self.folding.report() if self.folding is not None else None
 
     def code(self, add_time: bool = False) -> GPSSCode:
         start_time = monotonic()
+        blocks = self.blocks()
+        generated(self.timings, self.counts)
+        return self.assemble(blocks, start_time=start_time, add_time=add_time)
+
+    def stream(self, add_time: bool = False) -> Iterator[str]:
+        '''
+        Потоковая генерация: настройки модели и код каждого узла выдаются по мере формирования,
+        поэтому программа целиком в памяти не собирается. С `add_time` блок с датой генерации
+        выдаётся первым, как в `code`, а время генерации известно только после последнего узла
+        и дописывается в конце.
+        '''
+        start_time = monotonic()
+        if add_time:
+            yield timing(self.code_width, datetime.now())
+        yield self.head()
+        for k, (_, code) in enumerate(self.node_blocks()):
+            yield ('\n' if k else '') + code
+        generated(self.timings, self.counts)
+        yield self.tail()
+        if add_time:
+            yield duration(monotonic() - start_time)
+
+    def head(self) -> str:
         header_1_text = '[Настройки модели 1]'
         header_1 = f'*{header_1_text:=^{self.code_width}}*\n\n'
         footer_1 = f'\n\n*' + '=' * self.code_width + '*'
-        header_2_text = '[Настройки модели 2]'
-        header_2 = f'*{header_2_text:=^{self.code_width}}*\n'
-        footer_2 = f'\n\n*' + '=' * self.code_width + '*'
-        indent = '\n' + ' ' * (self.code_margin + 1)
-        
         config_1_template = (
             '{var:<{width}} VARIABLE  ({dist}(1,{min_val},{max_val}))')
-        config_2_template = (
-            '{indent}GENERATE  {duration}'
-            '{indent}TERMINATE 1'
-            '{indent}START     1')
-
         config_1 = config_1_template.format(
             width=self.code_margin,
             var='capacity',
             dist=self.data.model.traffic.capacity.dist,
             min_val=self.data.model.traffic.capacity.params.minBytes,
             max_val=self.data.model.traffic.capacity.params.maxBytes)
+        return f'{header_1}{config_1}{footer_1}\n'
+
+    def tail(self) -> str:
+        header_2_text = '[Настройки модели 2]'
+        header_2 = f'*{header_2_text:=^{self.code_width}}*\n'
+        footer_2 = f'\n\n*' + '=' * self.code_width + '*'
+        config_2_template = (
+            '{indent}GENERATE  {duration}'
+            '{indent}TERMINATE 1'
+            '{indent}START     1')
         config_2 = config_2_template.format(
-            indent=indent,
+            indent=self.context.indent,
             duration=self.global_data.model.sim.duration)
-        nodes_code = '\n'.join(
-            Node(node_id, self.data).code()
-            for node_id in self.data.nodes.keys())
+        return f'\n{header_2}{config_2}{footer_2}\n'
+
+    def assemble(self, blocks: dict[str, str], start_time: float, add_time: bool = False) -> GPSSCode:
+        '''Сборка итогового кода из готовых блоков узлов и глобальных настроек модели.'''
+        nodes_code = '\n'.join(blocks.values())
         result = GPSSCode(
-            code=(
-                f'{header_1}{config_1}{footer_1}\n'
-                f'{nodes_code}'
-                f'\n{header_2}{config_2}{footer_2}\n'),
+            code=f'{self.head()}{nodes_code}{self.tail()}',
             gen_time=monotonic() - start_time,
-            gen_date=datetime.now()
+            gen_date=datetime.now(),
+            folding=self.fold_report()
         )
         if add_time:
-            header_0_text = '[Информация о процессе генерации]'
-            header_0 = f'*{header_0_text:=^{self.code_width}}*\n\n'
-            footer_0 = f'\n\n*' + '=' * self.code_width + '*'
-            result.code = (
-                f'{header_0}'
-                f'* Дата генерации кода : {result.gen_date}\n'
-                f'* Время генерации кода: {result.gen_time} сек'
-                f'{footer_0}\n'
-                f'{result.code}')
+            result.code = timing(self.code_width, result.gen_date, result.gen_time) + result.code
         return result
+
+
+def timing(code_width: int, gen_date: datetime, gen_time: Optional[float] = None) -> str:
+    '''
+    Блок комментариев с датой и временем генерации. При потоковой отдаче время ещё неизвестно:
+    блок выдаётся с одной датой, а время дописывается после кода (`duration`).
+    '''
+    header_0_text = '[Информация о процессе генерации]'
+    header_0 = f'*{header_0_text:=^{code_width}}*\n\n'
+    footer_0 = f'\n\n*' + '=' * code_width + '*'
+    gen_time_line = f'\n* Время генерации кода: {gen_time} сек' if gen_time is not None else ''
+    return (
+        f'{header_0}'
+        f'* Дата генерации кода : {gen_date}'
+        f'{gen_time_line}'
+        f'{footer_0}\n')
+
+
+def duration(gen_time: float) -> str:
+    '''Время генерации после кода, отданного потоком.'''
+    return f'\n* Время генерации кода: {gen_time} сек\n'
@@ -0,0 +1,302 @@
+from typing import Optional
+from collections import OrderedDict
+from hashlib import sha256
+from threading import Lock
+from time import monotonic
+
+import numpy as np
+import orjson
+
+from app.core.config import settings
+from app.schemas.gpss_geometry import GeometryReport
+from app.schemas.gpss_model_data import ModelData, NodeData
+
+from .gpss_graph import Diagnostic, TopologyError
+
+
+Geometry = ModelData.model_fields['model'].annotation.Geometry
+
+EARTH_RADIUS_KM = 6371.0
+EARTH_MU = 398600.4418
+EARTH_ROTATION = 7.2921159e-5
+LIGHT_SPEED_KM = 299792.458
+# Классы высот узлов, км над поверхностью (как `ALTITUDE_RANGES` во frontend).
+ALTITUDE_RANGES = {'leo': (150.0, 2000.0), 'meo': (8000.0, 15000.0), 'geo': (36000.0, 36000.0), 'haps': (10.0, 50.0)}
+# Движущиеся классы и наклонение их круговых орбит, градусы; GEO и HAPS неподвижны относительно Земли.
+INCLINATIONS = {'leo': 53.0, 'meo': 55.0}
+# Концы ниже этой высоты — наземные, для них действует угол места.
+GROUND_KM = 100.0
+# Луч между воздушными концами не должен опускаться ниже этой высоты.
+GRAZING_KM = 80.0
+TIME_UNITS = {'s': 1.0, 'sec': 1.0, 'min': 60.0, 'h': 3600.0, 'hour': 3600.0}
+
+# Связь: (edge id, узел-источник, узел-приёмник, метка исходящего интерфейса, (bandwidth, packetSize) или None).
+Link = tuple[str, str, str, str, Optional[tuple[float, float]]]
+
+
+def orbit_class(node: NodeData) -> Optional[str]:
+    '''Класс высоты: тип узла на холсте (`leo`, `meo`, ...) или диапазон, в который попадает `altitude`.'''
+    kind = (node.type or '').lower()
+    if kind in ALTITUDE_RANGES:
+        return kind
+    altitude = node.data.altitude
+    if altitude is None:
+        return None
+    return next((name for name, (low, high) in ALTITUDE_RANGES.items() if low <= altitude <= high), None)
+
+
+def node_altitude(node: NodeData, orbit: Optional[str]) -> float:
+    if node.data.altitude is not None:
+        return node.data.altitude
+    return ALTITUDE_RANGES[orbit][0] if orbit is not None else 0.0
+
+
+def model_links(data: ModelData) -> tuple[list[Link], list[str]]:
+    '''Связи исходящих интерфейсов с координатами обоих концов и связи, пропущенные без координат.'''
+    links, skipped = [], []
+    for node_id, node in data.nodes.items():
+        for interface in node.data.interfaces.values():
+            if interface.direction != 'out' or (edge := data.edges.get(interface.edgeId)) is None:
+                continue
+            channel = edge.data.channel
+            if (target := data.nodes.get(channel.to.nodeId)) is None:
+                continue
+            if None in (node.data.lat, node.data.lon, target.data.lat, target.data.lon):
+                skipped.append(interface.edgeId)
+                continue
+            physics = ((channel.bandwidth, channel.packetSize)
+                       if channel.muPolicy == 'auto_from_physics'
+                       and (channel.bandwidth or 0) > 0 and (channel.packetSize or 0) > 0 else None)
+            links.append((interface.edgeId, node_id, channel.to.nodeId, interface.base_label, physics))
+    return links, skipped
+
+
+def number(value: float) -> str:
+    return f'{value:.6f}'.rstrip('0').rstrip('.')
+
+
+class LinkGeometry:
+    '''
+    Видимость и интенсивность обслуживания всех связей на сетке `steps` шагов. Хранятся только
+    изменения: для связи `k` — номера шагов, с которых меняется видимость или ступень интенсивности,
+    и новые значения, поэтому память растёт с числом изменений, а не с `связи × шаги`.
+    '''
+    def __init__(self, links: list[Link], skipped: list[str], duration: float, steps: int, unit_seconds: float):
+        self.links = links
+        self.skipped = skipped
+        self.duration = duration
+        self.steps = steps
+        self.step = duration / steps
+        self.unit_seconds = unit_seconds
+        self.visibility: list[tuple[np.ndarray, np.ndarray]] = []
+        self.rates: list[Optional[tuple[np.ndarray, np.ndarray]]] = []
+        self.distance = np.zeros((len(links), 2))
+        self.visible = np.zeros(len(links), dtype=np.int64)
+        self.compute_time = 0.0
+
+    def segments(self, changes: tuple[np.ndarray, np.ndarray]) -> list[tuple[float, float, float]]:
+        '''Ступени `(начало, конец, значение)` по изменениям.'''
+        columns, values = changes
+        starts = columns * self.step
+        ends = np.append(starts[1:], self.duration)
+        return list(zip(starts.tolist(), ends.tolist(), values.tolist()))
+
+    def windows(self, k: int) -> list[tuple[float, float]]:
+        return [(start, end) for start, end, visible in self.segments(self.visibility[k]) if visible]
+
+    def rate_steps(self, k: int) -> Optional[list[tuple[float, float]]]:
+        if self.rates[k] is None:
+            return None
+        return [(start, rate) for start, _, rate in self.segments(self.rates[k])]
+
+    def function(self, changes: tuple[np.ndarray, np.ndarray]) -> list[str]:
+        '''Точки дискретной функции GPSS от `AC1`: значение ступени до её конца.'''
+        return [f'{number(end)},{number(value)}' for _, end, value in self.segments(changes)]
+
+
+def compute(data: ModelData, links: list[Link], skipped: list[str], geometry: Geometry) -> LinkGeometry:
+    '''
+    Распространение орбит и геометрия связей блоками шагов по времени. Движущиеся КА идут
+    по круговым орбитам через заданную точку (восходящий участок); их положения, дальности,
+    видимость и интенсивность считаются массивами `узлы × шаги` и `связи × шаги` без циклов по парам.
+    '''
+    start_time = monotonic()
+    unit_seconds = TIME_UNITS.get(str(data.model.time.unit).lower(), 1.0)
+    result = LinkGeometry(links, skipped, float(data.model.sim.duration), geometry.steps, unit_seconds)
+    count = len(links)
+    if not count:
+        return result
+    node_ids = list(dict.fromkeys(node_id for link in links for node_id in link[1:3]))
+    index = {node_id: k for k, node_id in enumerate(node_ids)}
+    nodes = [data.nodes[node_id] for node_id in node_ids]
+    orbits = [orbit_class(node) for node in nodes]
+    altitude = np.array([node_altitude(node, orbit) for node, orbit in zip(nodes, orbits)])
+    radius = EARTH_RADIUS_KM + altitude
+    lat = np.radians(np.array([node.data.lat for node in nodes]) - 90)
+    lon = np.radians(np.array([node.data.lon for node in nodes]) - 180)
+    fixed = radius[:, None] * np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=1)
+    moving = np.array([orbit in INCLINATIONS for orbit in orbits])
+    inclination = np.radians(np.maximum([INCLINATIONS.get(orbit, 0.0) for orbit in orbits], np.degrees(np.abs(lat))))
+    inclination = inclination[moving]
+    u0 = np.arcsin(np.clip(np.sin(lat[moving]) / np.sin(inclination), -1, 1))
+    ascending = lon[moving] - np.arctan2(np.cos(inclination) * np.sin(u0), np.cos(u0))
+    motion = np.sqrt(EARTH_MU / radius[moving] ** 3)
+    ground = altitude < GROUND_KM
+
+    source = np.array([index[link[1]] for link in links])
+    target = np.array([index[link[2]] for link in links])
+    source_ground, target_ground = ground[source], ground[target]
+    space = (~source_ground & ~target_ground)[:, None]
+    source_only = (source_ground & ~target_ground)[:, None]
+    target_only = (~source_ground & target_ground)[:, None]
+    source_radius, target_radius = radius[source][:, None], radius[target][:, None]
+    physical = np.array([link[4] is not None for link in links])
+    rows = np.flatnonzero(physical)
+    transfer = np.array([link[4][1] / link[4][0] for link in links if link[4] is not None])
+    min_elevation = np.sin(np.radians(geometry.min_elevation))
+    grazing = (EARTH_RADIUS_KM + GRAZING_KM) ** 2
+    scale = np.log1p(geometry.tolerance) if geometry.tolerance > 0 else None
+
+    result.distance[:, 0], result.distance[:, 1] = np.inf, -np.inf
+    visibility_events: list[tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+    rate_events: list[tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+    previous_visible: Optional[np.ndarray] = None
+    previous_level: Optional[np.ndarray] = None
+    block = max(1, settings.GEOMETRY_CHUNK_CELLS // max(count, len(nodes)))
+    for first in range(0, geometry.steps, block):
+        columns = np.arange(first, min(first + block, geometry.steps))
+        seconds = columns * result.step * unit_seconds
+        positions = np.repeat(fixed[:, None, :], len(columns), axis=1)
+        if moving.any():
+            u = u0[:, None] + motion[:, None] * seconds
+            node = ascending[:, None] - EARTH_ROTATION * seconds
+            cos_u, sin_u, cos_node, sin_node = np.cos(u), np.sin(u), np.cos(node), np.sin(node)
+            cos_i, sin_i = np.cos(inclination)[:, None], np.sin(inclination)[:, None]
+            positions[moving] = radius[moving][:, None, None] * np.stack(
+                [cos_u * cos_node - sin_u * cos_i * sin_node,
+                 cos_u * sin_node + sin_u * cos_i * cos_node,
+                 sin_u * sin_i], axis=-1)
+        start = positions[source]
+        delta = positions[target] - start
+        dd = np.einsum('ijk,ijk->ij', delta, delta)
+        ad = np.einsum('ijk,ijk->ij', start, delta)
+        distance = np.sqrt(dd)
+        # Ближайшая к центру Земли точка отрезка между воздушными концами.
+        t = np.clip(-ad / np.where(dd > 0, dd, 1), 0, 1)
+        clear = source_radius ** 2 + 2 * t * ad + t * t * dd >= grazing
+        source_elevation = ad >= min_elevation * source_radius * distance
+        target_elevation = -(ad + dd) >= min_elevation * target_radius * distance
+        visible = np.where(space, clear, np.where(source_only, source_elevation,
+                                                  np.where(target_only, target_elevation, True)))
+
+        result.distance[:, 0] = np.minimum(result.distance[:, 0], distance.min(axis=1))
+        result.distance[:, 1] = np.maximum(result.distance[:, 1], distance.max(axis=1))
+        result.visible += visible.sum(axis=1)
+        changed = np.empty_like(visible)
+        changed[:, 0] = True if previous_visible is None else visible[:, 0] != previous_visible
+        changed[:, 1:] = visible[:, 1:] != visible[:, :-1]
+        link, column = np.nonzero(changed)
+        visibility_events.append((link, column + first, visible[link, column]))
+        previous_visible = visible[:, -1]
+
+        if len(rows):
+            rate = unit_seconds / (distance[rows] / LIGHT_SPEED_KM + transfer[:, None])
+            level = np.round(np.log(rate) / scale) if scale is not None else rate
+            # Пока связь не видна, пакеты теряются и ступень интенсивности не меняется.
+            level[~visible[rows]] = np.nan
+            changed = np.empty(level.shape, dtype=bool)
+            changed[:, 0] = True if previous_level is None else level[:, 0] != previous_level
+            changed[:, 1:] = level[:, 1:] != level[:, :-1]
+            changed &= ~np.isnan(level)
+            link, column = np.nonzero(changed)
+            rate_events.append((rows[link], column + first, rate[link, column]))
+            previous_level = level[:, -1]
+
+    result.visibility = split(visibility_events, count)
+    rates = split(rate_events, count) if rate_events else [None] * count
+    result.rates = [changes if physical[k] else None for k, changes in enumerate(rates)]
+    result.compute_time = monotonic() - start_time
+    return result
+
+
+def split(events: list[tuple[np.ndarray, np.ndarray, np.ndarray]], count: int) -> list[tuple[np.ndarray, np.ndarray]]:
+    '''Изменения всех блоков по связям: `(шаги, значения)` в порядке времени.'''
+    links = np.concatenate([link for link, _, _ in events])
+    columns = np.concatenate([column for _, column, _ in events])
+    values = np.concatenate([value for _, _, value in events])
+    order = np.lexsort((columns, links))
+    links, columns, values = links[order], columns[order], values[order]
+    bounds = np.searchsorted(links, np.arange(count + 1))
+    return [(columns[low:high], values[low:high]) for low, high in zip(bounds[:-1], bounds[1:])]
+
+
+class GeometryCache:
+    '''LRU результатов `compute` по ключу входных данных геометрии: координат, связей и настроек.'''
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries: OrderedDict[str, LinkGeometry] = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key: str) -> Optional[LinkGeometry]:
+        with self.lock:
+            result = self.entries.get(key)
+            if result is not None:
+                self.entries.move_to_end(key)
+            return result
+
+    def put(self, key: str, result: LinkGeometry):
+        with self.lock:
+            self.entries[key] = result
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+cache = GeometryCache(max_entries=settings.GEOMETRY_CACHE_SIZE)
+
+
+def geometry_key(data: ModelData, links: list[Link], geometry: Geometry) -> str:
+    '''
+    Ревизия геометрии топологии: правки, не меняющие координаты, связи и физику каналов
+    (очереди, маршрутизация, интенсивности узлов), используют уже рассчитанные расписания.
+    '''
+    node_ids = sorted({node_id for link in links for node_id in link[1:3]})
+    nodes = [(node_id, data.nodes[node_id].type, data.nodes[node_id].data.lat, data.nodes[node_id].data.lon,
+              data.nodes[node_id].data.altitude) for node_id in node_ids]
+    payload = (geometry.model_dump(), data.model.sim.duration, str(data.model.time.unit), nodes, links)
+    return sha256(orjson.dumps(payload)).hexdigest()
+
+
+def link_geometry(data: ModelData) -> LinkGeometry:
+    '''
+    Геометрия связей модели (из кэша, если ревизия геометрии уже считалась); настройки —
+    `model.geometry` или значения по умолчанию. Слишком большая сетка `связи × шаги` — `TopologyError`.
+    '''
+    geometry = data.model.geometry if data.model.geometry is not None else Geometry()
+    links, skipped = model_links(data)
+    if len(links) * geometry.steps > settings.GEOMETRY_MAX_CELLS:
+        raise TopologyError([Diagnostic(
+            severity='error', code='geometry_too_large', loc=['model', 'geometry', 'steps'],
+            message=f'{len(links)} links × {geometry.steps} steps exceed {settings.GEOMETRY_MAX_CELLS} cells.')])
+    key = geometry_key(data, links, geometry)
+    if (result := cache.get(key)) is None:
+        result = compute(data, links, skipped, geometry)
+        cache.put(key, result)
+    return result
+
+
+def report(data: ModelData) -> GeometryReport:
+    result = link_geometry(data)
+    return GeometryReport(
+        duration=result.duration,
+        steps=result.steps,
+        step=result.step,
+        unit_seconds=result.unit_seconds,
+        links=[GeometryReport.Link(
+            edge=edge, source=source, target=target, label=label,
+            distance_min=float(result.distance[k, 0]), distance_max=float(result.distance[k, 1]),
+            visible=float(result.visible[k]) / result.steps,
+            windows=result.windows(k), rates=result.rate_steps(k))
+            for k, (edge, source, target, label, _) in enumerate(result.links)],
+        skipped=result.skipped,
+        compute_time=result.compute_time)
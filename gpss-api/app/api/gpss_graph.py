@@ -0,0 +1,223 @@
+from typing import Any, Optional, Union
+
+from app.schemas.gpss_model_data import ModelData, NodeData
+from app.schemas.gpss_topology import TopologyReport
+
+from .gpss_simulator import routing
+
+
+Diagnostic = TopologyReport.Diagnostic
+Interface = NodeData.Data.Interface
+
+SOURCES = ('as', 'ssop')
+PROCESSING = ('sc', 'haps', 'es')
+NODE_TYPES = frozenset(SOURCES + PROCESSING)
+
+
+class TopologyError(ValueError):
+    '''Ошибки топологии, при которых код не может быть сгенерирован.'''
+    def __init__(self, diagnostics: list[Diagnostic]):
+        super().__init__(diagnostics)
+        self.diagnostics = diagnostics
+
+    def __str__(self) -> str:
+        more = f' (and {len(self.diagnostics) - 1} more)' if len(self.diagnostics) > 1 else ''
+        return f'{self.diagnostics[0].message}{more}'
+
+    def detail(self) -> list[dict[str, Any]]:
+        return [diagnostic.model_dump(exclude_none=True) for diagnostic in self.diagnostics]
+
+
+class TopologyGraph:
+    '''
+    Индекс связности модели, строится одним проходом по узлам и связям: метка интерфейса
+    назначения каждой связи, исходящие интерфейсы узлов по `idx` и таблицы маршрутизации
+    по типу трафика. Тот же проход находит ошибки, при которых генерация прервалась бы
+    на середине (`errors`). Достижимость узлов и петли маршрутизации генерации не нужны
+    и проверяются только в `report`.
+    '''
+    def __init__(self, data: ModelData):
+        self.data = data
+        self.diagnostics: list[Diagnostic] = []
+        self.interfaces = sum(len(node.data.interfaces) for node in data.nodes.values())
+        self.label_width: Optional[int] = max((len(interface.base_label)
+                                               for node in data.nodes.values()
+                                               for interface in node.data.interfaces.values()), default=None)
+        self.destinations: dict[str, str] = {}
+        self.targets: dict[str, Interface] = {}
+        self.out_interfaces: dict[str, dict[int, Interface]] = {}
+        # Узел обработки → (исходящий порт по типу трафика, порт для остальных типов), см. `routing`.
+        self.routes: dict[str, tuple[dict[int, int], Optional[int]]] = {}
+        used: set[str] = set()
+        for node_id, node in data.nodes.items():
+            self._node(node_id, node, used)
+        nodes = data.nodes
+        for edge_id, edge in data.edges.items():
+            # Проход по связям — самый длинный: диагностика вызывается только для проблемных.
+            to = edge.data.channel.to
+            target = nodes.get(to.nodeId)
+            port = target.data.interfaces.get(to.portId) if target is not None else None
+            if port is not None:
+                self.destinations[edge_id] = port.base_label
+                self.targets[edge_id] = port
+            if port is None or port.direction != 'in' or edge_id not in used:
+                self._edge(edge_id, to, target is not None, port, edge_id in used)
+        if self.label_width is None:
+            self.add('error', 'no_interfaces', 'The model has no interfaces.', ['nodes'])
+
+    def add(self, severity: str, code: str, message: str, loc: list[Union[str, int]],
+            node: Optional[str] = None, edge: Optional[str] = None):
+        self.diagnostics.append(Diagnostic(severity=severity, code=code, message=message, loc=loc,
+                                           node=node, edge=edge))
+
+    def _node(self, node_id: str, node: NodeData, used: set[str]):
+        node_data = node.data
+        kind = str(node_data.nodeType).lower()
+        loc = ['nodes', node_id, 'data']
+        if kind not in NODE_TYPES:
+            self.add('error', 'unknown_node_type', f'Node `{node_id}` has unexpected nodeType `{node_data.nodeType}`.',
+                     [*loc, 'nodeType'], node=node_id)
+        edges = self.data.edges
+        outs: dict[int, Interface] = {}
+        for interface_id, interface in node_data.interfaces.items():
+            if interface.direction != 'out':
+                continue
+            if interface.idx in outs:
+                self.add('warning', 'duplicate_port',
+                         f'Node `{node_id}` has several out interfaces with idx {interface.idx}; '
+                         f'routes use `{interface_id}`.',
+                         [*loc, 'interfaces', interface_id, 'idx'], node=node_id)
+            outs[interface.idx] = interface
+            used.add(interface.edgeId)
+            if interface.edgeId not in edges:
+                self.add('error', 'missing_edge',
+                         f'Interface `{interface_id}` of node `{node_id}` refers to unknown edge `{interface.edgeId}`.',
+                         [*loc, 'interfaces', interface_id, 'edgeId'], node=node_id, edge=interface.edgeId)
+        self.out_interfaces[node_id] = outs
+        if kind == 'ssop' and not node_data.interfaces:
+            self.add('error', 'no_interfaces', f'SSOP node `{node_id}` has no interfaces.',
+                     [*loc, 'interfaces'], node=node_id)
+        if (kind == 'ssop' or kind == 'as' and outs) and node_data.generator is None:
+            self.add('error', 'missing_generator', f'Node `{node_id}` sends traffic but has no generator.',
+                     [*loc, 'generator'], node=node_id)
+        if kind not in PROCESSING:
+            return
+        processing = node_data.processing
+        if processing is None:
+            self.add('error', 'missing_processing', f'Node `{node_id}` has no processing section.',
+                     [*loc, 'processing'], node=node_id)
+            return
+        for k, route in enumerate(processing.routingTable):
+            if route.outPort not in outs:
+                self.add('error', 'missing_route_port',
+                         f'Route {k} of node `{node_id}` leads to unknown out port {route.outPort}.',
+                         [*loc, 'processing', 'routingTable', k, 'outPort'], node=node_id)
+        if not processing.routingTable:
+            self.add('warning', 'no_routes', f'Node `{node_id}` has an empty routing table; its traffic is lost.',
+                     [*loc, 'processing', 'routingTable'], node=node_id)
+        # Порты, в которые трафик уводит сгенерированная цепочка `TEST E`, — те же, что у симулятора.
+        self.routes[node_id] = routing(processing.routingTable)
+
+    def _edge(self, edge_id: str, to: Any, found: bool, port: Optional[Interface], used: bool):
+        # Битая связь мешает генерации, только если по ней идёт исходящий интерфейс.
+        severity = 'error' if used else 'warning'
+        loc = ['edges', edge_id, 'data', 'channel', 'to']
+        if not found:
+            self.add(severity, 'missing_node', f'Edge `{edge_id}` leads to unknown node `{to.nodeId}`.',
+                     [*loc, 'nodeId'], edge=edge_id)
+            return
+        if port is None:
+            self.add(severity, 'missing_port', f'Edge `{edge_id}` leads to unknown interface `{to.portId}` '
+                                               f'of node `{to.nodeId}`.',
+                     [*loc, 'portId'], node=to.nodeId, edge=edge_id)
+            return
+        if port.direction != 'in':
+            self.add('warning', 'target_not_input', f'Edge `{edge_id}` leads to out interface `{to.portId}` '
+                                                    f'of node `{to.nodeId}`.',
+                     [*loc, 'portId'], node=to.nodeId, edge=edge_id)
+        if not used:
+            self.add('warning', 'unused_edge', f'No out interface sends traffic over edge `{edge_id}`.',
+                     ['edges', edge_id], edge=edge_id)
+
+    @property
+    def errors(self) -> list[Diagnostic]:
+        return [diagnostic for diagnostic in self.diagnostics if diagnostic.severity == 'error']
+
+    def raise_for_errors(self):
+        if errors := self.errors:
+            raise TopologyError(errors)
+
+    def sources(self) -> dict[int, list[tuple[str, Interface]]]:
+        '''Исходящие интерфейсы генераторов по типу трафика; SSOP передаёт только в первый из них.'''
+        result: dict[int, list[tuple[str, Interface]]] = {}
+        for node_id, node in self.data.nodes.items():
+            kind = str(node.data.nodeType).lower()
+            generator = node.data.generator
+            if kind not in SOURCES or generator is None or generator.lambda_ <= 0:
+                continue
+            outs = [interface for interface in node.data.interfaces.values() if interface.direction == 'out']
+            for interface in outs[:1] if kind == 'ssop' else outs:
+                result.setdefault(generator.typeData, []).append((node_id, interface))
+        return result
+
+    def hop(self, interface: Interface, type_data: int) -> Optional[tuple[str, Interface]]:
+        '''Следующий исходящий интерфейс для трафика типа `type_data`; None — сток, потеря или обрыв.'''
+        port = self.targets.get(interface.edgeId)
+        if port is None:
+            return None
+        node_id = self.data.edges[interface.edgeId].data.channel.to.nodeId
+        if port.direction != 'in':
+            # TRANSFER на метку исходящего интерфейса: трафик уходит дальше по его связи.
+            return node_id, port
+        if node_id not in self.routes:
+            return None
+        routes, default = self.routes[node_id]
+        out = self.out_interfaces[node_id].get(routes.get(type_data, default))
+        return (node_id, out) if out is not None else None
+
+    def flows(self, sources: dict[int, list[tuple[str, Interface]]]) -> tuple[set[str], list[Diagnostic]]:
+        '''
+        Обход маршрутов от генераторов по каждому типу трафика. Из узла трафик одного типа
+        уходит ровно в один порт, поэтому обход по типу линеен: интерфейс, встреченный повторно
+        в текущем пути, замыкает петлю, пройденный ранее — продолжение уже проверенного пути.
+        '''
+        reached: set[str] = set()
+        loops: list[Diagnostic] = []
+        for type_data, emissions in sources.items():
+            done: set[str] = set()
+            for node_id, interface in emissions:
+                reached.add(node_id)
+                path: dict[str, str] = {}
+                step = (node_id, interface)
+                while step is not None:
+                    label = step[1].base_label
+                    if label in path:
+                        cycle = list(path.values())[list(path).index(label):]
+                        loops.append(Diagnostic(
+                            severity='warning', code='routing_loop',
+                            message=f'Traffic of type {type_data} loops through {' -> '.join(cycle)}.',
+                            loc=['nodes', cycle[0], 'data', 'processing', 'routingTable'], node=cycle[0]))
+                        break
+                    if label in done:
+                        break
+                    path[label] = step[0]
+                    if step[1].edgeId in self.targets:
+                        reached.add(self.data.edges[step[1].edgeId].data.channel.to.nodeId)
+                    step = self.hop(step[1], type_data)
+                done.update(path)
+        return reached, loops
+
+    def report(self) -> TopologyReport:
+        sources = self.sources()
+        reached, loops = self.flows(sources)
+        unreachable = [Diagnostic(severity='warning', code='unreachable',
+                                  message=f'No traffic reaches node `{node_id}`.', loc=['nodes', node_id], node=node_id)
+                       for node_id in self.data.nodes.keys() if node_id not in reached]
+        return TopologyReport(
+            valid=not self.errors,
+            nodes=len(self.data.nodes),
+            edges=len(self.data.edges),
+            interfaces=self.interfaces,
+            sources=sum(len(emissions) for emissions in sources.values()),
+            reachable=len(reached),
+            diagnostics=[*self.diagnostics, *loops, *unreachable])
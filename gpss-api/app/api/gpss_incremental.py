@@ -0,0 +1,169 @@
+from typing import Optional
+from collections import OrderedDict
+from hashlib import sha256
+from threading import Lock
+from time import monotonic
+
+from app.core.config import settings
+from app.schemas.gpss_model_data import NODE_GEOMETRY_FIELDS, ModelData, NodeData, EdgeData
+from app.schemas.gpss_revision import GenDelta, GPSSRevision
+
+from .gpss_generator import Generator
+from .gpss_metrics import generated
+
+
+# Вложенный класс глобальных настроек (`ModelData.model`); имя внешнего класса его перекрывает.
+Settings = ModelData.model_fields['model'].annotation
+
+# Всё, от чего зависит текст блока узла: хэш `NodeData`, ширина `code_margin`,
+# `mtu` и метки соседних интерфейсов, в которые ведут исходящие интерфейсы узла.
+Dependencies = tuple[str, int, int, tuple[Optional[str], ...]]
+
+
+class Revision:
+    '''Сохранённый результат генерации: данные модели и готовые блоки узлов с их зависимостями.'''
+    __slots__ = ('id', 'data', 'hashes', 'dependencies', 'blocks')
+
+    def __init__(self, id: str, data: ModelData, hashes: dict[str, str],
+                 dependencies: dict[str, Dependencies], blocks: dict[str, str]):
+        self.id = id
+        self.data = data
+        self.hashes = hashes
+        self.dependencies = dependencies
+        self.blocks = blocks
+
+
+class RevisionStore:
+    '''LRU-хранилище последних ревизий; блоки неизменённых узлов разделяются между ревизиями.'''
+    def __init__(self, max_revisions: int):
+        self.max_revisions = max_revisions
+        self.revisions: OrderedDict[str, Revision] = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, revision_id: str) -> Optional[Revision]:
+        with self.lock:
+            revision = self.revisions.get(revision_id)
+            if revision is not None:
+                self.revisions.move_to_end(revision_id)
+            return revision
+
+    def put(self, revision: Revision):
+        with self.lock:
+            self.revisions[revision.id] = revision
+            self.revisions.move_to_end(revision.id)
+            while len(self.revisions) > self.max_revisions:
+                self.revisions.popitem(last=False)
+
+
+store = RevisionStore(max_revisions=settings.REVISIONS_MAX)
+
+
+def node_hash(node: NodeData, geometry: bool) -> str:
+    '''Хэш узла; координаты и класс высоты учитываются, только если включены расписания связей.'''
+    return sha256(node.model_dump_json(exclude=None if geometry else NODE_GEOMETRY_FIELDS).encode()).hexdigest()
+
+
+def apply(delta: GenDelta, base: Optional[Revision]) -> tuple[ModelData, dict[str, str]]:
+    '''
+    Применение изменения к ревизии `base` (или построение модели с нуля).
+    Валидируются только переданные узлы и связи; возвращает модель и хэши всех узлов.
+    '''
+    if base is None:
+        data = ModelData.model_validate({'model': delta.model, 'nodes': delta.nodes, 'edges': delta.edges})
+        geometry = data.model.geometry is not None
+        return data, {node_id: node_hash(node, geometry) for node_id, node in data.nodes.items()}
+    model = Settings.model_validate(delta.model) if delta.model is not None else base.data.model
+    geometry = model.geometry is not None
+    nodes = dict(base.data.nodes)
+    edges = dict(base.data.edges)
+    hashes = dict(base.hashes)
+    for node_id in delta.remove_nodes:
+        nodes.pop(node_id, None)
+        hashes.pop(node_id, None)
+    for edge_id in delta.remove_edges:
+        edges.pop(edge_id, None)
+    for raw in delta.nodes:
+        node = NodeData.model_validate(raw)
+        nodes[node.id] = node
+        hashes[node.id] = node_hash(node, geometry)
+    for raw in delta.edges:
+        edge = EdgeData.model_validate(raw)
+        edges[edge.data.channel.id] = edge
+    if geometry != (base.data.model.geometry is not None):
+        hashes = {node_id: node_hash(node, geometry) for node_id, node in nodes.items()}
+    return ModelData.model_construct(model=model, nodes=nodes, edges=edges), hashes
+
+
+class IncrementalGenerator(Generator):
+    '''
+    Генерация с повторным использованием блоков узлов из базовой ревизии.
+    Узел перегенерируется, только если изменились его зависимости; смена `code_margin`
+    затрагивает все узлы, поэтому в этом случае перегенерируется вся модель.
+    '''
+    def __init__(self, data: ModelData, hashes: dict[str, str], base: Optional[Revision] = None):
+        super().__init__(data)
+        self.hashes = hashes
+        self.base = base
+        self.dependencies: dict[str, Dependencies] = {}
+        self.rendered = 0
+        self.reused = 0
+
+    def neighbours(self, node: NodeData) -> tuple[Optional[str], ...]:
+        return tuple(self.context.destinations.get(interface.edgeId)
+                     for interface in node.data.interfaces.values()
+                     if interface.direction == 'out')
+
+    def blocks(self) -> dict[str, str]:
+        blocks = {}
+        for node_id, node in self.data.nodes.items():
+            dependencies = (self.hashes[node_id], self.code_margin,
+                            self.data.model.packet.mtu, self.neighbours(node))
+            self.dependencies[node_id] = dependencies
+        if self.folding is not None or self.context.geometry is not None:
+            # Код группы зависит от всех её участников, расписание связи — от положения других узлов:
+            # в этих режимах модель генерируется целиком (расписания берутся из кэша геометрии).
+            self.rendered = len(self.dependencies)
+            return super().blocks()
+        # Блоки свёрнутой базовой ревизии — код групп, а не узлов; у базовой с расписаниями — другие шаблоны.
+        base = (self.base if self.base is not None and self.base.data.model.fold is None
+                and self.base.data.model.geometry is None else None)
+        for node_id, dependencies in self.dependencies.items():
+            if base is not None and base.dependencies.get(node_id) == dependencies:
+                blocks[node_id] = base.blocks[node_id]
+                self.reused += 1
+            else:
+                blocks[node_id] = self.node_code(node_id)
+                self.rendered += 1
+        return blocks
+
+    def revision(self) -> tuple[Revision, GPSSRevision]:
+        start_time = monotonic()
+        blocks = self.blocks()
+        generated(self.timings, self.counts)
+        code = self.assemble(blocks, start_time=start_time)
+        digest = sha256(self.data.model.model_dump_json().encode())
+        for node_id, dependencies in self.dependencies.items():
+            digest.update(repr((node_id, dependencies)).encode())
+        if self.data.model.geometry is not None:
+            # Расписания связей зависят и от физики каналов, которой нет в зависимостях узлов.
+            for edge_id, edge in self.data.edges.items():
+                digest.update(repr((edge_id, edge.model_dump_json())).encode())
+        revision = Revision(id=digest.hexdigest(), data=self.data, hashes=self.hashes,
+                            dependencies=self.dependencies, blocks=blocks)
+        return revision, GPSSRevision(
+            **code.model_dump(),
+            revision=revision.id,
+            base=self.base.id if self.base is not None else None,
+            rendered=self.rendered,
+            reused=self.reused)
+
+
+def generate(delta: GenDelta) -> GPSSRevision:
+    '''Генерация ревизии по изменению; неизвестная базовая ревизия — `LookupError`.'''
+    base = None
+    if delta.base is not None and (base := store.get(delta.base)) is None:
+        raise LookupError(f'Revision `{delta.base}` is not available.')
+    data, hashes = apply(delta, base)
+    revision, result = IncrementalGenerator(data=data, hashes=hashes, base=base).revision()
+    store.put(revision)
+    return result
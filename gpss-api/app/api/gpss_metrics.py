@@ -0,0 +1,229 @@
+from typing import Any, Callable, Iterator, Optional
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from time import monotonic
+
+
+SECONDS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BYTES = tuple(float(4 ** power) for power in range(5, 15))
+COUNTS = (10.0, 50.0, 100.0, 500.0, 1000.0, 5000.0, 10000.0, 50000.0)
+
+def number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+Observations = list[tuple[str, tuple[str, ...], float]]
+
+# Наблюдения, сделанные в процессе пула, собираются в список и применяются в основном процессе.
+_collected: ContextVar[Optional[Observations]] = ContextVar('collected', default=None)
+
+
+class Metric:
+    kind = ''
+
+    def __init__(self, registry: 'Registry', name: str, description: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.lock = registry.lock
+        registry.metrics[name] = self
+
+    def record(self, value: float, **labels: str):
+        key = tuple(str(labels[label]) for label in self.labels)
+        if (collected := _collected.get()) is not None:
+            collected.append((self.name, key, value))
+        else:
+            self.apply(key, value)
+
+    def apply(self, key: tuple[str, ...], value: float):
+        raise NotImplementedError
+
+    def label(self, key: tuple[str, ...], **extra: str) -> str:
+        pairs = [*zip(self.labels, key), *extra.items()]
+        if not pairs:
+            return ''
+        escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+        return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def exposition(self) -> Iterator[str]:
+        yield f'# HELP {self.name} {self.description}'
+        yield f'# TYPE {self.name} {self.kind}'
+        with self.lock:
+            yield from self.samples()
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, value: float = 1.0, **labels: str):
+        self.record(value, **labels)
+
+    def apply(self, key: tuple[str, ...], value: float):
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + value
+
+    def samples(self) -> Iterator[str]:
+        for key, value in self.values.items():
+            yield f'{self.name}{self.label(key)} {number(value)}'
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, *args, buckets: tuple[float, ...] = SECONDS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = buckets
+        # Счётчики по корзинам (не накопительные), сумма и число наблюдений.
+        self.values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: str):
+        self.record(value, **labels)
+
+    def apply(self, key: tuple[str, ...], value: float):
+        with self.lock:
+            counts, total = self.values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[next((k for k, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))] += 1
+            total[0] += value
+
+    def samples(self) -> Iterator[str]:
+        for key, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip((*map(number, self.buckets), '+Inf'), counts):
+                cumulative += count
+                yield f'{self.name}_bucket{self.label(key, le=bound)} {cumulative}'
+            yield f'{self.name}_sum{self.label(key)} {number(total[0])}'
+            yield f'{self.name}_count{self.label(key)} {cumulative}'
+
+
+class Registry:
+    '''
+    Метрики в текстовом формате Prometheus (без внешних зависимостей).
+    Внутри `collecting()` наблюдения не применяются, а накапливаются в списке: так их можно
+    вернуть из процесса пула вместе с результатом и применить через `merge`.
+    '''
+    def __init__(self):
+        self.metrics: dict[str, Metric] = {}
+        self.lock = Lock()
+
+    def counter(self, name: str, description: str, labels: tuple[str, ...] = ()) -> Counter:
+        return Counter(self, name, description, labels)
+
+    def histogram(self, name: str, description: str, labels: tuple[str, ...] = (),
+                  buckets: tuple[float, ...] = SECONDS) -> Histogram:
+        return Histogram(self, name, description, labels, buckets=buckets)
+
+    def merge(self, observations: Observations):
+        for name, key, value in observations:
+            self.metrics[name].record(value, **dict(zip(self.metrics[name].labels, key)))
+
+    def exposition(self, gauges: Optional[dict[str, tuple[str, dict[str, Any]]]] = None) -> str:
+        lines = [line for metric in self.metrics.values() for line in metric.exposition()]
+        for prefix, (description, values) in (gauges or {}).items():
+            for name, value in values.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines += [f'# HELP {prefix}_{name} {description}: {name}', f'# TYPE {prefix}_{name} gauge',
+                              f'{prefix}_{name} {number(value)}']
+        return '\n'.join(lines) + '\n'
+
+
+@contextmanager
+def collecting() -> Iterator[Observations]:
+    observations: Observations = []
+    token = _collected.set(observations)
+    try:
+        yield observations
+    finally:
+        _collected.reset(token)
+
+
+def collected(function: Callable[..., Any], *args) -> tuple[Any, Observations]:
+    '''Вызов `function(*args)` в процессе пула: результат возвращается вместе с наблюдениями для `merge`.'''
+    with collecting() as observations:
+        return function(*args), observations
+
+
+registry = Registry()
+
+request_seconds = registry.histogram(
+    'gpss_request_seconds', 'Request handling time until the response starts',
+    ('method', 'route', 'status'))
+validate_seconds = registry.histogram(
+    'gpss_validate_seconds', 'Request body parsing and ModelData validation time')
+request_bytes = registry.histogram(
+    'gpss_request_bytes', 'Size of ModelData request bodies', buckets=BYTES)
+model_size = registry.histogram(
+    'gpss_model_size', 'Model size by item kind (nodes, interfaces, edges)', ('item',), buckets=COUNTS)
+generate_seconds = registry.histogram(
+    'gpss_generate_seconds', 'Code generation time per model, split by node type', ('node_type',))
+generated_nodes = registry.counter(
+    'gpss_generated_nodes_total', 'Generated node blocks by node type', ('node_type',))
+encode_seconds = registry.histogram(
+    'gpss_encode_seconds', 'Output encoding (JSON, text encoding, compression) time per response', ('format',))
+output_bytes = registry.histogram(
+    'gpss_output_bytes', 'Response payload size by output format', ('format',), buckets=BYTES)
+compression_input = registry.counter(
+    'gpss_compression_input_bytes_total', 'Response bytes before compression', ('encoding',))
+compression_output = registry.counter(
+    'gpss_compression_output_bytes_total', 'Response bytes after compression', ('encoding',))
+compression_saved = registry.counter(
+    'gpss_compression_saved_bytes_total', 'Response bytes saved by compression', ('encoding',))
+errors = registry.counter(
+    'gpss_errors_total', 'Failed models by error type', ('type',))
+
+
+class RequestMetrics:
+    '''
+    ASGI-middleware: время обработки запроса до начала ответа (`http.response.start`).
+    Путь берётся из шаблона маршрута, а не из URL, чтобы число рядов метрики не росло.
+    '''
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        start_time = monotonic()
+
+        async def timed_send(message):
+            if message['type'] == 'http.response.start':
+                route = scope.get('route')
+                request_seconds.observe(monotonic() - start_time, method=scope['method'],
+                                        route=route.path if route is not None else 'unmatched',
+                                        status=message['status'])
+            await send(message)
+
+        await self.app(scope, receive, timed_send)
+
+
+def validated(data: Any, body_bytes: int, seconds: float):
+    '''Наблюдения по проверенной `ModelData`: время, размер тела и модели.'''
+    validate_seconds.observe(seconds)
+    request_bytes.observe(body_bytes)
+    model_size.observe(len(data.nodes), item='nodes')
+    model_size.observe(sum(len(node.data.interfaces) for node in data.nodes.values()), item='interfaces')
+    model_size.observe(len(data.edges), item='edges')
+
+
+def generated(timings: dict[str, float], counts: dict[str, int]):
+    for node_type, seconds in timings.items():
+        generate_seconds.observe(seconds, node_type=node_type)
+        generated_nodes.inc(counts[node_type], node_type=node_type)
+
+
+def compressed(encoding: str, size: int, compressed_size: int):
+    compression_input.inc(size, encoding=encoding)
+    compression_output.inc(compressed_size, encoding=encoding)
+    compression_saved.inc(size - compressed_size, encoding=encoding)
+
+
+def failed(error: BaseException):
+    name = type(error).__name__
+    errors.inc(type='ValidationError' if name == 'RequestValidationError' else name)
@@ -0,0 +1,73 @@
+from typing import Any, Callable, Literal, Optional
+from io import StringIO
+from time import monotonic
+import cProfile
+import pstats
+
+from .gpss_cache import validate
+from .gpss_generator import Generator
+from .gpss_metrics import collecting
+from .gpss_stream import chunked, encode
+
+
+def profile(body: bytes, profiler: Literal['cprofile', 'pyinstrument'], sort: str, limit: int,
+            encoding: str, compression: Optional[str]) -> dict[str, Any]:
+    '''
+    Профилирование одной генерации без кэша (исполняется в пуле генерации): валидация,
+    генерация кода и кодирование ответа. Наблюдения метрик этого запуска отбрасываются,
+    так как время под профилировщиком завышено.
+    '''
+    phases: dict[str, float] = {}
+
+    def run() -> tuple[Any, Generator, int]:
+        start_time = monotonic()
+        data = validate(body)
+        phases['validate'] = monotonic() - start_time
+        start_time = monotonic()
+        generator = Generator(data=data)
+        code = generator.code()
+        phases['generate'] = monotonic() - start_time
+        start_time = monotonic()
+        size = sum(len(chunk) for chunk in encode(chunked(code.code), encoding=encoding, compression=compression))
+        phases['encode'] = monotonic() - start_time
+        return data, generator, size
+
+    with collecting():
+        if profiler == 'pyinstrument':
+            (data, generator, size), report = pyinstrument_report(run)
+        else:
+            (data, generator, size), report = cprofile_report(run, sort, limit)
+    return {
+        'profiler': profiler,
+        'phases': phases,
+        'model': {
+            'nodes': len(data.nodes),
+            'interfaces': sum(len(node.data.interfaces) for node in data.nodes.values()),
+            'edges': len(data.edges),
+        },
+        'node_types': {node_type: {'count': generator.counts[node_type], 'seconds': seconds}
+                       for node_type, seconds in generator.timings.items()},
+        'output_bytes': size,
+        'report': report,
+    }
+
+
+def cprofile_report(run: Callable[[], Any], sort: str, limit: int) -> tuple[Any, str]:
+    profiler = cProfile.Profile()
+    result = profiler.runcall(run)
+    report = StringIO()
+    pstats.Stats(profiler, stream=report).strip_dirs().sort_stats(sort).print_stats(limit)
+    return result, report.getvalue()
+
+
+def pyinstrument_report(run: Callable[[], Any]) -> tuple[Any, str]:
+    # Необязательная зависимость: наличие проверяется до отправки задачи в пул.
+    from pyinstrument import Profiler
+
+    profiler = Profiler()
+    profiler.start()
+    try:
+        result = run()
+    finally:
+        profiler.stop()
+    return result, profiler.output_text(unicode=True, color=False)
@@ -0,0 +1,173 @@
+from typing import Any
+from copy import deepcopy
+from functools import lru_cache
+from math import atan, cos, pi, sin, sqrt
+from time import monotonic
+import asyncio
+import os
+
+import numpy as np
+import orjson
+
+from app.core.config import settings
+from app.schemas.gpss_model_data import ModelData
+from app.schemas.gpss_replication import ReplicationRequest, ReplicationResult
+from app.schemas.gpss_simulation import SimulationResult
+
+from .gpss_cache import parse
+from .gpss_simulator import SimModel, Simulator
+from .gpss_sweep import assign, executor
+from .gpss_vector_simulator import VectorSimulator
+
+
+TOTALS = ('generated', 'delivered', 'lost', 'loss_rate')
+Interval = ReplicationResult.Interval
+
+
+@lru_cache(maxsize=1024)
+def student_quantile(confidence: float, df: int) -> float:
+    '''
+    Двусторонний квантиль распределения Стьюдента: `P(|T| <= t) = confidence`.
+    Для целого числа степеней свободы функция распределения выражается конечной суммой
+    (Abramowitz, Stegun, 26.7.3–26.7.4), квантиль находится бисекцией.
+    '''
+    def probability(t: float) -> float:
+        theta = atan(t / sqrt(df))
+        c2 = cos(theta) ** 2
+        if df % 2:
+            if df == 1:
+                return 2 * theta / pi
+            term = total = cos(theta)
+            for k in range(3, df - 1, 2):
+                term *= c2 * (k - 1) / k
+                total += term
+            return 2 / pi * (theta + sin(theta) * total)
+        term = total = 1.0
+        for k in range(2, df - 1, 2):
+            term *= c2 * (k - 1) / k
+            total += term
+        return sin(theta) * total
+
+    low, high = 0.0, 1.0
+    while probability(high) < confidence:
+        low, high = high, high * 2
+    for _ in range(100):
+        middle = (low + high) / 2
+        low, high = (middle, high) if probability(middle) < confidence else (low, middle)
+    return (low + high) / 2
+
+
+def names(model: SimModel) -> set[str]:
+    return {*TOTALS, *(station.loss_name for station in model.stations),
+            *(station.queue_name for station in model.stations)}
+
+
+def values(result: SimulationResult, metrics: list[str]) -> list[float]:
+    '''Значения метрик прогона: итоги, SAVEVALUE `loss_*` и среднее время в очередях `queue_*`.'''
+    delays = {queue.name: queue.avg_time for queue in result.queues}
+    return [float(getattr(result, metric)) if metric in TOTALS
+            else float(result.savevalues[metric]) if metric in result.savevalues
+            else delays[metric]
+            for metric in metrics]
+
+
+def prepare(request: ReplicationRequest) -> tuple[int, tuple[bytes, ...]]:
+    '''
+    Проверка исходной модели, варианта и метрик до запуска прогонов.
+    Возвращает базовое зерно и тела моделей для передачи в процессы пула.
+    '''
+    payloads = [request.base]
+    if request.variant is not None:
+        payload = deepcopy(request.base)
+        for path, value in request.variant.items():
+            if not assign(payload, path.split('.'), value):
+                raise ValueError(f'Path `{path}` does not match any field of the model.')
+        payloads.append(payload)
+    seed = request.seed
+    for payload in payloads:
+        data = ModelData.model_validate(payload)
+        seed = data.model.rng.seed if seed is None else seed
+        if unknown := [metric for metric in request.metrics if metric not in names(SimModel(data))]:
+            raise ValueError(f'Unknown metrics: {', '.join(unknown)}.')
+    return seed, tuple(orjson.dumps(payload) for payload in payloads)
+
+
+@lru_cache(maxsize=2)
+def model(body: bytes) -> ModelData:
+    '''Модель, проверенная в процессе пула один раз на все его прогоны.'''
+    return parse(body)
+
+
+def replicate(bodies: tuple[bytes, ...], seed: int, replication: int, simulator: str,
+              metrics: list[str]) -> list[list[float]]:
+    '''Прогон `replication` исходной модели и варианта на общих случайных числах (исполняется в процессе пула).'''
+    simulate = Simulator if simulator == 'event' else VectorSimulator
+    return [values(simulate(data=model(body), seed=seed, replication=replication).run(), metrics)
+            for body in bodies]
+
+
+def interval(metric: str, samples: np.ndarray, t: float) -> Interval:
+    mean = float(samples.mean())
+    std = float(samples.std(ddof=1))
+    half_width = t * std / sqrt(len(samples))
+    return Interval(metric=metric, mean=mean, std=std, half_width=half_width,
+                    low=mean - half_width, high=mean + half_width)
+
+
+def summary(request: ReplicationRequest, samples: list[list[list[float]]]) -> dict[str, Any]:
+    array = np.array(samples)
+    t = student_quantile(request.confidence, len(samples) - 1)
+    result: dict[str, Any] = {
+        'base': [interval(metric, array[:, 0, k], t) for k, metric in enumerate(request.metrics)]}
+    if array.shape[1] > 1:
+        result['variant'] = [interval(metric, array[:, 1, k], t) for k, metric in enumerate(request.metrics)]
+        result['difference'] = [interval(metric, array[:, 1, k] - array[:, 0, k], t)
+                                for k, metric in enumerate(request.metrics)]
+    return result
+
+
+def precise(request: ReplicationRequest, intervals: list[Interval]) -> bool:
+    if request.half_width is None and request.relative is None:
+        return False
+    return all(request.half_width is not None and item.half_width <= request.half_width
+               or request.relative is not None and item.half_width <= request.relative * abs(item.mean)
+               for item in intervals)
+
+
+async def run(request: ReplicationRequest, seed: int, bodies: tuple[bytes, ...]) -> ReplicationResult:
+    '''
+    Независимые прогоны в пуле процессов `/sweep` до достижения точности или `max_replications`.
+    Точность проверяется по мере готовности прогонов, но только для непрерывного начала 0..n−1:
+    число прогонов и результат не зависят от порядка их завершения. При сравнении вариантов
+    точность требуется от интервалов разностей, которые общие случайные числа и сужают.
+    '''
+    start_time = monotonic()
+    loop = asyncio.get_running_loop()
+    pool = executor()
+    window = 2 * (settings.SWEEP_WORKERS or os.cpu_count() or 1)
+    pending: dict[asyncio.Future, int] = {}
+    finished: dict[int, list[list[float]]] = {}
+    samples: list[list[list[float]]] = []
+    intervals: dict[str, Any] = {}
+    submitted = 0
+    converged = False
+    try:
+        while not converged and len(samples) < request.max_replications:
+            while submitted < request.max_replications and len(pending) < window:
+                future = loop.run_in_executor(pool, replicate, bodies, seed, submitted,
+                                              request.simulator, request.metrics)
+                pending[future] = submitted
+                submitted += 1
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                finished[pending.pop(future)] = future.result()
+            while not converged and len(samples) in finished:
+                samples.append(finished.pop(len(samples)))
+                if len(samples) >= request.min_replications:
+                    intervals = summary(request, samples)
+                    converged = precise(request, intervals.get('difference', intervals['base']))
+    finally:
+        for future in pending:
+            future.cancel()
+    return ReplicationResult(seed=seed, replications=len(samples), converged=converged,
+                             confidence=request.confidence, sim_time=monotonic() - start_time, **intervals)
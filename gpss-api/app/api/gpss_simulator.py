@@ -0,0 +1,339 @@
+from typing import Callable, Optional
+from collections import deque
+from hashlib import sha256
+from heapq import heappush, heappop
+from random import Random
+from time import monotonic
+
+from app.schemas.gpss_model_data import ModelData, NodeData
+from app.schemas.gpss_simulation import SimulationResult
+
+
+SINK = -1   # TERMINATE: входной интерфейс AS/SSOP
+LOSS = -2   # выход из блока без подходящей ветви маршрутизации (попадание в SAVEVALUE loss_*)
+
+# Библиотечные функции GPSS, вызываемые в сгенерированном коде как `{dist}(1,a,b)`.
+# Номер генератора RN отбрасывается, остальные аргументы передаются как есть.
+DISTRIBUTIONS: dict[str, Callable[[Random, float, float], float]] = {
+    'exponential': lambda rng, locate, scale: locate + rng.expovariate(1 / scale),
+    'uniform': lambda rng, low, high: rng.uniform(low, high),
+    'duniform': lambda rng, low, high: rng.randint(int(low), int(high)),
+}
+
+
+def stream_seed(seed: int, replication: int, label: str) -> int:
+    '''
+    Зерно отдельного потока случайных чисел прогона `replication`. Поток привязан к метке
+    станции или источника, а не к её номеру: в вариантах одной модели совпадающие станции
+    получают одинаковые числа (общие случайные числа), даже если другие станции добавлены или удалены.
+    '''
+    return int.from_bytes(sha256(f'{seed}/{replication}/{label}'.encode()).digest()[:8], 'little')
+
+
+def routing(table: list[NodeData.Data.Processing.Route]) -> tuple[dict[int, int], Optional[int]]:
+    '''
+    Маршрутизация, которую исполняет сгенерированная цепочка `TEST E P$type_data,t_k,TEST_{id}_{port_k}`:
+    несовпавший `TEST E` переходит на метку своей строки, совпавший — к следующему `TEST E`,
+    а после последнего управление проваливается на первую метку `TEST_{id}_*`. Поэтому трафик
+    уходит в порт первой строки с другим типом, а если таких нет — в порт первой строки;
+    от порта по умолчанию отличается только тип первой строки.
+    Возвращает порты по типу и порт по умолчанию; пустая таблица — `({}, None)`, трафик теряется.
+    '''
+    if not table:
+        return {}, None
+    first = table[0]
+    other = next((route.outPort for route in table if route.type != first.type), first.outPort)
+    return {first.type: other}, first.outPort
+
+
+def distribution(name: str) -> Callable[[Random, float, float], float]:
+    try:
+        return DISTRIBUTIONS[str(name).lower()]
+    except KeyError:
+        raise ValueError(f'Unsupported distribution `{name}`.') from None
+
+
+class Station:
+    '''
+    Связка QUEUE + FACILITY (интерфейс, SEIZE/RELEASE) или QUEUE + STORAGE
+    (обработка, ENTER/LEAVE) с проверкой `TEST L` на переполнение буфера.
+    '''
+    __slots__ = ('label', 'queue_name', 'service_name', 'loss_name', 'node_id', 'storage',
+                 'capacity', 'limit', 'mu', 'dist', 'dist_name', 'routes', 'default',
+                 'busy', 'waiting', 'current', 'last', 'q_area', 'busy_area', 'q_max',
+                 'entries', 'zero_entries', 'seizes', 'losses')
+
+    def __init__(self, label: str, name: str, node_id: str, storage: bool,
+                 capacity: int, limit: int, mu: float, dist: str):
+        if mu <= 0:
+            raise ValueError(f'Service rate of `{label}` must be positive.')
+        self.label = label
+        self.queue_name = f'queue_{name}'
+        self.service_name = f'service_{name}'
+        self.loss_name = f'loss_{name}'
+        self.node_id = node_id
+        self.storage = storage
+        self.capacity = capacity
+        # `q <= 0` в генераторе не порождает EQU для буфера, поэтому считаем его неограниченным.
+        self.limit = limit if limit > 0 else float('inf')
+        self.mu = mu
+        self.dist = distribution(dist)
+        self.dist_name = str(dist).lower()
+        self.routes: dict[int, int] = {}
+        self.default: int = SINK
+        self.reset()
+
+    def reset(self):
+        self.busy = 0
+        self.waiting: deque[tuple[float, int]] = deque()
+        self.current = 0
+        self.last = 0.0
+        self.q_area = 0.0
+        self.busy_area = 0.0
+        self.q_max = 0
+        self.entries = 0
+        self.zero_entries = 0
+        self.seizes = 0
+        self.losses = 0
+
+    def route(self, type_data: int) -> int:
+        return self.routes.get(type_data, self.default)
+
+    def advance(self, now: float):
+        span = now - self.last
+        self.q_area += len(self.waiting) * span
+        self.busy_area += self.busy * span
+        self.last = now
+
+
+class Source:
+    '''`GENERATE` → `ASSIGN cap_data` → `SPLIT` → `ASSIGN type_data` → `TRANSFER`.'''
+    __slots__ = ('name', 'label', 'node_id', 'lambda_', 'dist', 'dist_name', 'type_data', 'target')
+
+    def __init__(self, node_id: str, label: str, lambda_: float, dist: str, type_data: int, target: int):
+        self.name = f'la_gen_{node_id}'
+        # У AS по источнику на каждый исходящий интерфейс, поэтому поток именуется меткой интерфейса.
+        self.label = label
+        self.node_id = node_id
+        self.lambda_ = lambda_
+        self.dist = distribution(dist)
+        self.dist_name = str(dist).lower()
+        self.type_data = type_data
+        self.target = target
+
+
+class SimModel:
+    '''
+    Скомпилированное представление `ModelData`: станции обслуживания, источники
+    и глобальные параметры в той же структуре, что описывает `gpss_generator.py`.
+    '''
+    def __init__(self, data: ModelData):
+        self.data = data
+        self.duration: float = data.model.sim.duration
+        self.mtu: int = data.model.packet.mtu
+        capacity = data.model.traffic.capacity
+        self.capacity_dist = distribution(capacity.dist)
+        self.capacity_dist_name = str(capacity.dist).lower()
+        self.capacity_params = (capacity.params.minBytes, capacity.params.maxBytes)
+        self.stations: list[Station] = []
+        self.sources: list[Source] = []
+        self.index: dict[str, int] = {}
+        self._compile()
+
+    def _add(self, station: Station) -> int:
+        self.index[station.label] = len(self.stations)
+        self.stations.append(station)
+        return self.index[station.label]
+
+    def _target(self, label: str) -> int:
+        return self.index.get(label, SINK)
+
+    def _next_label(self, edge_id: str) -> str:
+        try:
+            to = self.data.edges[edge_id].data.channel.to
+            return self.data.nodes[to.nodeId].data.interfaces[to.portId].base_label
+        except KeyError:
+            raise ValueError(f'Edge `{edge_id}` does not lead to a known interface.') from None
+
+    def _compile(self):
+        links: list[tuple[int, str]] = []
+        for node in self.data.nodes.values():
+            processing = node.data.processing
+            if str(node.data.nodeType).lower() in ('as', 'ssop') or processing is None:
+                continue
+            proc_idx = self._add(Station(
+                label=f'processing_{node.id}', name=node.id, node_id=node.id, storage=True,
+                capacity=processing.serviceLines, limit=processing.queue,
+                mu=processing.mu, dist=processing.dist))
+            out_ports: dict[int, int] = {}
+            for interface in node.data.interfaces.values():
+                idx = self._add(Station(
+                    label=interface.base_label, name=interface.base_label,
+                    node_id=node.id, storage=False, capacity=1, limit=interface.queue.q,
+                    mu=interface.service.mu, dist=interface.service.dist))
+                if interface.direction == 'in':
+                    self.stations[idx].default = proc_idx
+                else:
+                    out_ports[interface.idx] = idx
+                    links.append((idx, self._next_label(interface.edgeId)))
+            proc = self.stations[proc_idx]
+            for route in processing.routingTable:
+                if route.outPort not in out_ports:
+                    raise ValueError(f'Route to unknown out port {route.outPort} in node `{node.id}`.')
+            routes, default = routing(processing.routingTable)
+            proc.routes = {type_data: out_ports[port] for type_data, port in routes.items()}
+            proc.default = out_ports[default] if default is not None else LOSS
+        for idx, label in links:
+            self.stations[idx].default = self._target(label)
+        for node in self.data.nodes.values():
+            node_type = str(node.data.nodeType).lower()
+            generator = node.data.generator
+            if node_type not in ('as', 'ssop') or generator is None or generator.lambda_ <= 0:
+                continue
+            outs = [interface for interface in node.data.interfaces.values() if interface.direction == 'out']
+            if node_type == 'ssop':
+                # `TRANSFER  ,a,b` без режима — безусловный переход на первую метку.
+                outs = outs[:1]
+            for interface in outs:
+                dist = (interface if node_type == 'as' else next(iter(node.data.interfaces.values()))).service.dist
+                self.sources.append(Source(
+                    node_id=node.id, label=interface.base_label, lambda_=generator.lambda_, dist=dist,
+                    type_data=generator.typeData,
+                    target=self._target(self._next_label(interface.edgeId))))
+
+    def packets(self, rng: Random) -> int:
+        '''`SPLIT (P$cap_data/mtu)`: родительский транзакт плюс порождённые копии.'''
+        return int(self.capacity_dist(rng, *self.capacity_params) / self.mtu) + 1
+
+    def report(self, seed: int, generated: int, delivered: int, lost: int,
+               sim_time: Optional[float] = None) -> SimulationResult:
+        '''Сборка отчёта в терминах стандартного отчёта GPSS по накопленной статистике станций.'''
+        queues, facilities, storages = [], [], []
+        duration = self.duration
+        for station in self.stations:
+            queues.append(SimulationResult.Queue(
+                name=station.queue_name,
+                max=station.q_max,
+                entries=station.entries,
+                zero_entries=station.zero_entries,
+                current=station.current,
+                avg_content=station.q_area / duration if duration else 0.0,
+                avg_time=station.q_area / station.entries if station.entries else 0.0,
+                losses=station.losses))
+            (storages if station.storage else facilities).append(
+                SimulationResult.Facility(
+                    name=station.service_name,
+                    capacity=station.capacity,
+                    entries=station.seizes,
+                    utilization=station.busy_area / (station.capacity * duration) if duration else 0.0,
+                    avg_content=station.busy_area / duration if duration else 0.0,
+                    avg_time=station.busy_area / station.seizes if station.seizes else 0.0))
+        return SimulationResult(
+            duration=duration,
+            seed=seed,
+            generated=generated,
+            delivered=delivered,
+            lost=lost,
+            loss_rate=lost / generated if generated else 0.0,
+            queues=queues,
+            facilities=facilities,
+            storages=storages,
+            savevalues={station.loss_name: station.losses for station in self.stations},
+            sim_time=sim_time)
+
+
+class Simulator:
+    '''
+    Дискретно-событийное исполнение `ModelData` на календаре событий в куче.
+    Транзакт хранится кортежем `(время, номер, станция, type_data)`.
+    Без `replication` все станции и источники берут числа из одного генератора `Random(seed)`;
+    с ним у каждой станции и источника свой поток (`stream_seed`) для независимых прогонов
+    и сравнения вариантов на общих случайных числах.
+    '''
+    def __init__(self, data: ModelData, seed: Optional[int] = None, replication: Optional[int] = None):
+        self.model = SimModel(data)
+        self.seed: int = data.model.rng.seed if seed is None else seed
+        self.replication = replication
+
+    def streams(self, rng: Random, labels: list[str]) -> list[Random]:
+        if self.replication is None:
+            return [rng] * len(labels)
+        return [Random(stream_seed(self.seed, self.replication, label)) for label in labels]
+
+    def run(self) -> SimulationResult:
+        start_time = monotonic()
+        model = self.model
+        stations = model.stations
+        sources = model.sources
+        duration = model.duration
+        rng = Random(self.seed)
+        station_rngs = self.streams(rng, [station.label for station in stations])
+        source_rngs = self.streams(rng, [source.label for source in sources])
+        calendar: list[tuple[float, int, int, int]] = []
+        seq = 0
+        generated = delivered = lost = 0
+        for station in stations:
+            station.reset()
+
+        def arrive(idx: int, type_data: int, now: float):
+            nonlocal seq, delivered, lost
+            if idx == SINK:
+                delivered += 1
+                return
+            station = stations[idx]
+            if len(station.waiting) >= station.limit:
+                station.losses += 1
+                lost += 1
+                return
+            station.advance(now)
+            station.entries += 1
+            if station.busy < station.capacity:
+                station.busy += 1
+                station.seizes += 1
+                station.zero_entries += 1
+                seq += 1
+                heappush(calendar, (now + station.dist(station_rngs[idx], 0, 1 / station.mu), seq, idx, type_data))
+            else:
+                station.waiting.append((now, type_data))
+                if len(station.waiting) > station.q_max:
+                    station.q_max = len(station.waiting)
+
+        for i, source in enumerate(sources):
+            seq += 1
+            heappush(calendar, (source.dist(source_rngs[i], 0, 1 / source.lambda_), seq, -1 - i, source.type_data))
+
+        while calendar:
+            now, _, idx, type_data = heappop(calendar)
+            if now > duration:
+                break
+            if idx < 0:
+                source = sources[-1 - idx]
+                rng = source_rngs[-1 - idx]
+                seq += 1
+                heappush(calendar, (now + source.dist(rng, 0, 1 / source.lambda_), seq, idx, type_data))
+                count = model.packets(rng)
+                generated += count
+                for _ in range(count):
+                    arrive(source.target, type_data, now)
+                continue
+            station = stations[idx]
+            station.advance(now)
+            station.busy -= 1
+            if station.waiting:
+                _, next_type = station.waiting.popleft()
+                station.busy += 1
+                station.seizes += 1
+                seq += 1
+                heappush(calendar, (now + station.dist(station_rngs[idx], 0, 1 / station.mu), seq, idx, next_type))
+            target = station.route(type_data)
+            if target == LOSS:
+                station.losses += 1
+                lost += 1
+            else:
+                arrive(target, type_data, now)
+
+        for station in stations:
+            station.advance(duration)
+            station.current = len(station.waiting)
+        return model.report(seed=self.seed, generated=generated, delivered=delivered, lost=lost,
+                            sim_time=monotonic() - start_time)
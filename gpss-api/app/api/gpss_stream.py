@@ -0,0 +1,112 @@
+from typing import Iterable, Iterator, Optional
+from time import monotonic
+import zlib
+
+from app.core.config import settings
+
+from .gpss_metrics import compressed, encode_seconds, output_bytes
+
+try:
+    import zstandard
+except ImportError:  # необязательная зависимость: без неё доступен только gzip
+    zstandard = None
+
+
+CHUNK_SIZE = 64 * 1024
+# Поддерживаемые сжатия в порядке предпочтения при равном `q` в `Accept-Encoding`.
+COMPRESSIONS = ('zstd', 'gzip') if zstandard is not None else ('gzip',)
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    '''Сжатие ответа по заголовку `Accept-Encoding`: наибольший `q`, при равенстве — zstd.'''
+    weights: dict[str, float] = {}
+    for item in accept_encoding.split(','):
+        name, *params = (part.strip() for part in item.split(';'))
+        weight = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip() == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        if name:
+            weights[name.lower()] = weight
+    weight, _, name = max((weights.get(name, weights.get('*', 0.0)), -k, name)
+                          for k, name in enumerate(COMPRESSIONS))
+    return name if weight > 0 else None
+
+
+class Compressor:
+    '''
+    Потоковое сжатие gzip или zstd. После каждой части выполняется сброс блока
+    (`Z_SYNC_FLUSH` / `COMPRESSOBJ_FLUSH_BLOCK`), чтобы клиент получал данные сразу;
+    объём до и после сжатия учитывается в метриках по завершении потока.
+    '''
+    def __init__(self, name: str):
+        self.name = name
+        if name == 'zstd':
+            self.stream = zstandard.ZstdCompressor(level=settings.ZSTD_LEVEL).compressobj()
+            self.sync = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        else:
+            self.stream = zlib.compressobj(settings.GZIP_LEVEL, wbits=zlib.MAX_WBITS | 16)
+            self.sync = zlib.Z_SYNC_FLUSH
+        self.size = 0
+        self.compressed_size = 0
+
+    def compress(self, data: bytes, final: bool = False) -> bytes:
+        result = self.stream.compress(data) + (self.stream.flush() if final else self.stream.flush(self.sync))
+        self.size += len(data)
+        self.compressed_size += len(result)
+        if final:
+            compressed(self.name, self.size, self.compressed_size)
+        return result
+
+
+def compress(data: bytes, name: str) -> bytes:
+    '''Сжатие готового тела ответа целиком.'''
+    return Compressor(name).compress(data, final=True)
+
+
+def chunked(text: str, size: int = CHUNK_SIZE) -> Iterator[str]:
+    '''Нарезка готового текста на части для потоковой отдачи.'''
+    for start in range(0, len(text), size):
+        yield text[start:start + size]
+
+
+def encode(chunks: Iterable[str], encoding: str, compression: Optional[str] = None,
+           size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    '''
+    Кодирование потока строк в байты частями не меньше `size` символов.
+    С `compression` (`gzip` или `zstd`) поток сжимается по частям через `Compressor`.
+    '''
+    compressor = Compressor(compression) if compression is not None else None
+    output_format = f'{encoding}+{compression}' if compression is not None else encoding
+    # Учитывается только время кодирования и сжатия, без ожидания частей от генератора.
+    seconds = 0.0
+    total = 0
+    buffer: list[str] = []
+    length = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        length += len(chunk)
+        if length < size:
+            continue
+        start_time = monotonic()
+        data = ''.join(buffer).encode(encoding=encoding)
+        buffer, length = [], 0
+        if compressor is not None:
+            data = compressor.compress(data)
+        seconds += monotonic() - start_time
+        total += len(data)
+        yield data
+    start_time = monotonic()
+    data = ''.join(buffer).encode(encoding=encoding)
+    if compressor is not None:
+        data = compressor.compress(data, final=True)
+    seconds += monotonic() - start_time
+    total += len(data)
+    encode_seconds.observe(seconds, format=output_format)
+    output_bytes.observe(total, format=output_format)
+    if data:
+        yield data
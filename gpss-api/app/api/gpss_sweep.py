@@ -0,0 +1,165 @@
+from typing import Any, Iterator, Optional
+from concurrent.futures import ProcessPoolExecutor
+from copy import deepcopy
+from itertools import product
+import multiprocessing
+import zipfile
+
+import numpy as np
+
+from app.core.config import settings
+from app.schemas.gpss_model_data import ModelData
+from app.schemas.gpss_sweep import SweepRequest
+
+from .gpss_generator import Generator
+from .gpss_estimator import Estimator
+from .gpss_simulator import Simulator
+from .gpss_vector_simulator import VectorSimulator
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def executor() -> ProcessPoolExecutor:
+    '''Общий пул процессов для вариантов; создаётся при первом обращении.'''
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.SWEEP_WORKERS,
+                                        mp_context=multiprocessing.get_context('spawn'))
+    return _executor
+
+
+def discard(pool: ProcessPoolExecutor):
+    '''Сброс пула, сломанного упавшим процессом; следующий вызов `executor()` создаст новый.'''
+    global _executor
+    if _executor is pool:
+        _executor = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def failure(index: int, params: dict[str, Any], output: str, error: Exception) -> Any:
+    '''Результат варианта, завершившегося ошибкой: строка с метриками или `.error.txt` в архиве.'''
+    message = f'{type(error).__name__}: {error}'
+    if output == 'zip':
+        return f'variant-{index:05d}.error.txt', message.encode()
+    return {'index': index, 'params': params, 'error': message}
+
+
+def assign(payload: Any, path: list[str], value: Any) -> int:
+    '''
+    Запись `value` по пути из ключей словарей и `id` элементов списков; `*` — любой элемент.
+    Возвращает число изменённых полей.
+    '''
+    key, rest = path[0], path[1:]
+    if isinstance(payload, list):
+        items = [item for item in payload if key == '*' or str(item.get('id')) == key]
+    elif isinstance(payload, dict):
+        if not rest:
+            if key not in payload:
+                return 0
+            payload[key] = value
+            return 1
+        items = list(payload.values()) if key == '*' else [payload[key]] if key in payload else []
+    else:
+        return 0
+    if not rest:
+        return 0
+    return sum(assign(item, rest, value) for item in items)
+
+
+def latin_hypercube(spec: SweepRequest.LatinHypercube) -> list[dict[str, Any]]:
+    '''Выборка латинского гиперкуба: по одной точке в каждом из `samples` слоёв каждого параметра.'''
+    rng = np.random.default_rng(spec.seed)
+    columns = {}
+    for name, (low, high) in spec.ranges.items():
+        points = low + (rng.permutation(spec.samples) + rng.random(spec.samples)) / spec.samples * (high - low)
+        columns[name] = np.rint(points).astype(int).tolist() \
+            if float(low).is_integer() and float(high).is_integer() else points.tolist()
+    return [{name: values[k] for name, values in columns.items()} for k in range(spec.samples)]
+
+
+def count(request: SweepRequest) -> int:
+    total = int(np.prod([len(values) for values in request.grid.values()], dtype=np.int64))
+    return total * (request.lhs.samples if request.lhs is not None else 1)
+
+
+def variants(request: SweepRequest) -> Iterator[tuple[int, dict[str, Any], dict[str, Any]]]:
+    '''Ленивый перебор `(номер, параметры, данные модели)` для всех точек сетки × LHS.'''
+    names = list(request.grid)
+    samples = latin_hypercube(request.lhs) if request.lhs is not None else [{}]
+    index = 0
+    for values in product(*request.grid.values()):
+        for sample in samples:
+            params = dict(zip(names, values)) | sample
+            payload = deepcopy(request.base)
+            for path, value in params.items():
+                if not assign(payload, path.split('.'), value):
+                    raise ValueError(f'Path `{path}` does not match any field of the model.')
+            yield index, params, payload
+            index += 1
+
+
+def evaluate(index: int, params: dict[str, Any], payload: dict[str, Any], evaluator: str) -> dict[str, Any]:
+    '''Расчёт сводных метрик одного варианта (исполняется в процессе пула).'''
+    row: dict[str, Any] = {'index': index, 'params': params}
+    try:
+        data = ModelData.model_validate(payload)
+        if evaluator == 'estimate':
+            estimate = Estimator(data=data).estimate()
+            bottleneck = max(estimate.stations, key=lambda station: station.utilization, default=None)
+            row.update(
+                generated_rate=estimate.generated_rate,
+                delivered_rate=estimate.delivered_rate,
+                loss_rate=estimate.loss_rate,
+                max_utilization=bottleneck.utilization if bottleneck else 0.0,
+                max_blocking=max((station.blocking for station in estimate.stations), default=0.0),
+                bottleneck=bottleneck.name if bottleneck else None)
+        else:
+            simulator = Simulator if evaluator == 'event' else VectorSimulator
+            result = simulator(data=data).run()
+            row.update(
+                generated=result.generated,
+                delivered=result.delivered,
+                lost=result.lost,
+                loss_rate=result.loss_rate,
+                max_utilization=max((facility.utilization
+                                     for facility in result.facilities + result.storages), default=0.0),
+                sim_time=result.sim_time)
+    except Exception as error:
+        return failure(index, params, 'metrics', error)
+    return row
+
+
+def render(index: int, payload: dict[str, Any], encoding: str) -> tuple[str, bytes]:
+    '''Генерация GPSS-кода одного варианта (исполняется в процессе пула); ошибка пишется в `.error.txt`.'''
+    try:
+        data = ModelData.model_validate(payload)
+        return f'variant-{index:05d}.gps.txt', Generator(data=data).code(add_time=True).code.encode(encoding=encoding)
+    except Exception as error:
+        return failure(index, {}, 'zip', error)
+
+
+class ZipStream:
+    '''Несмещаемый приёмник для `zipfile.ZipFile`: отдаёт накопленные байты по мере записи файлов.'''
+    def __init__(self):
+        self.chunks: list[bytes] = []
+        self.archive = zipfile.ZipFile(self, mode='w', compression=zipfile.ZIP_DEFLATED)
+
+    def write(self, data: bytes) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def add(self, name: str, data: bytes) -> bytes:
+        self.archive.writestr(name, data)
+        return self.drain()
+
+    def close(self) -> bytes:
+        self.archive.close()
+        return self.drain()
+
+    def drain(self) -> bytes:
+        data, self.chunks = b''.join(self.chunks), []
+        return data
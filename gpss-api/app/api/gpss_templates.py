@@ -0,0 +1,238 @@
+from typing import Optional, Union
+from functools import lru_cache
+import re
+
+
+# Ширина поля операции: `TEST L    `, `SAVEVALUE `, `EQU       ` и т. д.
+OPERATION_WIDTH = 10
+
+SLOT = re.compile(r'\{(\w+)\}')
+
+# Оператор GPSS: метка (или `None`), операция и операнды (или `None`);
+# метка и операнды могут содержать слоты `{name}`, метка — не больше одного.
+Statement = tuple[Optional[str], str, Optional[str]]
+
+
+class Template:
+    '''
+    Скомпилированный блок GPSS-кода под конкретную ширину поля меток.
+    Литеральные части уже разложены в список; при отрисовке копия списка заполняется
+    значениями слотов по позициям и склеивается одним `join`.
+    Значения передаются позиционно в порядке первого появления слотов (`names`).
+    '''
+    __slots__ = ('parts', 'names', 'slots')
+
+    def __init__(self, parts: list[str], names: list[str], positions: list[list[int]], pads: list[list[int]]):
+        self.parts = parts
+        self.names = tuple(names)
+        # Для каждого слота: позиции без выравнивания и пары (позиция, ширина) для меток.
+        self.slots = [(tuple(position for position, pad in zip(slot_positions, slot_pads) if not pad),
+                       tuple((position, pad) for position, pad in zip(slot_positions, slot_pads) if pad))
+                      for slot_positions, slot_pads in zip(positions, pads)]
+
+    def render(self, *values) -> str:
+        parts = self.parts.copy()
+        for value, (plain, padded) in zip(values, self.slots):
+            value = str(value)
+            for position in plain:
+                parts[position] = value
+            for position, pad in padded:
+                parts[position] = value.ljust(pad)
+        return ''.join(parts)
+
+
+def compile_block(margin: int, *lines: Union[Statement, str]) -> Template:
+    '''
+    Компиляция блока из операторов и произвольных строк (комментарии, пустые строки, вставки);
+    строки блока разделяются `\\n`. Оператор без метки начинается с отступа `margin + 1`.
+    '''
+    parts: list[str] = []
+    names: list[str] = []
+    positions: list[list[int]] = []
+    pads: list[list[int]] = []
+
+    def emit(text: str, pad: int = 0):
+        pieces = SLOT.split(text)
+        literal = sum(len(piece) for piece in pieces[::2])
+        for k, piece in enumerate(pieces):
+            if k % 2 == 0:
+                if piece:
+                    parts.append(piece)
+                continue
+            if piece not in names:
+                names.append(piece)
+                positions.append([])
+                pads.append([])
+            slot = names.index(piece)
+            positions[slot].append(len(parts))
+            pads[slot].append(max(pad - literal, 0))
+            parts.append('')
+        if pad and literal < pad and len(pieces) == 1:
+            parts.append(' ' * (pad - literal))
+
+    for k, line in enumerate(lines):
+        if k:
+            parts.append('\n')
+        if isinstance(line, str):
+            emit(line)
+            continue
+        label, operation, operands = line
+        if label is None:
+            parts.append(' ' * (margin + 1))
+        else:
+            if len(SLOT.findall(label)) > 1:
+                raise ValueError(f'Label `{label}` must contain at most one slot.')
+            emit(label, pad=margin)
+            parts.append(' ')
+        if operands is None:
+            parts.append(operation)
+        else:
+            parts.append(operation.ljust(OPERATION_WIDTH))
+            emit(operands)
+    return Template(parts, names, positions, pads)
+
+
+class Templates:
+    '''Набор скомпилированных блоков генератора для одной ширины поля меток.'''
+    def __init__(self, margin: int):
+        self.generator_input = compile_block(
+            margin,
+            ('la_gen_{id}', 'EQU', '{lambda}'))
+        self.processing_input = compile_block(
+            margin,
+            ('service_{id}', 'STORAGE', '{lines}'),
+            (' q_{id}', 'EQU', '{queue}'),
+            ('mu_{id}', 'EQU', '{mu}'))
+        self.interface_input = compile_block(
+            margin,
+            (' q_{block}', 'EQU', '{queue}'),
+            ('mu_{block}', 'EQU', '{mu}'))
+        # Исходящий интерфейс с расписанием связи: интенсивность и видимость — функции времени `AC1`.
+        self.schedule_input = compile_block(
+            margin,
+            (' q_{block}', 'EQU', '{queue}'),
+            ('mu_{block}', 'FUNCTION', 'AC1,D{rates}'),
+            '{rate_points}',
+            ('vis_{block}', 'FUNCTION', 'AC1,D{windows}'),
+            '{window_points}')
+        self.scheduled_interface = compile_block(
+            margin,
+            '* {name}',
+            ('{block}', 'ASSIGN', 'number_{direction}_int_{node_type},{idx}'),
+            (None, 'TEST E', 'FN$vis_{block},1,loss_{block}'),
+            (None, 'TEST L', 'Q$queue_{block},q_{block},loss_{block}'),
+            (None, 'QUEUE', 'queue_{block}'),
+            (None, 'SEIZE', 'service_{block}'),
+            (None, 'DEPART', 'queue_{block}'),
+            (None, 'ADVANCE', '({dist}(1,0,1/FN$mu_{block}))'),
+            (None, 'RELEASE', 'service_{block}'),
+            (None, 'TRANSFER', ',{next}'),
+            '',
+            ('loss_{block}', 'SAVEVALUE', 'loss_{block}_+,1'),
+            (None, 'TERMINATE', None))
+        self.interface = compile_block(
+            margin,
+            '* {name}',
+            ('{block}', 'ASSIGN', 'number_{direction}_int_{node_type},{idx}'),
+            (None, 'TEST L', 'Q$queue_{block},q_{block},loss_{block}'),
+            (None, 'QUEUE', 'queue_{block}'),
+            (None, 'SEIZE', 'service_{block}'),
+            (None, 'DEPART', 'queue_{block}'),
+            (None, 'ADVANCE', '({dist}(1,0,1/mu_{block}))'),
+            (None, 'RELEASE', 'service_{block}'),
+            (None, 'TRANSFER', ',{next}'),
+            '',
+            ('loss_{block}', 'SAVEVALUE', 'loss_{block}_+,1'),
+            (None, 'TERMINATE', None))
+        self.processing = compile_block(
+            margin,
+            '* Обработка',
+            ('processing_{id}', 'TEST L', 'Q$queue_{id},q_{id},loss_{id}'),
+            (None, 'QUEUE', 'queue_{id}'),
+            (None, 'ENTER', 'service_{id},1'),
+            (None, 'DEPART', 'queue_{id}'),
+            (None, 'ADVANCE', '({dist}(1,0,1/mu_{id}))'),
+            (None, 'LEAVE', 'service_{id},1'),
+            '{routing}',
+            ('loss_{id}', 'SAVEVALUE', 'loss_{id}_+,1'),
+            (None, 'TERMINATE', None))
+        self.route_test = compile_block(
+            margin,
+            (None, 'TEST E', 'P$type_data,{type},{route}'))
+        self.route_transfer = compile_block(
+            margin,
+            ('{route}', 'TRANSFER', ',{next}'))
+        self.terminate = compile_block(
+            margin,
+            ('{label}', 'TERMINATE', None))
+        # Свёрнутые группы: объекты адресуются номером из параметра `fold_entity`.
+        self.fold_storage = compile_block(
+            margin,
+            ('service_{id}', 'EQU', '{number}'),
+            ('service_{id}', 'STORAGE', '{lines}'))
+        self.fold_entry = compile_block(
+            margin,
+            ('{label}', 'ASSIGN', 'fold_member,{member}'),
+            (None, 'TRANSFER', ',{next}'))
+        self.fold_interface = compile_block(
+            margin,
+            '* {name}',
+            ('{block}', 'ASSIGN', 'number_{direction}_int_{node_type},{idx}'),
+            (None, 'ASSIGN', 'fold_entity,({base}+(P$fold_member-1)*{stride})'),
+            (None, 'TEST L', 'Q*fold_entity,q_{block},loss_{block}'),
+            (None, 'QUEUE', 'P$fold_entity'),
+            (None, 'SEIZE', 'P$fold_entity'),
+            (None, 'DEPART', 'P$fold_entity'),
+            (None, 'ADVANCE', '({dist}(1,0,1/mu_{block}))'),
+            (None, 'RELEASE', 'P$fold_entity'),
+            (None, 'TRANSFER', ',{next}'),
+            '',
+            ('loss_{block}', 'SAVEVALUE', 'P$fold_entity+,1'),
+            (None, 'TERMINATE', None))
+        self.fold_processing = compile_block(
+            margin,
+            '* Обработка',
+            ('processing_{id}', 'ASSIGN', 'fold_entity,({base}+(P$fold_member-1)*{stride})'),
+            (None, 'TEST L', 'Q*fold_entity,q_{id},loss_{id}'),
+            (None, 'QUEUE', 'P$fold_entity'),
+            (None, 'ENTER', 'P$fold_entity,1'),
+            (None, 'DEPART', 'P$fold_entity'),
+            (None, 'ADVANCE', '({dist}(1,0,1/mu_{id}))'),
+            (None, 'LEAVE', 'P$fold_entity,1'),
+            '{routing}',
+            ('loss_{id}', 'SAVEVALUE', 'P$fold_entity+,1'),
+            (None, 'TERMINATE', None))
+        self.fold_jump = compile_block(
+            margin,
+            (None, 'TRANSFER', ',{next}'))
+        self.source = compile_block(
+            margin,
+            '{input}',
+            '',
+            (None, 'GENERATE', '({dist}(1,0,1/la_gen_{id}))'),
+            (None, 'ASSIGN', 'cap_data_{kind},(V${capacity})'),
+            (None, 'SPLIT', '(P$cap_data_{kind}/{mtu})'),
+            (None, 'ASSIGN', 'type_data,{type}'),
+            (None, 'TRANSFER', ',{next}'),
+            '',
+            '')
+        self.ssop = compile_block(
+            margin,
+            '{input}',
+            '',
+            ('to_{id}', 'TERMINATE', None),
+            '',
+            (None, 'GENERATE', '({dist}(1,0,1/la_gen_{id}))'),
+            (None, 'ASSIGN', 'cap_data_SSOP,(V${capacity})'),
+            (None, 'SPLIT', '(P$cap_data_SSOP/{mtu})'),
+            (None, 'ASSIGN', 'type_data,{type}'),
+            (None, 'TRANSFER', ',{next}'),
+            '',
+            '{in_ints}',
+            '',
+            '')
+
+
+@lru_cache(maxsize=64)
+def templates(margin: int) -> Templates:
+    return Templates(margin)
@@ -0,0 +1,365 @@
+from typing import Callable, Optional
+from collections import deque
+from heapq import heapify, heappop, heappush, heapreplace
+from random import Random
+from time import monotonic
+
+import numpy as np
+
+from app.schemas.gpss_model_data import ModelData
+from app.schemas.gpss_simulation import SimulationResult
+
+from .gpss_estimator import components
+from .gpss_simulator import SimModel, Station, SINK, LOSS, stream_seed
+
+
+# Векторные аналоги `gpss_simulator.DISTRIBUTIONS`: `{dist}(1,a,b)` → массив из `size` значений.
+VECTOR_DISTRIBUTIONS: dict[str, Callable[[np.random.Generator, float, float, int], np.ndarray]] = {
+    'exponential': lambda rng, locate, scale, size: locate + rng.exponential(scale, size),
+    'uniform': lambda rng, low, high, size: rng.uniform(low, high, size),
+    'duniform': lambda rng, low, high, size: rng.integers(int(low), int(high) + 1, size),
+}
+
+Stream = tuple[np.ndarray, np.ndarray]  # (моменты поступления, type_data)
+
+# Многоканальная система возвращается к проверке окнами не раньше, чем столько поступлений подряд
+# пройдут без ожидания; с векторной проверкой выгоднее, чем по одному, только достаточно длинные окна.
+CALM = 32
+
+
+def vector_distribution(name: str) -> Callable[[np.random.Generator, float, float, int], np.ndarray]:
+    try:
+        return VECTOR_DISTRIBUTIONS[str(name).lower()]
+    except KeyError:
+        raise ValueError(f'Unsupported distribution `{name}`.') from None
+
+
+def lindley(arrivals: np.ndarray, services: np.ndarray, limit: float) -> np.ndarray:
+    '''
+    Однолинейная FIFO-система с буфером `limit` (`SEIZE` + `TEST L` по числу ожидающих).
+    Моменты начала обслуживания считаются рекуррентным соотношением Линдли в векторной форме
+    `begin = cumsum(s) - s + maximum.accumulate(a - (cumsum(s) - s))`. С первой потери окна
+    система проходится по одному транзакту, пока `calm` транзактов подряд не будут приняты,
+    и затем снова окнами (порог `calm` — как в `multi_server`): при переполненном буфере потери
+    следуют пачками SPLIT одна за другой, и перезапуск окна на каждой дороже прохода по одному.
+    Транзакты пачки, поступившие вместе с потерянным, теряются вслед за ним.
+    Для отброшенных транзактов возвращается NaN.
+    '''
+    n = len(arrivals)
+    begin = np.full(n, np.nan)
+    bounded = bool(np.isfinite(limit))
+    # Начала обслуживания последних `limit` принятых транзактов (см. `multi_server`).
+    recent: deque[float] = deque([-np.inf] * int(limit), maxlen=int(limit)) if bounded else deque(maxlen=0)
+    free = -np.inf
+    i, window, calm = 0, 64, CALM
+    while i < n:
+        j = min(n, i + window)
+        a, s = arrivals[i:j], services[i:j]
+        before = np.cumsum(s) - s
+        idle = a - before
+        peak = np.maximum.accumulate(np.maximum(idle, free))
+        # Там, где канал свободен, начало обслуживания равно моменту поступления без ошибки округления.
+        b = np.where(idle >= peak, a, peak + before)
+        fits = np.concatenate((np.array(recent), b))[:j - i] <= a if bounded else None
+        if fits is None or fits.all():
+            accepted, window = j - i, window * 2
+        else:
+            accepted, window = int(np.argmin(fits)), max(window // 2, 64)
+            calm = CALM if accepted >= CALM else calm * 2
+        begin[i:i + accepted] = b[:accepted]
+        if accepted:
+            free = float(b[accepted - 1] + s[accepted - 1])
+            recent.extend(b[max(accepted - len(recent), 0):accepted].tolist())
+        i += accepted
+        if i == j:
+            continue
+        run = 0
+        while i < n and run < calm:
+            stop = min(n, i + calm - run)
+            for a, s in zip(arrivals[i:stop].tolist(), services[i:stop].tolist()):
+                i += 1
+                if bounded and recent[0] > a:
+                    run = 0
+                    continue
+                b = a if a > free else free
+                free = b + s
+                begin[i - 1] = b
+                recent.append(b)
+                run += 1
+    return begin
+
+
+def multi_server(arrivals: np.ndarray, services: np.ndarray, servers: int, limit: float) -> np.ndarray:
+    '''
+    FIFO-система с `servers` каналами (`ENTER`/`LEAVE` на STORAGE) и буфером `limit`.
+    Окно транзактов проверяется векторно: если каждый транзакт застаёт свободный канал, ожидания
+    нет и обслуживание начинается в момент поступления. С первого транзакта, заставшего все каналы
+    занятыми, система проходится по одному транзакту, пока `calm` транзактов подряд не начнут
+    обслуживание без ожидания, затем снова окнами. Если окно снова обрывается раньше `CALM`
+    транзактов, порог `calm` удваивается: при частых ожиданиях окна не перезапускаются впустую.
+    '''
+    n = len(arrivals)
+    begin = np.full(n, np.nan)
+    # Моменты освобождения каналов; значения не позже текущего момента равносильны свободному каналу.
+    free = np.full(servers, -np.inf)
+    bounded = bool(np.isfinite(limit))
+    # Начала обслуживания последних `limit` принятых транзактов: ожидающих не меньше `limit`,
+    # если самый ранний из них ещё не начал обслуживание.
+    recent: deque[float] = deque([-np.inf] * int(limit), maxlen=int(limit)) if bounded else deque(maxlen=0)
+    i, window, calm = 0, 64, CALM
+    while i < n:
+        j = min(n, i + window)
+        a, s = arrivals[i:j], services[i:j]
+        ends = a + s
+        # Занятые каналы при поступлении: из прошлых окон и (оценка сверху) из этого окна.
+        busy = (servers - np.searchsorted(np.sort(free), a, side='right')
+                + np.arange(j - i) - np.searchsorted(np.sort(ends), a, side='left'))
+        fits = busy < servers
+        if fits.all():
+            accepted, window = j - i, window * 2
+        else:
+            accepted, window = int(np.argmin(fits)), max(window // 2, 64)
+            calm = CALM if accepted >= CALM else calm * 2
+        begin[i:i + accepted] = a[:accepted]
+        free = np.sort(np.concatenate((free, ends[:accepted])))[-servers:]
+        recent.extend(a[:accepted].tolist())
+        i += accepted
+        if i == j:
+            continue
+        heap = free.tolist()
+        heapify(heap)
+        run = 0
+        while i < n and run < calm:
+            stop = min(n, i + calm - run)
+            for a, s in zip(arrivals[i:stop].tolist(), services[i:stop].tolist()):
+                i += 1
+                if bounded and recent[0] > a:
+                    run = 0
+                    continue
+                b = a if a > heap[0] else heap[0]
+                heapreplace(heap, b + s)
+                begin[i - 1] = b
+                recent.append(b)
+                run = run + 1 if b == a else 0
+        free = np.array(heap)
+    return begin
+
+
+def queue_max(arrivals: np.ndarray, begin: np.ndarray) -> int:
+    '''Максимальное содержимое очереди по моментам входа (QUEUE) и выхода (DEPART).'''
+    waited = begin > arrivals
+    if not waited.any():
+        return 0
+    times = np.concatenate((arrivals[waited], begin[waited]))
+    deltas = np.concatenate((np.ones(waited.sum(), dtype=np.int64), -np.ones(waited.sum(), dtype=np.int64)))
+    order = np.lexsort((deltas, times))
+    return int(np.cumsum(deltas[order]).max())
+
+
+class VectorSimulator:
+    '''
+    Векторное исполнение `ModelData` на NumPy: каждая станция обрабатывает весь поток
+    поступлений одним массивом, пачки SPLIT порождаются через `np.repeat`, а потоки
+    передаются между станциями по графу `edges` за один проход в топологическом порядке
+    компонент сильной связности. Компонента с петлёй маршрутизации (поток станции возвращается
+    к ней же) массивом не обслуживается и исполняется по событиям, как в `Simulator`.
+    '''
+    def __init__(self, data: ModelData, seed: Optional[int] = None, replication: Optional[int] = None):
+        self.model = SimModel(data)
+        self.seed: int = data.model.rng.seed if seed is None else seed
+        self.replication = replication
+
+    def stream(self, kind: int, index: int, label: str) -> np.random.Generator:
+        '''Поток станции или источника; в прогоне `replication` зерно выводится из метки (`stream_seed`).'''
+        if self.replication is None:
+            return np.random.default_rng((self.seed, kind, index))
+        return np.random.default_rng(stream_seed(self.seed, self.replication, label))
+
+    def _sources(self) -> tuple[list[tuple[int, Stream]], int]:
+        model = self.model
+        duration = model.duration
+        capacity = vector_distribution(model.capacity_dist_name)
+        streams, generated = [], 0
+        for i, source in enumerate(model.sources):
+            rng = self.stream(0, i, source.label)
+            draw = vector_distribution(source.dist_name)
+            chunk = int(duration * source.lambda_ * 1.1) + 16
+            chunks, last = [], 0.0
+            while last <= duration:
+                times = last + np.cumsum(draw(rng, 0, 1 / source.lambda_, chunk))
+                chunks.append(times)
+                last = times[-1]
+            times = np.concatenate(chunks)
+            times = times[times <= duration]
+            counts = (capacity(rng, *model.capacity_params, len(times)) / model.mtu).astype(np.int64) + 1
+            arrivals = np.repeat(times, counts)
+            generated += len(arrivals)
+            streams.append((source.target, (arrivals, np.full(len(arrivals), source.type_data, dtype=np.int64))))
+        return streams, generated
+
+    def _serve(self, idx: int, station: Station, streams: list[Stream]) -> Stream:
+        '''Обслуживание входного потока станцией; статистика пишется в поля `Station`.'''
+        duration = self.model.duration
+        station.reset()
+        if streams:
+            arrivals = np.concatenate([stream[0] for stream in streams])
+            types = np.concatenate([stream[1] for stream in streams])
+            order = np.argsort(arrivals, kind='stable')
+            arrivals, types = arrivals[order], types[order]
+        else:
+            arrivals, types = np.empty(0), np.empty(0, dtype=np.int64)
+        rng = self.stream(1, idx, station.label)
+        services = vector_distribution(station.dist_name)(rng, 0, 1 / station.mu, len(arrivals))
+        if station.capacity == 1:
+            begin = lindley(arrivals, services, station.limit)
+        else:
+            begin = multi_server(arrivals, services, station.capacity, station.limit)
+        accepted = ~np.isnan(begin)
+        arrivals, types, services, begin = arrivals[accepted], types[accepted], services[accepted], begin[accepted]
+        depart = begin + services
+        started = begin <= duration
+        station.entries = len(arrivals)
+        station.losses = int((~accepted).sum())
+        station.zero_entries = int((begin == arrivals).sum())
+        station.seizes = int(started.sum())
+        station.current = station.entries - station.seizes
+        station.q_area = float((np.minimum(begin, duration) - arrivals).sum())
+        station.busy_area = float((np.minimum(depart[started], duration) - begin[started]).sum())
+        station.q_max = queue_max(arrivals, np.minimum(begin, duration))
+        done = depart <= duration
+        depart, types = depart[done], types[done]
+        if station.capacity > 1:
+            order = np.argsort(depart, kind='stable')
+            depart, types = depart[order], types[order]
+        return depart, types
+
+    def _targets(self) -> list[list[int]]:
+        '''Станции, в которые уходит трафик каждой станции, по типам, которые до неё доходят от источников.'''
+        stations = self.model.stations
+        reaching: list[set[int]] = [set() for _ in stations]
+        stack = [(source.target, source.type_data) for source in self.model.sources if source.target >= 0]
+        while stack:
+            idx, type_data = stack.pop()
+            if type_data in reaching[idx]:
+                continue
+            reaching[idx].add(type_data)
+            if (target := stations[idx].route(type_data)) >= 0:
+                stack.append((target, type_data))
+        return [sorted({stations[idx].route(type_data) for type_data in types} - {SINK, LOSS})
+                for idx, types in enumerate(reaching)]
+
+    def _settle(self, members: list[int], inputs: list[dict[int, Stream]]) -> tuple[dict[int, Stream], int]:
+        '''
+        Исполнение компоненты с петлёй по событиям: внешние поступления берутся из готовых потоков,
+        транзакты между станциями компоненты передаются через календарь, как в `Simulator`.
+        Возвращает потоки, уходящие из компоненты, по станции-приёмнику и число транзактов в стоках.
+        '''
+        stations = self.model.stations
+        duration = self.model.duration
+        inside = set(members)
+        rngs = {idx: Random(int(self.stream(1, idx, stations[idx].label).integers(2 ** 63))) for idx in members}
+        streams = [(np.full(len(stream[0]), idx, dtype=np.int64), *stream)
+                   for idx in members for stream in inputs[idx].values()]
+        if streams:
+            targets, times, types = (np.concatenate(column) for column in zip(*streams))
+            order = np.argsort(times, kind='stable')
+            targets, times, types = targets[order].tolist(), times[order].tolist(), types[order].tolist()
+        else:
+            targets, times, types = [], [], []
+        calendar: list[tuple[float, int, int, int]] = []
+        outgoing: dict[int, tuple[list[float], list[int]]] = {}
+        seq = delivered = 0
+        for idx in members:
+            stations[idx].reset()
+
+        def arrive(idx: int, type_data: int, now: float):
+            nonlocal seq
+            station = stations[idx]
+            if len(station.waiting) >= station.limit:
+                station.losses += 1
+                return
+            station.advance(now)
+            station.entries += 1
+            if station.busy < station.capacity:
+                station.busy += 1
+                station.seizes += 1
+                station.zero_entries += 1
+                seq += 1
+                heappush(calendar, (now + station.dist(rngs[idx], 0, 1 / station.mu), seq, idx, type_data))
+            else:
+                station.waiting.append((now, type_data))
+                if len(station.waiting) > station.q_max:
+                    station.q_max = len(station.waiting)
+
+        position = 0
+        while calendar or position < len(times):
+            if position < len(times) and (not calendar or times[position] < calendar[0][0]):
+                arrive(targets[position], types[position], times[position])
+                position += 1
+                continue
+            now, _, idx, type_data = heappop(calendar)
+            if now > duration:
+                break
+            station = stations[idx]
+            station.advance(now)
+            station.busy -= 1
+            if station.waiting:
+                _, next_type = station.waiting.popleft()
+                station.busy += 1
+                station.seizes += 1
+                seq += 1
+                heappush(calendar, (now + station.dist(rngs[idx], 0, 1 / station.mu), seq, idx, next_type))
+            target = station.route(type_data)
+            if target == LOSS:
+                station.losses += 1
+            elif target == SINK:
+                delivered += 1
+            elif target in inside:
+                arrive(target, type_data, now)
+            else:
+                departures = outgoing.setdefault(target, ([], []))
+                departures[0].append(now)
+                departures[1].append(type_data)
+        for idx in members:
+            stations[idx].advance(duration)
+            stations[idx].current = len(stations[idx].waiting)
+        return {target: (np.array(departures[0]), np.array(departures[1], dtype=np.int64))
+                for target, departures in outgoing.items()}, delivered
+
+    def run(self) -> SimulationResult:
+        start_time = monotonic()
+        stations = self.model.stations
+        targets = self._targets()
+        inputs: list[dict[int, Stream]] = [{} for _ in stations]
+        sources, generated = self._sources()
+        delivered = 0
+        for i, (target, stream) in enumerate(sources):
+            if target == SINK:
+                delivered += len(stream[0])
+            else:
+                inputs[target][-1 - i] = stream
+        settled = 0
+        for members in components(targets):
+            if len(members) > 1 or members[0] in targets[members[0]]:
+                settled += len(members)
+                outgoing, sunk = self._settle(members, inputs)
+                delivered += sunk
+                for target, stream in outgoing.items():
+                    inputs[target][members[0]] = stream
+                continue
+            idx = members[0]
+            station = stations[idx]
+            depart, types = self._serve(idx, station, list(inputs[idx].values()))
+            branch = np.full(len(types), station.default, dtype=np.int64)
+            for type_data, target in station.routes.items():
+                branch[types == type_data] = target
+            delivered += int((branch == SINK).sum())
+            station.losses += int((branch == LOSS).sum())
+            for target in targets[idx]:
+                chosen = branch == target
+                inputs[target][idx] = (depart[chosen], types[chosen])
+        result = self.model.report(seed=self.seed, generated=generated, delivered=delivered,
+                                   lost=sum(station.losses for station in stations),
+                                   sim_time=monotonic() - start_time)
+        result.event_stations = settled
+        return result
@@ -0,0 +1,145 @@
+from typing import Any, Callable, Iterator, Literal, Optional
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from threading import Lock
+import asyncio
+import multiprocessing
+import os
+
+from fastapi import HTTPException
+
+from app.core.config import settings
+
+
+class WorkerPool:
+    '''
+    Пул для CPU-ёмкой генерации вне цикла событий.
+    Одновременно принимается не больше `workers + queue` задач: остальные запросы сразу
+    получают 503 с `Retry-After`, а не копятся в очереди исполнителя. Место освобождается,
+    когда задача действительно завершилась, поэтому задача, переставшая ждать по таймауту,
+    продолжает занимать пул, пока исполняется.
+    '''
+    def __init__(self, kind: Literal['thread', 'process'], workers: Optional[int], queue: int,
+                 timeout: float, retry_after: int):
+        self.kind = kind
+        self.workers = workers or os.cpu_count() or 1
+        self.capacity = self.workers + queue
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._executor: Optional[Executor] = None
+        self.active = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.lock = Lock()
+
+    def executor(self) -> Executor:
+        '''Исполнитель создаётся при первом обращении, как и пул `/sweep`.'''
+        if self._executor is None:
+            if self.kind == 'process':
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='gpss-gen')
+        return self._executor
+
+    def unavailable(self, detail: str) -> HTTPException:
+        return HTTPException(status_code=503, detail=detail, headers={'Retry-After': str(self.retry_after)})
+
+    def reserve(self):
+        '''Занятие места в пуле; при заполненной очереди — 503.'''
+        with self.lock:
+            if self.active >= self.capacity:
+                self.rejected += 1
+                raise self.unavailable(f'Generation pool is busy ({self.active} jobs in progress).')
+            self.active += 1
+            self.accepted += 1
+
+    def release(self, *_):
+        with self.lock:
+            self.active -= 1
+
+    async def run(self, function: Callable[..., Any], *args) -> Any:
+        '''Исполнение `function(*args)` в пуле с ожиданием не дольше `timeout` секунд.'''
+        self.reserve()
+        try:
+            future = self.executor().submit(function, *args)
+        except BaseException:
+            self.release()
+            raise
+        future.add_done_callback(self.release)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except TimeoutError:
+            with self.lock:
+                self.timeouts += 1
+            raise self.unavailable(f'Generation did not finish in {self.timeout:g} s.') from None
+
+    def stream(self, chunks: Iterator[Any]) -> 'Stream':
+        '''
+        Потоковая отдача: каждая часть вычисляется в пуле (только для пула потоков).
+        Место занимается сразу, пока ответ ещё можно отклонить; таймаут не применяется,
+        так как заголовки ответа к началу отдачи уже отправлены.
+        '''
+        self.reserve()
+        return Stream(self, chunks)
+
+    def stats(self) -> dict[str, Any]:
+        with self.lock:
+            return {
+                'kind': self.kind,
+                'workers': self.workers,
+                'capacity': self.capacity,
+                'active': self.active,
+                'accepted': self.accepted,
+                'rejected': self.rejected,
+                'timeouts': self.timeouts,
+            }
+
+
+class Stream:
+    '''
+    Асинхронный итератор поверх синхронного, занимающий место в пуле до конца отдачи.
+    Место освобождается и при обрыве соединения, и если отдача так и не началась.
+    '''
+    def __init__(self, pool: WorkerPool, chunks: Iterator[Any]):
+        self.pool = pool
+        self.chunks = chunks
+        self.future: Optional[Future] = None
+        self.closed = False
+
+    def __aiter__(self) -> 'Stream':
+        return self
+
+    async def __anext__(self) -> Any:
+        if self.closed:
+            raise StopAsyncIteration
+        self.future = self.pool.executor().submit(next, self.chunks, None)
+        try:
+            chunk = await asyncio.wrap_future(self.future)
+        except BaseException:
+            self.close()
+            raise
+        if chunk is None:
+            self.close()
+            raise StopAsyncIteration
+        return chunk
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        # Часть, которая ещё вычисляется, занимает поток пула до своего завершения.
+        if self.future is not None and not self.future.done():
+            self.future.add_done_callback(self.pool.release)
+        else:
+            self.pool.release()
+
+    async def aclose(self):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+
+workers = WorkerPool(kind=settings.GEN_POOL, workers=settings.GEN_WORKERS, queue=settings.GEN_QUEUE_SIZE,
+                     timeout=settings.GEN_TIMEOUT, retry_after=settings.GEN_RETRY_AFTER)
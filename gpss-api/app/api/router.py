@@ -1,27 +1,332 @@
-from typing import Literal
-import io
+from typing import Any, Literal, Optional
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from importlib.util import find_spec
+from itertools import chain
+from time import monotonic
+import asyncio
+import json
+import os
 
-from fastapi import APIRouter
+import orjson
+
+from fastapi import APIRouter, HTTPException, Query, Request, Response
 from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
 
 from app.schemas.gpss_model_data import ModelData
 from app.schemas.gpss_code import GPSSCode
+from app.schemas.gpss_simulation import SimulationResult
+from app.schemas.gpss_estimate import Estimate
+from app.schemas.gpss_sweep import SweepRequest
+from app.schemas.gpss_replication import ReplicationRequest, ReplicationResult
+from app.schemas.gpss_revision import GenDelta, GPSSRevision
+from app.schemas.gpss_topology import TopologyReport
+from app.schemas.gpss_geometry import GeometryReport
 
-from .gpss_generator import Generator
+from .gpss_cache import cache, check, generate, geometry, offload, prepare, stream_code, validate
+from .gpss_generator import timing
+from .gpss_stream import COMPRESSIONS, compress, encode, negotiate
+from .gpss_workers import workers
+from .gpss_metrics import encode_seconds, output_bytes
+from . import gpss_profile
+from . import gpss_incremental
+from .gpss_simulator import Simulator
+from .gpss_vector_simulator import VectorSimulator
+from .gpss_estimator import Estimator
+from . import gpss_sweep
+from . import gpss_batch
+from . import gpss_replications
 
 
 api_router = APIRouter(prefix='/gpss', tags=['Generator'])
 
 
-@api_router.post('/gen', response_model=GPSSCode, description='Генерация GPSS-кода на основе входных парамеров.')
-async def gpss_gen(model_data: ModelData) -> GPSSCode:
-    return Generator(data=model_data).code()
+MODEL_DATA_BODY = {'requestBody': {'required': True, 'content': {'application/json': {
+    'schema': ModelData.model_json_schema(ref_template='#/components/schemas/{model}')}}}}
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    if etag in (tag.strip() for tag in request.headers.get('if-none-match', '').split(',')):
+        return Response(status_code=304, headers={'ETag': etag})
+    return None
+
+
+@api_router.post('/validate', response_model=TopologyReport,
+                 description='Проверка модели без генерации: связи, ведущие к несуществующим узлам и интерфейсам, '
+                             'маршруты на несуществующие порты, недостижимые узлы и петли маршрутизации. '
+                             'При диагностиках с `severity: error` генерация вернёт 422 с тем же списком.',
+                 openapi_extra=MODEL_DATA_BODY)
+async def gpss_validate(request: Request) -> TopologyReport:
+    return await offload(check, await request.body())
+
+
+@api_router.post('/geometry', response_model=GeometryReport,
+                 description='Расписания связей движущихся КА на горизонте `sim.duration`: окна видимости, '
+                             'дальность и интенсивность обслуживания по дальности для связей с '
+                             '`muPolicy: auto_from_physics`. Настройки — `model.geometry` (или значения по умолчанию); '
+                             'с `model.geometry` генератор выдаёт эти расписания функциями времени.',
+                 openapi_extra=MODEL_DATA_BODY)
+async def gpss_geometry(request: Request) -> GeometryReport:
+    return await offload(geometry, await request.body())
+
+
+@api_router.post('/gen', response_model=GPSSCode, description='Генерация GPSS-кода на основе входных парамеров.',
+                 openapi_extra=MODEL_DATA_BODY)
+async def gpss_gen(request: Request):
+    key, code_data, hit = await generate(await request.body())
+    # Решение о сжатии принимается по размеру кода до сериализации, чтобы ETag был известен для 304.
+    compression = (negotiate(request.headers.get('accept-encoding', ''))
+                   if len(code_data.code) >= settings.COMPRESS_MIN_BYTES else None)
+    etag = f'"{key}{f'-{compression}' if compression else ''}"'
+    if (response := not_modified(request, etag)) is not None:
+        return response
+    headers = {'ETag': etag, 'X-Cache': 'HIT' if hit else 'MISS', 'Vary': 'Accept-Encoding'}
+    start_time = monotonic()
+    body = orjson.dumps(code_data.model_dump(mode='json'))
+    output_format = 'json'
+    if compression is not None:
+        # zlib и zstandard отпускают GIL, поэтому сжатие в потоке не задерживает цикл событий.
+        body = await run_in_threadpool(compress, body, compression)
+        headers['Content-Encoding'] = compression
+        output_format = f'json+{compression}'
+    encode_seconds.observe(monotonic() - start_time, format=output_format)
+    output_bytes.observe(len(body), format=output_format)
+    return Response(body, media_type='application/json', headers=headers)
+
+
+@api_router.post('/gen-file', description='Генерация файла с расширением `.gps.txt` с GPSS-кодом на основе входных парамеров. '
+                                          'Код отдаётся потоком по мере генерации (zstd или gzip — по `Accept-Encoding`).',
+                 openapi_extra=MODEL_DATA_BODY)
+async def gpss_gen_file(request: Request, encoding: Literal['utf-8', 'cp1251']='cp1251'):
+    key, code_data, graph, hit = await prepare(await request.body())
+    # Размер известен только для кода из кэша; генерируемый потоком код сжимается всегда.
+    compression = (negotiate(request.headers.get('accept-encoding', ''))
+                   if code_data is None or len(code_data.code) >= settings.COMPRESS_MIN_BYTES else None)
+    etag = f'"{key}-{encoding}{f'-{compression}' if compression else ''}"'
+    if (response := not_modified(request, etag)) is not None:
+        return response
+    gen_date = code_data.gen_date if code_data is not None else datetime.now()
+    headers = {'Content-Disposition': f'attachment; filename=model-{gen_date.strftime('%d-%m-%Y-%H-%M-%S')}.gps.txt',
+               'ETag': etag, 'X-Cache': 'HIT' if hit else 'MISS', 'Vary': 'Accept-Encoding'}
+    if compression is not None:
+        headers['Content-Encoding'] = compression
+    chunks = encode(stream_code(key, code_data, graph, add_time=True), encoding=encoding, compression=compression)
+    if graph is not None:
+        # Генерация идёт по мере отдачи; место в пуле занимается до начала ответа, пока можно вернуть 503.
+        chunks = workers.stream(chunks)
+    return StreamingResponse(chunks, media_type='application/octet-stream', headers=headers)
+
+
+BATCH_BODY = {'requestBody': {'required': True, 'content': {
+    'application/json': {'schema': {'type': 'array', 'items': {'$ref': '#/components/schemas/ModelData'}}},
+    'application/x-ndjson': {'schema': {'$ref': '#/components/schemas/ModelData'}}}}}
+
+
+@api_router.post('/gen-batch', description='Пакетная валидация и генерация GPSS-кода: JSON-массив моделей или JSON Lines '
+                                          '(по модели в строке). Модели обрабатываются в пуле процессов по мере чтения тела '
+                                          'запроса, результаты отдаются по мере готовности: NDJSON (`index`, код или `error`) '
+                                          'или ZIP с `.gps.txt`. Ошибка отдельной модели не прерывает пакет.',
+                 openapi_extra=BATCH_BODY)
+async def gpss_gen_batch(request: Request, output: Literal['ndjson', 'zip'] = 'ndjson',
+                         encoding: Literal['utf-8', 'cp1251'] = 'cp1251'):
+    tasks: list[asyncio.Task] = []
+    # Тело читается до ответа: генерация идёт параллельно с загрузкой, а поток ответа не конкурирует с чтением.
+    try:
+        async for body in gpss_batch.documents(request.stream()):
+            if len(tasks) >= settings.BATCH_MAX_ITEMS:
+                raise HTTPException(status_code=413, detail=f'Batch has more than {settings.BATCH_MAX_ITEMS} models.')
+            tasks.append(asyncio.create_task(gpss_batch.process(len(tasks), body)))
+    except ValueError as error:
+        for task in tasks:
+            task.cancel()
+        raise HTTPException(status_code=422, detail=f'{error} Models read: {len(tasks)}.')
+    except HTTPException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+    if output == 'zip':
+        async def archive():
+            stream = gpss_sweep.ZipStream()
+            rows = []
+            async for row, code in gpss_batch.completed(tasks):
+                rows.append(row)
+                if code is None:
+                    # Ошибки валидации несут `msg`, диагностики топологии — `message`.
+                    text = '\n'.join([row['error'], *(f'{'.'.join(map(str, item['loc']))}: {item.get('msg', item.get('message'))}'
+                                                       for item in row.get('detail', []))])
+                    yield stream.add(f'model-{row['index']:05d}.error.txt', text.encode())
+                else:
+                    text = timing(code.code.index('\n') - 2, code.gen_date, code.gen_time) + code.code
+                    yield stream.add(f'model-{row['index']:05d}.gps.txt', text.encode(encoding=encoding))
+            rows.sort(key=lambda row: row['index'])
+            yield stream.add('models.json', json.dumps(rows, ensure_ascii=False, indent=2).encode())
+            yield stream.close()
+        return StreamingResponse(archive(), media_type='application/zip',
+                                 headers={'Content-Disposition': 'attachment; filename=batch.zip'})
+
+    async def lines():
+        async for row, code in gpss_batch.completed(tasks):
+            if code is not None:
+                row.update(code.model_dump(mode='json'))
+            yield orjson.dumps(row, option=orjson.OPT_APPEND_NEWLINE)
+    return StreamingResponse(lines(), media_type='application/x-ndjson')
+
+
+@api_router.post('/gen-delta', response_model=GPSSRevision,
+                 description='Инкрементальная генерация: изменение применяется к сохранённой ревизии, '
+                             'перегенерируются только узлы с изменившимися зависимостями.')
+def gpss_gen_delta(delta: GenDelta) -> GPSSRevision:
+    try:
+        return gpss_incremental.generate(delta)
+    except (ValueError, KeyError, TypeError) as error:
+        raise HTTPException(status_code=422, detail=f'{type(error).__name__}: {error}')
+    except LookupError as error:
+        raise HTTPException(status_code=404, detail=str(error))
+
+
+@api_router.get('/cache', description='Статистика кэша сгенерированного GPSS-кода.')
+async def gpss_cache_stats() -> dict[str, int]:
+    return cache.stats()
+
+
+@api_router.post('/profile', description='Профилирование генерации по модели без кэша: время валидации, генерации и кодирования, '
+                                        'время по типам узлов и отчёт cProfile или pyinstrument (при его установке). '
+                                        'Время измеряется под профилировщиком и завышено относительно обычной генерации.',
+                 openapi_extra=MODEL_DATA_BODY)
+async def gpss_profile_run(request: Request, profiler: Literal['cprofile', 'pyinstrument'] = 'cprofile',
+                           sort: Literal['cumulative', 'tottime', 'ncalls'] = 'cumulative', limit: int = 40,
+                           encoding: Literal['utf-8', 'cp1251'] = 'cp1251',
+                           compression: Optional[Literal['gzip', 'zstd']] = None) -> dict[str, Any]:
+    if profiler == 'pyinstrument' and find_spec('pyinstrument') is None:
+        raise HTTPException(status_code=501, detail='pyinstrument is not installed.')
+    if compression is not None and compression not in COMPRESSIONS:
+        raise HTTPException(status_code=501, detail=f'{compression} compression is not available.')
+    return await workers.run(gpss_profile.profile, await request.body(), profiler, sort, max(limit, 1),
+                             encoding, compression)
+
+
+@api_router.get('/workers', description='Загрузка пула генерации: занятые места, отказы (503) и таймауты.')
+async def gpss_workers_stats() -> dict[str, Any]:
+    return workers.stats()
+
+
+def simulate(body: bytes, seed: Optional[int], mode: Literal['event', 'vector'],
+             replication: Optional[int] = None) -> SimulationResult:
+    try:
+        simulator = (Simulator if mode == 'event' else VectorSimulator)(data=validate(body), seed=seed,
+                                                                         replication=replication)
+    except ValueError as error:
+        raise HTTPException(status_code=422, detail=str(error))
+    return simulator.run()
+
+
+@api_router.post('/simulate', response_model=SimulationResult, description='Имитационное моделирование топологии встроенным движком без внешнего интерпретатора GPSS.',
+                 openapi_extra=MODEL_DATA_BODY)
+async def gpss_simulate(request: Request, seed: Optional[int] = None,
+                        mode: Literal['event', 'vector'] = 'event',
+                        replication: Optional[int] = Query(None, ge=0, description='Номер независимого прогона: '
+                                                           'у каждого источника и устройства свой поток случайных чисел, '
+                                                           'как в `/replicate`.')) -> SimulationResult:
+    return await run_in_threadpool(simulate, await request.body(), seed, mode, replication)
+
+
+def estimate(body: bytes) -> Estimate:
+    try:
+        estimator = Estimator(data=validate(body))
+        return estimator.estimate()
+    except ValueError as error:
+        raise HTTPException(status_code=422, detail=str(error))
+
+
+@api_router.post('/estimate', response_model=Estimate, description='Аналитическая оценка пропускной способности, потерь и задержек по модели сети массового обслуживания.',
+                 openapi_extra=MODEL_DATA_BODY)
+async def gpss_estimate(request: Request) -> Estimate:
+    return await run_in_threadpool(estimate, await request.body())
+
+
+@api_router.post('/sweep', description='Перебор вариантов модели по сетке параметров или латинскому гиперкубу в пуле процессов. '
+                                      'Результаты отдаются потоком по мере готовности: NDJSON с метриками или ZIP с `.gps.txt`.')
+async def gpss_sweep_run(request: SweepRequest):
+    total = gpss_sweep.count(request)
+    if total == 0:
+        raise HTTPException(status_code=422, detail='Sweep has no variants: every grid list must be non-empty.')
+    if total > settings.SWEEP_MAX_VARIANTS:
+        raise HTTPException(status_code=422, detail=f'Sweep has {total} variants, limit is {settings.SWEEP_MAX_VARIANTS}.')
+    try:
+        ModelData.model_validate(request.base)
+        variants = gpss_sweep.variants(request)
+        variants = chain([next(variants)], variants)
+    except ValueError as error:
+        raise HTTPException(status_code=422, detail=str(error))
+
+    window = 2 * (settings.SWEEP_WORKERS or os.cpu_count() or 1)
+
+    async def variant(index: int, variant_params: dict[str, Any], payload: dict[str, Any]):
+        # Ошибка варианта (в том числе падение процесса пула) отдаётся в потоке, а не обрывает его.
+        loop = asyncio.get_running_loop()
+        pool = gpss_sweep.executor()
+        try:
+            if request.output == 'zip':
+                return await loop.run_in_executor(pool, gpss_sweep.render, index, payload, request.encoding)
+            return await loop.run_in_executor(pool, gpss_sweep.evaluate,
+                                              index, variant_params, payload, request.evaluator)
+        except BrokenProcessPool as error:
+            gpss_sweep.discard(pool)
+            return gpss_sweep.failure(index, variant_params, request.output, error)
+        except Exception as error:
+            return gpss_sweep.failure(index, variant_params, request.output, error)
+
+    async def completed():
+        pending: set[asyncio.Task] = set()
+        params = {}
+        try:
+            for index, variant_params, payload in variants:
+                params[index] = variant_params
+                pending.add(asyncio.create_task(variant(index, variant_params, payload)))
+                if len(pending) >= window:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        yield task.result(), params
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result(), params
+        finally:
+            for task in pending:
+                task.cancel()
+
+    if request.output == 'zip':
+        async def archive():
+            stream = gpss_sweep.ZipStream()
+            async for (name, code), params in completed():
+                yield stream.add(name, code)
+            yield stream.add('variants.json', json.dumps(params, ensure_ascii=False, indent=2).encode())
+            yield stream.close()
+        return StreamingResponse(archive(), media_type='application/zip',
+                                 headers={'Content-Disposition': 'attachment; filename=sweep.zip'})
+
+    async def rows():
+        async for row, _ in completed():
+            yield orjson.dumps(row, option=orjson.OPT_APPEND_NEWLINE)
+    return StreamingResponse(rows(), media_type='application/x-ndjson')
 
 
-@api_router.post('/gen-file', description='Генерация файла с расширением `.gps.txt` с GPSS-кодом на основе входных парамеров.')
-async def gpss_gen_file(model_data: ModelData, encoding: Literal['utf-8', 'cp1251']='cp1251'):
-    generator = Generator(data=model_data)
-    code_data = generator.code(add_time=True)
-    buffer = io.BytesIO(code_data.code.encode(encoding=encoding))
-    return StreamingResponse(buffer, media_type='application/octet-stream', 
-                             headers={'Content-Disposition': f'attachment; filename=model-{code_data.gen_date.strftime('%d-%m-%Y-%H-%M-%S')}.gps.txt'})
+@api_router.post('/replicate', response_model=ReplicationResult,
+                 description='Независимые прогоны имитационной модели в пуле процессов до заданной точности: '
+                             'доверительные интервалы метрик по распределению Стьюдента. С `variant` исходная модель '
+                             'и вариант прогоняются на общих случайных числах и сравниваются по разностям.')
+async def gpss_replicate(request: ReplicationRequest) -> ReplicationResult:
+    if request.max_replications > settings.REPLICATIONS_MAX:
+        raise HTTPException(status_code=422, detail=f'Requested {request.max_replications} replications, '
+                                                    f'limit is {settings.REPLICATIONS_MAX}.')
+    if request.min_replications > request.max_replications:
+        raise HTTPException(status_code=422, detail='min_replications exceeds max_replications.')
+    try:
+        seed, bodies = await run_in_threadpool(gpss_replications.prepare, request)
+    except ValueError as error:
+        raise HTTPException(status_code=422, detail=str(error))
+    return await gpss_replications.run(request, seed, bodies)
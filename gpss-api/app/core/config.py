@@ -1,8 +1,30 @@
+from typing import Literal, Optional
+
 from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
     API_V1_STR: str = '/api'
+    SWEEP_WORKERS: Optional[int] = None
+    SWEEP_MAX_VARIANTS: int = 10_000
+    REPLICATIONS_MAX: int = 1000
+    BATCH_MAX_ITEMS: int = 10_000
+    GEN_POOL: Literal['thread', 'process'] = 'thread'
+    GEN_WORKERS: Optional[int] = None
+    GEN_QUEUE_SIZE: int = 32
+    GEN_TIMEOUT: float = 60.0
+    GEN_RETRY_AFTER: int = 5
+    COMPRESS_MIN_BYTES: int = 1024
+    GZIP_LEVEL: int = 6
+    ZSTD_LEVEL: int = 3
+    CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    CACHE_ENTRY_MAX_BYTES: int = 8 * 1024 * 1024
+    CACHE_DIR: Optional[str] = None
+    CACHE_DIR_MAX_BYTES: int = 1024 * 1024 * 1024
+    REVISIONS_MAX: int = 256
+    GEOMETRY_MAX_CELLS: int = 50_000_000
+    GEOMETRY_CHUNK_CELLS: int = 1 << 20
+    GEOMETRY_CACHE_SIZE: int = 32
 
     class Config:
         env_file = '.env'
@@ -1,6 +1,10 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 
 from app.api.router import api_router
+from app.api.gpss_cache import cache
+from app.api.gpss_metrics import RequestMetrics, registry
+from app.api.gpss_workers import workers
 from app.core.config import settings
 
 
@@ -13,3 +17,13 @@ app = FastAPI(
 )
 
 app.include_router(api_router, prefix=settings.API_V1_STR)
+app.add_middleware(RequestMetrics)
+
+
+@app.get('/metrics', include_in_schema=False)
+async def metrics() -> PlainTextResponse:
+    '''Метрики в текстовом формате Prometheus, включая состояние кэша и пула генерации.'''
+    return PlainTextResponse(registry.exposition({
+        'gpss_cache': ('GPSS code cache', cache.stats()),
+        'gpss_workers': ('Generation pool', workers.stats()),
+    }), media_type='text/plain; version=0.0.4; charset=utf-8')
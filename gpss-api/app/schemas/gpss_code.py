@@ -5,6 +5,28 @@ from pydantic import BaseModel
 
 
 class GPSSCode(BaseModel):
+    class Folding(BaseModel):
+        '''
+        Итог свёртки эквивалентных узлов (`model.fold`). `labels` — исходная метка объекта по его
+        номеру в свёрнутом коде: очередь, устройство или память и SAVEVALUE номера `n` соответствуют
+        `queue_*`, `service_*` и `loss_*` метки `labels[n]` исходной модели.
+        '''
+        class Group(BaseModel):
+            name: str
+            node_type: str
+            members: list[str]
+            base: int
+            stride: int
+            slots: list[str]
+
+        nodes: int
+        folded_nodes: int
+        lines: int
+        unfolded_lines: int
+        groups: list[Group]
+        labels: dict[int, str]
+
     code: str
     gen_time: Optional[float] = None
     gen_date: Optional[datetime] = None
+    folding: Optional[Folding] = None
@@ -0,0 +1,28 @@
+from typing import Literal, Optional
+
+from pydantic import BaseModel
+
+
+class Estimate(BaseModel):
+    class Station(BaseModel):
+        name: str
+        node_id: str
+        kind: Literal['interface', 'processing']
+        servers: int
+        buffer: Optional[int] = None
+        arrival_rate: float
+        throughput: float
+        utilization: float
+        blocking: float
+        # Перегруженная станция с неограниченным буфером: очередь растёт без предела.
+        stable: bool = True
+        queue_length: Optional[float] = None
+        wait_time: Optional[float] = None
+        sojourn_time: Optional[float] = None
+
+    generated_rate: float
+    delivered_rate: float
+    loss_rate: float
+    stations: list[Station]
+    iterations: int
+    est_time: Optional[float] = None
@@ -0,0 +1,32 @@
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class GeometryReport(BaseModel):
+    '''
+    Расписания связей на горизонте моделирования. Время — в единицах модели (`model.time.unit`),
+    интенсивность — в обслуживаниях за единицу времени модели, дальность — в километрах.
+    '''
+    class Link(BaseModel):
+        edge: str
+        source: str
+        target: str
+        label: str
+        distance_min: float
+        distance_max: float
+        # Доля шагов, на которых связь видима.
+        visible: float
+        # Интервалы видимости `[начало, конец)`.
+        windows: list[tuple[float, float]]
+        # Ступени интенсивности `(начало, μ)`; `None` — связь без `muPolicy: auto_from_physics`.
+        rates: Optional[list[tuple[float, float]]] = None
+
+    duration: float
+    steps: int
+    step: float
+    unit_seconds: float
+    links: list[Link]
+    # Связи, у концов которых нет координат: их интенсивность остаётся постоянной.
+    skipped: list[str]
+    compute_time: Optional[float] = None
@@ -1,13 +1,66 @@
-from typing import Any, Optional, Union, Literal
+from typing import Annotated, Any, Optional, Union, Literal, get_args
 from functools import cached_property
+from operator import attrgetter
 
-from pydantic import BaseModel, Field, AliasChoices, field_validator, computed_field, ConfigDict, model_validator
+from pydantic import BaseModel, Field, AliasChoices, GetCoreSchemaHandler, field_validator, computed_field, ConfigDict, model_validator
+from pydantic_core import core_schema
 
 
 class CBaseModel(BaseModel):
     model_config = ConfigDict(extra='ignore')
 
 
+# Поля-списки, которые в модели хранятся словарём, и путь к ключу элемента.
+INDEXED = {'nodes': 'id', 'edges': 'data.channel.id', 'interfaces': 'id'}
+
+# Поля узлов и связей, которые читает только расчёт расписаний (`model.geometry`): без него они
+# не влияют на код, поэтому исключаются из ключа кэша и хэшей узлов (`exclude=` при сериализации).
+NODE_GEOMETRY_FIELDS = {'type': True, 'data': {'lat': True, 'lon': True, 'altitude': True}}
+EDGE_GEOMETRY_FIELDS = {'data': {'channel': {'bandwidth': True, 'packetSize': True, 'muPolicy': True}}}
+
+
+class IndexedList:
+    '''
+    Поле `Annotated[dict[str, T], IndexedList(path)]`: на входе список, в модели — словарь по атрибуту `path`.
+    Элементы проверяются pydantic-core как обычный список (в том числе напрямую из JSON),
+    словарь строится одним проходом по уже проверенным объектам; сериализуется как `dict[str, T]`.
+    '''
+    def __init__(self, path: str):
+        self.key = attrgetter(path)
+
+    def __get_pydantic_core_schema__(self, source: Any, handler: GetCoreSchemaHandler) -> core_schema.CoreSchema:
+        key = self.key
+        return core_schema.no_info_after_validator_function(
+            lambda items: {key(item): item for item in items},
+            handler.generate_schema(list[get_args(source)[1]]),
+            serialization=core_schema.plain_serializer_function_ser_schema(
+                lambda value: value, return_schema=handler.generate_schema(source)))
+
+
+def keyed_errors(errors: list[dict[str, Any]], payload: Any) -> list[dict[str, Any]]:
+    '''
+    Ошибки валидации, в `loc` которых индексы элементов полей `IndexedList` заменены их ключами
+    (`nodes.AS1.data.interfaces.AS1_out1...`), как при проверке словарей. Индекс остаётся,
+    если ключ элемента во входных данных не строка.
+    '''
+    result = []
+    for error in errors:
+        loc, value = [], payload
+        for part in error['loc']:
+            if isinstance(part, int):
+                value = value[part] if isinstance(value, list) and -len(value) <= part < len(value) else None
+                if loc and loc[-1] in INDEXED:
+                    key = value
+                    for name in INDEXED[loc[-1]].split('.'):
+                        key = key.get(name) if isinstance(key, dict) else None
+                    part = key if isinstance(key, str) else part
+            else:
+                value = value.get(part) if isinstance(value, dict) else None
+            loc.append(part)
+        result.append({**error, 'loc': tuple(loc)})
+    return result
+
+
 class ModelData(CBaseModel):
     class Rng(CBaseModel):
         seed: int = 42
@@ -24,6 +77,20 @@ class ModelData(CBaseModel):
     class Packet(CBaseModel):
         mtu: int
 
+    class Fold(CBaseModel):
+        '''Свёртка структурно эквивалентных узлов в один параметризованный блок на класс.'''
+        min_members: int = Field(2, ge=2)
+
+    class Geometry(CBaseModel):
+        '''
+        Расписания связей движущихся КА на горизонте `sim.duration`: видимость и интенсивность
+        обслуживания по дальности на `steps` равных шагах. `tolerance` — относительная точность
+        ступенчатой аппроксимации интенсивности, `min_elevation` — угол места наземных концов, градусы.
+        '''
+        steps: int = Field(1000, ge=1)
+        min_elevation: float = Field(10.0, ge=0, le=90)
+        tolerance: float = Field(0.01, ge=0)
+
     class Traffic(CBaseModel):
         class Capacity(CBaseModel):
             class Params(CBaseModel):
@@ -41,6 +108,8 @@ class ModelData(CBaseModel):
     model: Model
     packet: Packet
     traffic: Traffic
+    fold: Optional[Fold] = None
+    geometry: Optional[Geometry] = None
 
 
 class NodeData(CBaseModel):
@@ -86,28 +155,23 @@ class NodeData(CBaseModel):
 
         label: str
         nodeType: str
+        lat: Optional[float] = None
+        lon: Optional[float] = None
+        altitude: Optional[float] = None
         generator: Optional[Generator] = None
-        interfaces: dict[str, Interface]
+        interfaces: Annotated[dict[str, Interface], IndexedList(INDEXED['interfaces'])]
         processing: Optional[Processing] = None
-
-        @field_validator('interfaces', mode='before')
-        @classmethod
-        def validator_interfaces(cls, value: list[dict]):
-            return {interface['id']: interface for interface in value}
     
     id: str
+    type: Optional[str] = None
     data: Data
 
-    @model_validator(mode='before')
-    @classmethod
-    def validator_(cls, data: dict):
-        interfaces = data['data']['interfaces']
-        node_id = data['id']
-        for interface in interfaces:
-            direction = interface['direction']
-            idx = interface['idx']
-            interface.update({'base_label': f'{direction}_int{idx}_{node_id}'})
-        return data
+    @model_validator(mode='after')
+    def validator_(self):
+        '''Метки интерфейсов; входные данные не изменяются.'''
+        for interface in self.data.interfaces.values():
+            interface.base_label = f'{interface.direction}_int{interface.idx}_{self.id}'
+        return self
 
 
 class EdgeData(CBaseModel):
@@ -119,6 +183,9 @@ class EdgeData(CBaseModel):
 
             id: str
             to: To
+            bandwidth: Optional[float] = None
+            packetSize: Optional[float] = None
+            muPolicy: Optional[str] = None
 
         channel: Channel
 
@@ -127,15 +194,5 @@ class EdgeData(CBaseModel):
 
 class ModelData(CBaseModel):
     model: ModelData
-    nodes: dict[str, NodeData]
-    edges: dict[str, EdgeData]
-
-    @field_validator('nodes', mode='before')
-    @classmethod
-    def validator_nodes(cls, value: list[dict]):
-        return {node_data['id']: node_data for node_data in value}
-
-    @field_validator('edges', mode='before')
-    @classmethod
-    def validator_edges(cls, value: list[dict]):
-        return {edge_data['data']['channel']['id']: edge_data for edge_data in value}
+    nodes: Annotated[dict[str, NodeData], IndexedList(INDEXED['nodes'])]
+    edges: Annotated[dict[str, EdgeData], IndexedList(INDEXED['edges'])]
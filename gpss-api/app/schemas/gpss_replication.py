@@ -0,0 +1,41 @@
+from typing import Any, Literal, Optional
+
+from pydantic import BaseModel, Field
+
+
+class ReplicationRequest(BaseModel):
+    base: dict[str, Any] = Field(description='Исходные данные модели в формате `/gen` (`model`, `nodes`, `edges`).')
+    variant: Optional[dict[str, Any]] = Field(
+        None,
+        description='Изменения сравниваемого варианта по путям, как в `grid` у `/sweep`. Прогоны варианта '
+                    'идут на тех же случайных числах, что и исходной модели; интервалы строятся для разностей.')
+    simulator: Literal['event', 'vector'] = 'event'
+    seed: Optional[int] = Field(None, description='Базовое зерно; по умолчанию `model.rng.seed`.')
+    metrics: list[str] = Field(
+        default_factory=lambda: ['loss_rate'],
+        description='`generated`, `delivered`, `lost`, `loss_rate`, SAVEVALUE `loss_*` (число потерь) '
+                    'или очередь `queue_*` (среднее время в очереди).')
+    confidence: float = Field(0.95, gt=0, lt=1)
+    half_width: Optional[float] = Field(None, gt=0, description='Целевая полуширина интервала.')
+    relative: Optional[float] = Field(None, gt=0, description='Целевая полуширина относительно среднего.')
+    min_replications: int = Field(5, ge=2)
+    max_replications: int = Field(100, ge=2)
+
+
+class ReplicationResult(BaseModel):
+    class Interval(BaseModel):
+        metric: str
+        mean: float
+        std: float
+        half_width: float
+        low: float
+        high: float
+
+    seed: int
+    replications: int
+    converged: bool
+    confidence: float
+    base: list[Interval]
+    variant: Optional[list[Interval]] = None
+    difference: Optional[list[Interval]] = None
+    sim_time: Optional[float] = None
@@ -0,0 +1,23 @@
+from typing import Any, Optional
+
+from pydantic import BaseModel, Field
+
+from app.schemas.gpss_code import GPSSCode
+
+
+class GenDelta(BaseModel):
+    base: Optional[str] = Field(
+        default=None,
+        description='Ревизия, к которой применяется изменение; без неё `model`, `nodes` и `edges` задают модель целиком.')
+    model: Optional[dict[str, Any]] = Field(default=None, description='Новые глобальные настройки модели.')
+    nodes: list[dict[str, Any]] = Field(default_factory=list, description='Добавляемые или заменяемые узлы (по `id`).')
+    edges: list[dict[str, Any]] = Field(default_factory=list, description='Добавляемые или заменяемые связи (по `data.channel.id`).')
+    remove_nodes: list[str] = Field(default_factory=list)
+    remove_edges: list[str] = Field(default_factory=list)
+
+
+class GPSSRevision(GPSSCode):
+    revision: str
+    base: Optional[str] = None
+    rendered: int
+    reused: int
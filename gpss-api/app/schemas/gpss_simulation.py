@@ -0,0 +1,37 @@
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class SimulationResult(BaseModel):
+    class Queue(BaseModel):
+        name: str
+        max: int
+        entries: int
+        zero_entries: int
+        current: int
+        avg_content: float
+        avg_time: float
+        losses: int
+
+    class Facility(BaseModel):
+        name: str
+        capacity: int
+        entries: int
+        utilization: float
+        avg_content: float
+        avg_time: float
+
+    duration: float
+    seed: int
+    generated: int
+    delivered: int
+    lost: int
+    loss_rate: float
+    queues: list[Queue]
+    facilities: list[Facility]
+    storages: list[Facility]
+    savevalues: dict[str, int]
+    sim_time: Optional[float] = None
+    # Векторный режим: число станций на петлях маршрутизации, исполненных по событиям.
+    event_stations: Optional[int] = None
@@ -0,0 +1,20 @@
+from typing import Any, Literal, Optional
+
+from pydantic import BaseModel, Field
+
+
+class SweepRequest(BaseModel):
+    class LatinHypercube(BaseModel):
+        samples: int = Field(gt=0)
+        seed: int = 42
+        ranges: dict[str, tuple[float, float]]
+
+    base: dict[str, Any] = Field(description='Исходные данные модели в формате `/gen` (`model`, `nodes`, `edges`).')
+    grid: dict[str, list[Any]] = Field(
+        default_factory=dict,
+        description='Сетка значений по путям вида `nodes.SC1.data.processing.mu` '
+                    '(`*` — любой элемент, элементы списков адресуются по `id`).')
+    lhs: Optional[LatinHypercube] = None
+    output: Literal['metrics', 'zip'] = 'metrics'
+    evaluator: Literal['estimate', 'event', 'vector'] = 'estimate'
+    encoding: Literal['utf-8', 'cp1251'] = 'cp1251'
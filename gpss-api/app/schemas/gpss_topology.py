@@ -0,0 +1,22 @@
+from typing import Literal, Optional, Union
+
+from pydantic import BaseModel
+
+
+class TopologyReport(BaseModel):
+    class Diagnostic(BaseModel):
+        severity: Literal['error', 'warning']
+        code: str
+        message: str
+        loc: list[Union[str, int]]
+        node: Optional[str] = None
+        edge: Optional[str] = None
+
+    valid: bool
+    nodes: int
+    edges: int
+    interfaces: int
+    sources: int
+    reachable: int
+    diagnostics: list[Diagnostic]
+    check_time: Optional[float] = None
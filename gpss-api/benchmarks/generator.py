@@ -0,0 +1,64 @@
+'''
+Масштабирование генерации GPSS-кода по числу узлов.
+
+    python -m benchmarks.generator [--sizes 1000 2500 5000 10000] [--legacy]
+
+Для каждого размера печатает время валидации и генерации и время на узел; в конце —
+наклон log(время) / log(узлы), который для линейной генерации близок к 1 (объём текста
+на узел слегка растёт вместе с шириной меток).
+С `--legacy` дополнительно замеряется построение контекста в каждом узле (прежнее поведение).
+'''
+from argparse import ArgumentParser
+from math import isqrt
+from time import perf_counter
+
+import numpy as np
+
+from app.schemas.gpss_model_data import ModelData
+from app.api.gpss_generator import Generator, Node
+
+from .synthetic import constellation
+
+
+def model(size: int) -> ModelData:
+    planes = max(isqrt(size), 2)
+    return ModelData.model_validate(constellation(planes, max(size // planes - 2, 2)))
+
+
+def legacy(data: ModelData) -> float:
+    start_time = perf_counter()
+    for node_id in data.nodes:
+        Node(node_id, data).code()
+    return perf_counter() - start_time
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 2500, 5000, 10000])
+    parser.add_argument('--legacy', action='store_true')
+    args = parser.parse_args()
+
+    print(f'{"nodes":>8} {"validate, s":>12} {"generate, s":>12} {"us/node":>9} {"MiB":>7}'
+          + (f' {"legacy, s":>10}' if args.legacy else ''))
+    nodes, times = [], []
+    for size in args.sizes:
+        start_time = perf_counter()
+        data = model(size)
+        validate_time = perf_counter() - start_time
+        start_time = perf_counter()
+        code = Generator(data=data).code().code
+        generate_time = perf_counter() - start_time
+        nodes.append(len(data.nodes))
+        times.append(generate_time)
+        line = f'{len(data.nodes):>8} {validate_time:>12.3f} {generate_time:>12.3f} {generate_time / len(data.nodes) * 1e6:>9.1f}' \
+               f' {len(code) / 2 ** 20:>7.1f}'
+        if args.legacy:
+            line += f' {legacy(data):>10.3f}'
+        print(line)
+    if len(nodes) > 1:
+        slope = np.polyfit(np.log(nodes), np.log(times), 1)[0]
+        print(f'scaling exponent: {slope:.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+'''
+Сравнение встроенных симуляторов: событийного `Simulator` и векторного `VectorSimulator`.
+
+    python -m benchmarks.simulation [--sizes 30 100 300] [--duration 1440] [--repeat 3]
+
+Для каждого размера синтетической топологии (`benchmarks.synthetic.topology`, маршруты
+без петель) и для тора КА (`constellation`, трафик ходит по петлям) печатает время обоих
+режимов, ускорение векторного, число станций, исполненных им по событиям, и долю потерь
+в обоих режимах (совпадает с точностью до случайных чисел).
+'''
+from argparse import ArgumentParser
+from math import isqrt
+from time import perf_counter
+
+from app.schemas.gpss_model_data import ModelData
+from app.api.gpss_simulator import Simulator
+from app.api.gpss_vector_simulator import VectorSimulator
+
+from .synthetic import constellation, topology
+
+
+def measure(simulator: type, data: ModelData, repeat: int):
+    times = []
+    for _ in range(repeat):
+        start_time = perf_counter()
+        result = simulator(data=data).run()
+        times.append(perf_counter() - start_time)
+    return min(times), result
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[30, 100, 300])
+    parser.add_argument('--duration', type=int, default=1440)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f'{"model":<22} {"stations":>8} {"event, s":>9} {"vector, s":>10} {"speedup":>8} {"looped":>7} '
+          f'{"loss event":>11} {"loss vector":>12}')
+    models = [(f'topology({size})', topology(size, duration=args.duration)) for size in args.sizes]
+    models += [(f'constellation({isqrt(size)}x{isqrt(size)})',
+                constellation(isqrt(size), isqrt(size), duration=args.duration)) for size in args.sizes[:2]]
+    for name, payload in models:
+        data = ModelData.model_validate(payload)
+        event_time, event = measure(Simulator, data, args.repeat)
+        vector_time, vector = measure(VectorSimulator, data, args.repeat)
+        print(f'{name:<22} {len(event.queues):>8} {event_time:>9.3f} {vector_time:>10.3f} '
+              f'{event_time / vector_time:>8.2f} {vector.event_stations:>7} '
+              f'{event.loss_rate:>11.3f} {vector.loss_rate:>12.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+'''
+Набор замеров gpss-api на синтетических топологиях (`benchmarks.synthetic.topology`).
+
+    python -m benchmarks.suite [--sizes 10 100 1000 10000 50000] [--repeat 3]
+                               [--output results.json] [--compare baseline.json]
+
+Для каждого размера замеряются: валидация `ModelData` из JSON и из словаря (включая
+`validator_`, назначающий `base_label`), анализ графа `TopologyGraph.report`, `Generator.code`,
+кодирование в cp1251, потоковая генерация со сжатием (gzip и zstd) и сериализация JSON-ответа
+`/gen`. Сравнение с прежней схемой валидации — `benchmarks.validation`. Результаты записываются
+в JSON; с `--compare` печатается отношение ко времени из предыдущего файла результатов.
+'''
+from typing import Any, Callable
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+from time import perf_counter
+import json
+import platform
+import subprocess
+
+import orjson
+
+from app.schemas.gpss_model_data import ModelData
+from app.api.gpss_generator import Generator
+from app.api.gpss_graph import TopologyGraph
+from app.api.gpss_stream import COMPRESSIONS, encode
+
+from .synthetic import topology
+
+
+def measure(function: Callable[[], Any], repeat: int, setup: Callable[[], Any] = lambda: None) -> dict[str, float]:
+    '''Минимальное и среднее время `repeat` вызовов; `setup` выполняется перед каждым вызовом вне замера.'''
+    times = []
+    for _ in range(repeat):
+        argument = setup()
+        start_time = perf_counter()
+        function() if argument is None else function(argument)
+        times.append(perf_counter() - start_time)
+    return {'min': min(times), 'mean': sum(times) / len(times)}
+
+
+def cases(size: int, repeat: int) -> list[dict[str, Any]]:
+    payload = topology(size)
+    body = json.dumps(payload).encode()
+    data = ModelData.model_validate_json(body)
+    code_data = Generator(data=data).code()
+    code = code_data.code
+    interfaces = sum(len(node.data.interfaces) for node in data.nodes.values())
+    common = {'size': size, 'nodes': len(data.nodes), 'interfaces': interfaces, 'edges': len(data.edges)}
+    results = [
+        ('validate_json', measure(lambda: ModelData.model_validate_json(body), repeat), len(body)),
+        ('validate_dict', measure(lambda: ModelData.model_validate(payload), repeat), len(body)),
+        ('graph_report', measure(lambda: TopologyGraph(data).report(), repeat), len(body)),
+        ('generate', measure(lambda: Generator(data=data).code(), repeat), len(code)),
+        ('encode_cp1251', measure(lambda: code.encode('cp1251'), repeat), len(code)),
+        ('stream_gzip', measure(lambda: sum(len(chunk) for chunk in encode(Generator(data=data).stream(), 'cp1251',
+                                                                           compression='gzip')), repeat), len(code)),
+        ('json_response', measure(lambda: orjson.dumps(code_data.model_dump(mode='json')), repeat), len(code)),
+    ]
+    if 'zstd' in COMPRESSIONS:
+        results.append(('stream_zstd', measure(lambda: sum(len(chunk) for chunk in encode(
+            Generator(data=data).stream(), 'cp1251', compression='zstd')), repeat), len(code)))
+    return [{'name': name, **common, 'bytes': size_bytes, 'seconds': seconds, 'repeat': repeat}
+            for name, seconds, size_bytes in results]
+
+
+def environment() -> dict[str, Any]:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'suite': 'gpss-api',
+        'date': datetime.now(timezone.utc).isoformat(),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+    }
+
+
+def compare(results: list[dict[str, Any]], baseline_path: str):
+    with open(baseline_path, encoding='utf-8') as file:
+        baseline = {(row['name'], row['size']): row for row in json.load(file)['results']}
+    print(f'\n{"case":<16} {"size":>7} {"baseline, s":>12} {"current, s":>12} {"ratio":>7}')
+    for row in results:
+        previous = baseline.get((row['name'], row['size']))
+        if previous is None:
+            continue
+        ratio = row['seconds']['min'] / previous['seconds']['min']
+        print(f'{row["name"]:<16} {row["size"]:>7} {previous["seconds"]["min"]:>12.4f} '
+              f'{row["seconds"]["min"]:>12.4f} {ratio:>7.2f}')
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default='benchmark-results.json')
+    parser.add_argument('--compare', default=None)
+    args = parser.parse_args()
+
+    results = []
+    print(f'{"case":<16} {"size":>7} {"min, s":>10} {"mean, s":>10} {"MiB":>8}')
+    for size in args.sizes:
+        for row in cases(size, args.repeat):
+            results.append(row)
+            print(f'{row["name"]:<16} {row["size"]:>7} {row["seconds"]["min"]:>10.4f} '
+                  f'{row["seconds"]["mean"]:>10.4f} {row["bytes"] / 2 ** 20:>8.2f}')
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump({'environment': environment(), 'results': results}, file, indent=2)
+    if args.compare is not None:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
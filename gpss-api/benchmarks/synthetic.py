@@ -0,0 +1,135 @@
+from typing import Any
+from math import gcd
+
+
+def interface(node_id: str, direction: str, idx: int, edge_id: str, queue: int = 20, mu: int = 10) -> dict[str, Any]:
+    key = 'in' if direction == 'in' else 'out'
+    return {
+        'id': f'{node_id}_{key}{idx}',
+        'idx': idx,
+        'name': f'{key} {idx}',
+        'edgeId': edge_id,
+        'direction': direction,
+        'queue': {f'q_{key}': queue},
+        'service': {f'mu_{key}': mu, f'servers_{key}': 1, f'dist_{key}': 'Exponential'}}
+
+
+def edge(edge_id: str, node_id: str, port_id: str) -> dict[str, Any]:
+    return {'id': edge_id, 'data': {'channel': {'id': edge_id, 'to': {'nodeId': node_id, 'portId': port_id}}}}
+
+
+def constellation(planes: int, per_plane: int, mtu: int = 65535, duration: int = 1440) -> dict[str, Any]:
+    '''
+    Синтетическая группировка в формате `/gen`: тор `planes × per_plane` КА с четырьмя
+    межспутниковыми линиями (вперёд/назад по плоскости, в соседние плоскости), а также
+    по одному AS и одной ССОП на плоскость. Всего `planes * (per_plane + 2)` узлов.
+    '''
+    def sc(plane: int, slot: int) -> str:
+        return f'SC_{plane % planes}_{slot % per_plane}'
+
+    nodes, edges = [], []
+    neighbours = {1: (0, 1), 2: (0, -1), 3: (1, 0), 4: (-1, 0)}
+    for plane in range(planes):
+        for slot in range(per_plane):
+            node_id = sc(plane, slot)
+            interfaces = []
+            for idx, (d_plane, d_slot) in neighbours.items():
+                target = sc(plane + d_plane, slot + d_slot)
+                interfaces.append(interface(node_id, 'in', idx, f'isl_{sc(plane - d_plane, slot - d_slot)}_{idx}'))
+                interfaces.append(interface(node_id, 'out', idx, f'isl_{node_id}_{idx}'))
+                edges.append(edge(f'isl_{node_id}_{idx}', target, f'{target}_in{idx}'))
+            ground = {0: f'AS_{plane}', per_plane // 2: f'SSOP_{plane}'}.get(slot)
+            if ground is not None:
+                interfaces.append(interface(node_id, 'in', 5, f'up_{ground}'))
+                interfaces.append(interface(node_id, 'out', 5, f'down_{ground}'))
+                edges.append(edge(f'down_{ground}', ground, f'{ground}_in1'))
+            nodes.append({'id': node_id, 'data': {
+                'label': node_id, 'nodeType': 'SC', 'interfaces': interfaces,
+                'processing': {'mu': 30, 'dist': 'Exponential', 'queue': 20, 'serviceLines': 3,
+                               'routingTable': [{'type': 1, 'outPort': 1}, {'type': 2, 'outPort': 3}]}}})
+        for kind, slot, type_data in (('AS', 0, 1), ('SSOP', per_plane // 2, 2)):
+            node_id, target = f'{kind}_{plane}', sc(plane, slot)
+            nodes.append({'id': node_id, 'data': {
+                'label': node_id, 'nodeType': kind,
+                'generator': {'lambda': 2, 'typeData': type_data, 'capacitySource': 'capacity'},
+                'interfaces': [interface(node_id, 'out', 1, f'up_{node_id}'),
+                               interface(node_id, 'in', 1, f'down_{node_id}')]}})
+            edges.append(edge(f'up_{node_id}', target, f'{target}_in5'))
+    model = {
+        'rng': {'seed': 42},
+        'sim': {'duration': duration},
+        'time': {'unit': 'min'},
+        'model': {'id': f'constellation-{planes}x{per_plane}'},
+        'packet': {'mtu': mtu},
+        'traffic': {'capacity': {'dist': 'duniform', 'params': {'minBytes': 100, 'maxBytes': 1500000}}}}
+    return {'model': model, 'nodes': nodes, 'edges': edges}
+
+
+def topology(nodes: int, interfaces: int = 4, routes: int = 2, ground_share: float = 0.2,
+             chain: int = 8, mtu: int = 65535, duration: int = 1440) -> dict[str, Any]:
+    '''
+    Синтетическая топология в формате `/gen` заданного размера.
+
+    Узлы-ретрансляторы (SC, HAPS, ES — чередуются цепочками по `chain` узлов) имеют по `interfaces`
+    пар входящих/исходящих интерфейсов: исходящий `k` ведёт во входящий `k` узла, смещённого
+    по кольцу на ближайшее к `k**2` число, взаимно простое с числом ретрансляторов. Каждый входящий
+    интерфейс получает ровно одну связь, а маршрут по одному порту обходит всё кольцо.
+    Доля `ground_share` узлов — генераторы AS и ССОП (поровну), каждый подключён к своему
+    ретранслятору через дополнительную пару интерфейсов. Таблица маршрутизации содержит
+    записи по типам `1..routes`; у ретранслятора с наземным узлом `k` тип `k % routes + 1`
+    выводится на землю, а генератор `j` создаёт трафик типа `(j + 1) % routes + 1`.
+    '''
+    ground = min(max(int(nodes * ground_share), 2 if nodes >= 4 else 0), nodes // 2)
+    relays = nodes - ground
+    kinds = ('SC', 'HAPS', 'ES')
+    payload_nodes, payload_edges = [], []
+
+    def relay(k: int) -> str:
+        return f'{kinds[(k // chain) % len(kinds)]}_{k}'
+
+    def ground_id(j: int) -> str:
+        return f'{"AS" if j % 2 == 0 else "SSOP"}_{j}'
+
+    shifts = {}
+    for idx in range(1, interfaces + 1):
+        shift = idx * idx
+        while gcd(shift, relays) != 1:
+            shift += 1
+        shifts[idx] = shift
+    for k in range(relays):
+        node_id = relay(k)
+        items = []
+        for idx, shift in shifts.items():
+            source, target = relay((k - shift) % relays), relay((k + shift) % relays)
+            items.append(interface(node_id, 'in', idx, f'l_{source}_{idx}'))
+            items.append(interface(node_id, 'out', idx, f'l_{node_id}_{idx}'))
+            payload_edges.append(edge(f'l_{node_id}_{idx}', target, f'{target}_in{idx}'))
+        table = [{'type': type_data, 'outPort': (type_data - 1) % interfaces + 1} for type_data in range(1, routes + 1)]
+        if k < ground:
+            port = interfaces + 1
+            items.append(interface(node_id, 'in', port, f'up_{ground_id(k)}'))
+            items.append(interface(node_id, 'out', port, f'down_{ground_id(k)}'))
+            payload_edges.append(edge(f'down_{ground_id(k)}', ground_id(k), f'{ground_id(k)}_in1'))
+            exit_type = k % routes + 1
+            table = [{'type': exit_type, 'outPort': port}] + \
+                [route for route in table if route['type'] != exit_type]
+        payload_nodes.append({'id': node_id, 'data': {
+            'label': node_id, 'nodeType': kinds[(k // chain) % len(kinds)], 'interfaces': items,
+            'processing': {'mu': 30, 'dist': 'Exponential', 'queue': 20, 'serviceLines': 3,
+                           'routingTable': table}}})
+    for j in range(ground):
+        node_id, target = ground_id(j), relay(j)
+        payload_nodes.append({'id': node_id, 'data': {
+            'label': node_id, 'nodeType': node_id.split('_')[0],
+            'generator': {'lambda': 2, 'typeData': (j + 1) % routes + 1, 'capacitySource': 'capacity'},
+            'interfaces': [interface(node_id, 'out', 1, f'up_{node_id}'),
+                           interface(node_id, 'in', 1, f'down_{node_id}')]}})
+        payload_edges.append(edge(f'up_{node_id}', target, f'{target}_in{interfaces + 1}'))
+    model = {
+        'rng': {'seed': 42},
+        'sim': {'duration': duration},
+        'time': {'unit': 'min'},
+        'model': {'id': f'synthetic-{nodes}'},
+        'packet': {'mtu': mtu},
+        'traffic': {'capacity': {'dist': 'duniform', 'params': {'minBytes': 100, 'maxBytes': 1500000}}}}
+    return {'model': model, 'nodes': payload_nodes, 'edges': payload_edges}
@@ -0,0 +1,69 @@
+'''
+Отрисовка блока интерфейса: `str.format` с именованными полями (прежняя реализация)
+против скомпилированного шаблона `gpss_templates`.
+
+    python -m benchmarks.templates [--interfaces 10000] [--repeat 5]
+'''
+from argparse import ArgumentParser
+from timeit import repeat
+
+from app.api.gpss_templates import templates
+
+
+FORMAT_TEMPLATE = (
+    '{name}'
+    '{block:<{width}} ASSIGN    {key_int_idx},{val_int_idx}'
+    '{indent}TEST L    Q${queue_name},{queue},{loss}'
+    '{indent}QUEUE     {queue_name}'
+    '{indent}SEIZE     {service_name}'
+    '{indent}DEPART    {queue_name}'
+    '{indent}ADVANCE   ({dist}(1,0,1/{mu}))'
+    '{indent}RELEASE   {service_name}'
+    '{indent}TRANSFER  ,{next_block}\n\n'
+    '{loss:<{width}} SAVEVALUE {loss}_+,1'
+    '{indent}TERMINATE')
+
+
+def with_format(interfaces: list[tuple[str, str, int, str]], margin: int) -> str:
+    return '\n\n'.join(
+        FORMAT_TEMPLATE.format(
+            name=f'* {name}\n',
+            block=block,
+            width=margin,
+            key_int_idx='number_out_int_SC',
+            val_int_idx=idx,
+            indent='\n' + ' ' * (margin + 1),
+            queue_name=f'queue_{block}',
+            queue=f'q_{block}',
+            loss=f'loss_{block}',
+            service_name=f'service_{block}',
+            dist='Exponential',
+            mu=f'mu_{block}',
+            next_block=next_block)
+        for name, block, idx, next_block in interfaces)
+
+
+def with_template(interfaces: list[tuple[str, str, int, str]], margin: int) -> str:
+    template = templates(margin).interface
+    return '\n\n'.join(
+        template.render(name, block, 'out', 'SC', idx, 'Exponential', next_block)
+        for name, block, idx, next_block in interfaces)
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--interfaces', type=int, default=10_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    interfaces = [(f'out {k % 4 + 1}', f'out_int{k % 4 + 1}_SC_{k}', k % 4 + 1, f'in_int{k % 4 + 1}_SC_{k + 1}')
+                  for k in range(args.interfaces)]
+    margin = max(len(block) for _, block, _, _ in interfaces) + 5
+    assert with_format(interfaces, margin) == with_template(interfaces, margin)
+    for name, function in (('str.format', with_format), ('template', with_template)):
+        best = min(repeat(lambda: function(interfaces, margin), number=1, repeat=args.repeat))
+        print(f'{name:>10}: {best / args.interfaces * 1e6:6.2f} us/interface')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+'''
+Валидация `ModelData`: прежняя схема (before-валидаторы, которые строят словари из списков
+и дописывают `base_label` во входные словари) против `IndexedList` и разбора `parse`
+напрямую из байтов тела запроса.
+
+    python -m benchmarks.validation [--sizes 1000 5000 20000] [--repeat 3]
+
+`--sizes` — число узлов `benchmarks.synthetic.topology` (около 7 интерфейсов на узел).
+'''
+from typing import Any, Callable, Optional
+from argparse import ArgumentParser
+from copy import deepcopy
+from time import perf_counter
+import json
+
+from pydantic import field_validator, model_validator
+
+from app.schemas.gpss_model_data import CBaseModel, ModelData, NodeData, EdgeData
+from app.api.gpss_cache import parse
+
+from .synthetic import topology
+
+
+class LegacyData(NodeData.Data):
+    interfaces: dict[str, NodeData.Data.Interface]
+
+    @field_validator('interfaces', mode='before')
+    @classmethod
+    def validator_interfaces(cls, value: list[dict]):
+        return {interface['id']: interface for interface in value}
+
+
+class LegacyNodeData(CBaseModel):
+    id: str
+    type: Optional[str] = None
+    data: LegacyData
+
+    @model_validator(mode='before')
+    @classmethod
+    def validator_(cls, data: dict):
+        node_id = data['id']
+        for interface in data['data']['interfaces']:
+            interface.update({'base_label': f'{interface['direction']}_int{interface['idx']}_{node_id}'})
+        return data
+
+
+class LegacyModelData(CBaseModel):
+    model: ModelData.model_fields['model'].annotation
+    nodes: dict[str, LegacyNodeData]
+    edges: dict[str, EdgeData]
+
+    @field_validator('nodes', mode='before')
+    @classmethod
+    def validator_nodes(cls, value: list[dict]):
+        return {node_data['id']: node_data for node_data in value}
+
+    @field_validator('edges', mode='before')
+    @classmethod
+    def validator_edges(cls, value: list[dict]):
+        return {edge_data['data']['channel']['id']: edge_data for edge_data in value}
+
+
+def best(function: Callable[[Any], Any], repeat: int, setup: Callable[[], Any]) -> float:
+    times = []
+    for _ in range(repeat):
+        argument = setup()
+        start_time = perf_counter()
+        function(argument)
+        times.append(perf_counter() - start_time)
+    return min(times)
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000, 20000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f'{"nodes":>7} {"interfaces":>10} {"case":<14} {"s":>8} {"speedup":>8}')
+    for size in args.sizes:
+        payload = topology(size)
+        body = json.dumps(payload).encode()
+        current = ModelData.model_validate_json(body)
+        assert LegacyModelData.model_validate_json(body).model_dump_json() == current.model_dump_json()
+        interfaces = sum(len(node.data.interfaces) for node in current.nodes.values())
+        del current
+        cases = [
+            ('legacy_json', LegacyModelData.model_validate_json, lambda: body),
+            ('legacy_dict', LegacyModelData.model_validate, lambda: deepcopy(payload)),
+            ('json', ModelData.model_validate_json, lambda: body),
+            ('dict', ModelData.model_validate, lambda: payload),
+            ('parse', parse, lambda: body),
+        ]
+        baseline = None
+        for name, function, setup in cases:
+            seconds = best(function, args.repeat, setup)
+            baseline = baseline or seconds
+            print(f'{len(payload["nodes"]):>7} {interfaces:>10} {name:<14} {seconds:>8.3f} {baseline / seconds:>8.2f}')
+
+
+if __name__ == '__main__':
+    main()